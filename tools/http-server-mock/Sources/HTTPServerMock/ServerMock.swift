@@ -90,14 +90,107 @@ public class ServerMock {
 
     // MARK: - Endpoints
 
+    /// Closes given session: the server removes its requests and stops recording new ones.
+    /// Blocks until the server confirms it, so requests sent afterwards are known to be ignored.
+    internal func closeSession(sessionIdentifier: String) throws {
+        var request = URLRequest(
+            url: baseURL.appendingPathComponent("/sessions/\(sessionIdentifier)"),
+            cachePolicy: .reloadIgnoringLocalCacheData,
+            timeoutInterval: 60
+        )
+        request.httpMethod = "DELETE"
+        _ = try sendSynchronously(request: request)
+    }
+
     /// Fetches all requests recorded by the server.
     internal func getRecordedRequests() throws -> [Request] {
-        let inspectionEndpointURL = baseURL.appendingPathComponent("/inspect")
+        return try getRequests(from: baseURL.appendingPathComponent("/inspect"))
+    }
+
+    /// Fetches requests recorded by the server in given session.
+    internal func getRecordedRequests(sessionIdentifier: String) throws -> [Request] {
+        return try getRequests(from: baseURL.appendingPathComponent("/inspect/\(sessionIdentifier)"))
+    }
+
+    /// Fetches requests recorded by the server in given session after given cursor.
+    /// Returns these requests and the cursor to continue from in next call.
+    internal func getRecordedRequests(sessionIdentifier: String, since cursor: Int) throws -> (requests: [Request], nextCursor: Int) {
+        var components = URLComponents(
+            url: baseURL.appendingPathComponent("/inspect/\(sessionIdentifier)"),
+            resolvingAgainstBaseURL: false
+        )
+        components?.queryItems = [URLQueryItem(name: "since", value: "\(cursor)")]
+        guard let inspectionEndpointURL = components?.url else {
+            throw Exception(description: "Failed to build inspection URL for session \(sessionIdentifier).")
+        }
+
+        let (inspectionData, response) = try getSynchronously(url: inspectionEndpointURL)
+        guard let nextCursor = response.value(forHTTPHeaderField: "X-Next-Cursor").flatMap({ Int($0) }) else {
+            throw Exception(description: "Python server did not return the next cursor.")
+        }
+        return (requests: try decodeRequests(from: inspectionData), nextCursor: nextCursor)
+    }
+
+    /// Blocks until the server records at least `minCount` requests in given session or `timeout` is exceeded.
+    /// Returns the number of requests recorded in this session.
+    @discardableResult
+    internal func waitForRecordedRequests(sessionIdentifier: String, minCount: Int, timeout: TimeInterval) throws -> Int {
+        var components = URLComponents(url: baseURL.appendingPathComponent("/wait"), resolvingAgainstBaseURL: false)
+        components?.queryItems = [
+            URLQueryItem(name: "session", value: sessionIdentifier),
+            URLQueryItem(name: "min_count", value: "\(minCount)"),
+            URLQueryItem(name: "timeout", value: "\(max(timeout, 0))"),
+        ]
+        guard let waitEndpointURL = components?.url else {
+            throw Exception(description: "Failed to build wait URL for session \(sessionIdentifier).")
+        }
+
+        let (waitData, _) = try getSynchronously(url: waitEndpointURL, timeout: timeout + 5)
+        guard let count = (try JSONSerialization.jsonObject(with: waitData) as? [String: Any])?["count"] as? Int else {
+            throw Exception(description: "Failed to decode wait result retrieved from Python server.")
+        }
+        return count
+    }
+
+    private func getRequests(from inspectionEndpointURL: URL) throws -> [Request] {
         let inspectionData = try Data(contentsOf: inspectionEndpointURL)
+        return try decodeRequests(from: inspectionData)
+    }
+
+    private func decodeRequests(from inspectionData: Data) throws -> [Request] {
         let intermediateRequests = try jsonDecoder
             .decode([IntermediateRequest].self, from: inspectionData)
 
         return try intermediateRequests
             .map { try Request(intermediateRequest: $0) }
     }
+
+    private func getSynchronously(url: URL, timeout: TimeInterval = 60) throws -> (Data, HTTPURLResponse) {
+        let request = URLRequest(url: url, cachePolicy: .reloadIgnoringLocalCacheData, timeoutInterval: timeout)
+        return try sendSynchronously(request: request)
+    }
+
+    /// Sends given request and blocks until the response. Throws if the server responds with non-2xx status code.
+    private func sendSynchronously(request: URLRequest) throws -> (Data, HTTPURLResponse) {
+        let url = request.url?.absoluteString ?? ""
+        let semaphore = DispatchSemaphore(value: 0)
+        var result: Result<(Data, HTTPURLResponse), Error> = .failure(
+            Exception(description: "No response from Python server for \(url).")
+        )
+
+        URLSession.shared.dataTask(with: request) { data, response, error in
+            if let error = error {
+                result = .failure(error)
+            } else if let response = response as? HTTPURLResponse, (200..<300).contains(response.statusCode) {
+                result = .success((data ?? Data(), response))
+            } else {
+                let statusCode = (response as? HTTPURLResponse)?.statusCode ?? 0
+                result = .failure(Exception(description: "Python server responded with status code \(statusCode) for \(url)."))
+            }
+            semaphore.signal()
+        }.resume()
+
+        semaphore.wait()
+        return try result.get()
+    }
 }
@@ -28,14 +28,15 @@ public class ServerProcessRunner {
             if ping() {
                 return ServerProcess(serverURL: serverURL)
             }
-            Thread.sleep(forTimeInterval: 0.5)
+            Thread.sleep(forTimeInterval: 0.05) // the server starts in about 150ms, so it is polled often
         }
 
         return nil
     }
 
     private func ping() -> Bool {
-        let knownEndpointURL = serverURL.appendingPathComponent("/inspect")
-        return (try? Data(contentsOf: knownEndpointURL)) != nil
+        // `/health` is cheap to call, unlike `/inspect` which lists the whole history
+        let healthEndpointURL = serverURL.appendingPathComponent("/health")
+        return (try? Data(contentsOf: healthEndpointURL)) != nil
     }
 }
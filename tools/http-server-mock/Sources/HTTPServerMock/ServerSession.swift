@@ -21,11 +21,16 @@ public class ServerSession {
         self.recordingURL = server.baseURL.appendingPathComponent(sessionIdentifier)
     }
 
+    /// Closes this session, so the server frees requests recorded in it and ignores further ones.
+    /// Other sessions are not affected, so it is safe to call from tests sharing the server.
+    /// Blocks until the server closes the session and throws if it fails to.
+    public func close() throws {
+        try server.closeSession(sessionIdentifier: sessionIdentifier)
+    }
+
     /// Returns all requests recorded by the server in this session.
     public func getRecordedRequests() throws -> [Request] {
-        return try server
-            .getRecordedRequests() // get all recorded requests info
-            .filter { request in request.path.contains(sessionIdentifier) } // narrow it to this session
+        return try server.getRecordedRequests(sessionIdentifier: sessionIdentifier)
     }
 
     /// Actively fetches requests recorded by the server in this session until given `condition` evaluated to `true`.
@@ -43,12 +48,25 @@ public class ServerSession {
             timeoutTimer.activate()
         }
 
+        let deadline = Date(timeIntervalSinceNow: timeout)
         var pulledRequests: [Request] = []
+        var cursor = 0
         var conditionMet = false
         repeat {
-            pulledRequests = try getRecordedRequests()
+            // Only fetch requests which were not pulled yet
+            let page = try server.getRecordedRequests(sessionIdentifier: sessionIdentifier, since: cursor)
+            pulledRequests += page.requests
+            cursor = page.nextCursor
             conditionMet = try condition(pulledRequests)
-            Thread.sleep(forTimeInterval: 0.2)
+
+            if !conditionMet {
+                // Block on the server until next request is recorded, instead of polling
+                try server.waitForRecordedRequests(
+                    sessionIdentifier: sessionIdentifier,
+                    minCount: pulledRequests.count + 1,
+                    timeout: deadline.timeIntervalSinceNow
+                )
+            }
         } while !(timeoutTimer.isCancelled || conditionMet)
 
         if timeoutTimer.isCancelled {
@@ -111,6 +111,85 @@ final class HTTPServerMockTests: XCTestCase {
         XCTAssertEqual(recordedRequests[1].httpHeaders["Header2"], "Value2")
     }
 
+    func testItPullsOnlyRequestsRecordedAfterPreviousPage() throws {
+        let runner = ServerProcessRunner(serverURL: URL(string: "http://127.0.0.1:8000")!)
+        guard let serverProcess = runner.waitUntilServerIsReachable() else {
+            XCTFail("Failed to connect with the server.")
+            return
+        }
+
+        // Given
+        let server = ServerMock(serverProcess: serverProcess)
+        let session = server.obtainUniqueRecordingSession()
+
+        let requests: [URLRequest] = (1...3).map { index in
+            var request = URLRequest(url: session.recordingURL.appendingPathComponent("/resource/\(index)"))
+            request.httpMethod = "POST"
+            request.httpBody = "request body \(index)".data(using: .utf8)!
+            return request
+        }
+        sendSynchronously(request: requests[0])
+
+        // When
+        let initialTime = Date()
+        DispatchQueue.global(qos: .userInitiated).async {
+            Thread.sleep(forTimeInterval: 0.5)
+            sendAsynchronously(request: requests[1])
+            Thread.sleep(forTimeInterval: 0.5)
+            sendAsynchronously(request: requests[2])
+        }
+        let timeoutTime: TimeInterval = 3
+
+        // Then
+        var pulledCounts: [Int] = []
+        let recordedRequests = try session.pullRecordedRequests(timeout: timeoutTime) { requests in
+            pulledCounts.append(requests.count)
+            return requests.count >= 3
+        }
+        XCTAssertLessThan(Date(), initialTime.addingTimeInterval(timeoutTime))
+        XCTAssertEqual(pulledCounts, [1, 2, 3], "Each page must be pulled after the server records next request")
+        XCTAssertEqual(recordedRequests.count, 3)
+        XCTAssertTrue(recordedRequests[0].path.hasSuffix("/resource/1"))
+        XCTAssertTrue(recordedRequests[1].path.hasSuffix("/resource/2"))
+        XCTAssertTrue(recordedRequests[2].path.hasSuffix("/resource/3"))
+    }
+
+    func testWhenSessionIsClosed_itDoesNotReturnRequestsSentToIt() throws {
+        let runner = ServerProcessRunner(serverURL: URL(string: "http://127.0.0.1:8000")!)
+        guard let serverProcess = runner.waitUntilServerIsReachable() else {
+            XCTFail("Failed to connect with the server.")
+            return
+        }
+
+        // Given
+        let server = ServerMock(serverProcess: serverProcess)
+        let session = server.obtainUniqueRecordingSession()
+        let otherSession = server.obtainUniqueRecordingSession()
+
+        var request1 = URLRequest(url: session.recordingURL.appendingPathComponent("/resource/1"))
+        request1.httpMethod = "POST"
+        request1.httpBody = "1st request body".data(using: .utf8)!
+
+        var request2 = URLRequest(url: session.recordingURL.appendingPathComponent("/resource/2"))
+        request2.httpMethod = "POST"
+        request2.httpBody = "2nd request body".data(using: .utf8)!
+
+        var otherRequest = URLRequest(url: otherSession.recordingURL.appendingPathComponent("/resource/1"))
+        otherRequest.httpMethod = "POST"
+        otherRequest.httpBody = "other request body".data(using: .utf8)!
+
+        sendSynchronously(request: request1)
+        sendSynchronously(request: otherRequest)
+
+        // When
+        try session.close()
+        sendSynchronously(request: request2) // e.g. retried upload
+
+        // Then
+        XCTAssertEqual(try session.getRecordedRequests().count, 0)
+        XCTAssertEqual(try otherSession.getRecordedRequests().count, 1)
+    }
+
     func testWhenPullingRecordedRequestExceedsTimeout_itThrowsAnError() throws {
         let runner = ServerProcessRunner(serverURL: URL(string: "http://127.0.0.1:8000")!)
         guard let serverProcess = runner.waitUntilServerIsReachable() else {
@@ -161,9 +240,9 @@ private func sendSynchronously(request: URLRequest) {
         XCTAssertNil(error)
         semaphore.signal()
     }
-    _ = semaphore.wait(timeout: .now() + 1)
-
     task.resume()
+
+    _ = semaphore.wait(timeout: .now() + 1)
 }
 
 private func sendAsynchronously(request: URLRequest) {
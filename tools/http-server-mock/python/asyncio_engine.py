@@ -0,0 +1,259 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+from http import HTTPStatus
+from http.client import parse_headers, HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from mock_server import MockRequest
+from request_body import RequestBodyDecoder, BodyTooLargeError, ReadThrottle, READ_CHUNK_SIZE, parse_chunk_size
+import io
+import time
+import zlib
+import socket
+import asyncio
+import threading
+
+class BadRequestError(Exception):
+    def __init__(self, status=400):
+        self.status = status
+
+class AsyncioEngine:
+    """
+    Concurrent engine, based on `asyncio`. It speaks HTTP/1.1 with keep-alive and serves all connections
+    from a single event loop, so one slow upload doesn't block other clients.
+
+    Exposes the same interface as `socketserver.TCPServer`: the socket is bound on init, then `serve_forever()`
+    runs the loop until `shutdown()` is called from another thread.
+    """
+
+    # Max size of the request line and headers
+    MAX_HEAD_SIZE = 64 * 1024
+
+    # Max number of requests blocking concurrently (e.g. long-polling `GET /wait`)
+    MAX_BLOCKING_REQUESTS = 256
+
+    # Min number of bytes of streamed response produced in one call to the executor
+    STREAMED_BATCH_SIZE = 64 * 1024
+
+    def __init__(self, server_address, mock_server, backlog=1024):
+        self.mock_server = mock_server
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(server_address)
+        self.socket.listen(backlog)
+        self.server_address = self.socket.getsockname()
+        self.__loop = None
+        self.__stop = None
+        self.__is_shut_down = threading.Event()
+        self.__blocking_executor = ThreadPoolExecutor(max_workers=self.MAX_BLOCKING_REQUESTS, thread_name_prefix='AsyncioEngine')
+
+    def serve_forever(self):
+        self.__is_shut_down.clear()
+        try:
+            asyncio.run(self.__serve())
+        finally:
+            self.__is_shut_down.set()
+
+    def shutdown(self):
+        """
+        Stops the `serve_forever()` loop and waits until it exits. Must be called from another thread.
+        """
+        if self.__loop is not None:
+            self.__loop.call_soon_threadsafe(self.__stop.set)
+            self.__is_shut_down.wait()
+
+    def server_close(self):
+        self.socket.close()
+        # Threads of the executor keep the process alive until they finish, so requests long-polling `GET /wait`
+        # are released instead of waiting for their timeout
+        self.mock_server.release_waiting_requests()
+        self.__blocking_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __serve(self):
+        self.__loop = asyncio.get_running_loop()
+        self.__stop = asyncio.Event()
+        server = await asyncio.start_server(self.__handle_connection, sock=self.socket, limit=self.MAX_HEAD_SIZE)
+        async with server:
+            await self.__stop.wait()
+
+    async def __handle_connection(self, reader, writer):
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request, version, keep_alive = await self.__read_request(reader, writer)
+                except BadRequestError as error:
+                    await self.__write_response(writer, error.status, [], bytes(), keep_alive=False)
+                    return
+                if request is None:
+                    return # connection closed by the client
+
+                # Requests which wait or process the history are handled on the executor, so they don't stall
+                # other connections - and so are streamed responses produced from the history
+                may_block = self.mock_server.may_block(request)
+                if may_block:
+                    response = await self.__loop.run_in_executor(self.__blocking_executor, self.mock_server.handle, request)
+                else:
+                    response = self.mock_server.handle(request)
+
+                if not response.is_streamed:
+                    await self.__write_response(writer, response.status, response.headers, response.body, keep_alive)
+                elif version == 'HTTP/1.1':
+                    await self.__write_chunked_response(writer, response.status, response.headers, self.__chunks(response.body, may_block), keep_alive)
+                else:
+                    # HTTP/1.0 clients don't support chunked encoding - the end of body is signalled by closing the connection
+                    keep_alive = False
+                    await self.__write_streamed_response(writer, response.status, response.headers, self.__chunks(response.body, may_block))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass # client went away
+        finally:
+            writer.close()
+
+    async def __read_request(self, reader, writer):
+        """
+        Reads one request from the connection.
+        :return: tuple of `MockRequest` (or `None` on EOF), HTTP version and the keep-alive flag
+        """
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as error:
+            if len(error.partial) == 0:
+                return None, None, False
+            raise BadRequestError()
+        except asyncio.LimitOverrunError:
+            raise BadRequestError()
+
+        request_line, _, header_lines = head.partition(b'\r\n')
+        try:
+            method, path, version = request_line.decode('iso-8859-1').split()
+            headers = parse_headers(io.BytesIO(header_lines))
+        except (ValueError, HTTPException):
+            raise BadRequestError()
+
+        connection = headers.get('Connection', '').lower()
+        if version == 'HTTP/1.1':
+            keep_alive = connection != 'close'
+        else:
+            keep_alive = connection == 'keep-alive'
+
+        if headers.get('Expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            await writer.drain()
+
+        try:
+            start = time.perf_counter()
+            body, decoder = await self.__read_body(reader, headers, self.mock_server.upload_bandwidth(method, path))
+            read_time = time.perf_counter() - start
+        except BodyTooLargeError:
+            raise BadRequestError(status=413) # payload too large
+        except (ValueError, zlib.error, asyncio.LimitOverrunError):
+            raise BadRequestError()
+
+        request = MockRequest(
+            method, path, headers, body,
+            raw_size=decoder.raw_size, read_time=read_time, decompression_time=decoder.decompression_time
+        )
+        return request, version, keep_alive
+
+    async def __read_body(self, reader, headers, bandwidth):
+        """
+        Reads request body in fixed-size chunks (either with `Content-Length` or chunked transfer encoding),
+        decoding it on the fly. Reading is throttled to `bandwidth` bytes per second, if set.
+        :return: tuple of decoded body and the `RequestBodyDecoder` which decoded it
+        """
+        is_chunked = 'chunked' in headers.get('Transfer-Encoding', '').lower()
+        content_length = None if is_chunked else int(headers.get('Content-Length', 0))
+        if content_length is not None and content_length < 0:
+            raise ValueError('Negative Content-Length')
+        decoder = RequestBodyDecoder(headers.get('Content-Encoding'), self.mock_server.max_body_size, expected_size=content_length)
+        throttle = ReadThrottle(bandwidth) if bandwidth is not None else None
+
+        if is_chunked:
+            while True:
+                chunk_size = parse_chunk_size(await reader.readuntil(b'\n'))
+                if chunk_size == 0:
+                    break
+                await self.__read_into(reader, decoder, chunk_size, throttle)
+                if (await reader.readuntil(b'\n')).strip() != b'':
+                    raise ValueError('Missing CRLF after chunk')
+            while (await reader.readuntil(b'\n')).strip() != b'':
+                pass # skip trailers
+        else:
+            await self.__read_into(reader, decoder, content_length, throttle)
+
+        return decoder.finish(), decoder
+
+    async def __read_into(self, reader, decoder, size, throttle):
+        remaining = size
+        while remaining > 0:
+            chunk = await reader.read(min(remaining, READ_CHUNK_SIZE))
+            if not chunk:
+                raise asyncio.IncompleteReadError(bytes(), remaining)
+            decoder.feed(chunk)
+            remaining -= len(chunk)
+            if throttle is not None:
+                await asyncio.sleep(throttle.delay(len(chunk)))
+
+    async def __chunks(self, chunks, on_executor):
+        """
+        Iterates chunks of streamed response body. If `on_executor` is set, chunks are produced on the executor,
+        in batches of at least `STREAMED_BATCH_SIZE` bytes (joined into one chunk).
+        """
+        iterator = iter(chunks)
+        while True:
+            if on_executor:
+                batch = await self.__loop.run_in_executor(self.__blocking_executor, _next_batch, iterator, self.STREAMED_BATCH_SIZE)
+                chunk = b''.join(batch) if len(batch) > 0 else None
+            else:
+                chunk = next(iterator, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    async def __write_response(self, writer, status, headers, body, keep_alive):
+        self.__write_head(writer, status, headers + [('Content-Length', str(len(body)))], keep_alive)
+        writer.write(body)
+        await writer.drain()
+
+    async def __write_chunked_response(self, writer, status, headers, chunks, keep_alive):
+        self.__write_head(writer, status, headers + [('Transfer-Encoding', 'chunked')], keep_alive)
+        async for chunk in chunks:
+            if len(chunk) > 0:
+                writer.write(b'%x\r\n' % len(chunk))
+                writer.write(chunk)
+                writer.write(b'\r\n')
+                await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def __write_streamed_response(self, writer, status, headers, chunks):
+        self.__write_head(writer, status, headers, keep_alive=False)
+        async for chunk in chunks:
+            writer.write(chunk)
+            await writer.drain()
+
+    def __write_head(self, writer, status, headers, keep_alive):
+        try:
+            phrase = HTTPStatus(status).phrase
+        except ValueError:
+            phrase = '' # like `http.server`, for statuses unknown to `HTTPStatus` (e.g. `599` set by response rules)
+        lines = [f'HTTP/1.1 {status} {phrase}']
+        lines += [f'{field}: {value}' for field, value in headers]
+        lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1'))
+
+def _next_batch(iterator, min_size):
+    """
+    Returns next chunks of given iterator, until they have at least `min_size` bytes (or the iterator is exhausted).
+    """
+    batch = []
+    size = 0
+    for chunk in iterator:
+        batch.append(chunk)
+        size += len(chunk)
+        if size >= min_size:
+            break
+    return batch
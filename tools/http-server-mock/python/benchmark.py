@@ -0,0 +1,254 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+# Load generator measuring how much SDK traffic the mock server can absorb.
+#
+# It runs `HTTPMockServer` in this process on an ephemeral port and uploads synthesized SDK payloads
+# (deflate-compressed RUM and logs batches, multipart Session Replay segments) from concurrent keep-alive
+# connections. Reported metrics: throughput, latency percentiles, RSS growth and the cost of `GET /inspect`
+# as the history grows. Results can be written to JSON file and compared against a stored baseline:
+#
+#   python3 benchmark.py --output results.json
+#   python3 benchmark.py --baseline results.json --tolerance 0.2
+
+from requests_history import GenericRequestsHistory
+from mock_server import HTTPMockServer
+from payload_decoders import PayloadDecoders
+from rum_index import RUMEventsIndex
+from start_mock_server import ENGINES, engine_class
+import os
+import sys
+import json
+import time
+import uuid
+import zlib
+import random
+import resource
+import argparse
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+# Metrics compared against the baseline, with `True` if higher value is better
+COMPARED_METRICS = {
+    'throughput': True,
+    'latency_p50': False,
+    'latency_p99': False,
+    'rss_growth': False,
+    'inspect_time': False,
+}
+
+def rum_payload(events_count, rng):
+    """
+    Synthesizes RUM batch: NDJSON of view updates, actions and resources, compressed as by the SDK.
+    """
+    session_id, view_id = str(uuid.UUID(int=rng.getrandbits(128))), str(uuid.UUID(int=rng.getrandbits(128)))
+    events = []
+    for i in range(events_count):
+        event_type = rng.choice(['view', 'action', 'resource'])
+        events.append({
+            'type': event_type,
+            'date': 1600000000000 + i,
+            'application': {'id': 'benchmark'},
+            'session': {'id': session_id, 'type': 'user'},
+            'view': {'id': view_id, 'url': 'BenchmarkViewController', 'name': 'Benchmark'},
+            '_dd': {'document_version': i, 'format_version': 2},
+            event_type: {'id': str(i), 'type': 'custom', 'duration': rng.randint(0, 10 ** 9)},
+        })
+    body = '\n'.join([json.dumps(event) for event in events]).encode('utf-8')
+    return '/api/v2/rum', 'text/plain;charset=UTF-8', zlib.compress(body)
+
+def logs_payload(events_count, rng):
+    """
+    Synthesizes logs batch: JSON array of logs, compressed as by the SDK.
+    """
+    logs = [{
+        'date': '2019-12-15T10:00:00.000Z',
+        'status': rng.choice(['debug', 'info', 'warn', 'error']),
+        'message': 'Benchmark log message ' + 'x' * rng.randint(0, 200),
+        'service': 'benchmark',
+        'logger.name': 'benchmark',
+    } for _ in range(events_count)]
+    return '/api/v2/logs', 'application/json', zlib.compress(json.dumps(logs).encode('utf-8'))
+
+def replay_payload(events_count, rng):
+    """
+    Synthesizes Session Replay upload: multipart form with compressed segments and segment metadata.
+    """
+    boundary = str(uuid.UUID(int=rng.getrandbits(128)))
+    segment = {'records': [{'type': 10, 'timestamp': i, 'data': {'wireframes': []}} for i in range(events_count)]}
+    parts = [
+        ('segment', 'file0', 'application/octet-stream', zlib.compress(json.dumps(segment).encode('utf-8') + b'\n')),
+        ('event', 'blob', 'application/json', json.dumps([{'records_count': events_count}]).encode('utf-8')),
+    ]
+    body = b''
+    for name, filename, mime_type, data in parts:
+        body += f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'.encode('utf-8')
+        body += f'Content-Type: {mime_type}\r\n\r\n'.encode('utf-8') + data + b'\r\n'
+    body += f'--{boundary}--'.encode('utf-8')
+    return '/api/v2/replay', f'multipart/form-data; boundary={boundary}', body
+
+PAYLOADS = {
+    'rum': (rum_payload, 'deflate'),
+    'logs': (logs_payload, 'deflate'),
+    'replay': (replay_payload, None),
+}
+
+def percentile(sorted_values, fraction):
+    if len(sorted_values) == 0:
+        return 0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+def rss_bytes():
+    """
+    Returns current resident set size of this process (peak RSS if current one is not available).
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024 # bytes on macOS, KiB on Linux
+
+def upload(ip, port, uploads, session_id):
+    """
+    Sends given uploads one by one over single keep-alive connection, recording them in given session.
+    :return: list of latencies (seconds)
+    """
+    connection = http.client.HTTPConnection(ip, port)
+    latencies = []
+    for path, content_type, body, encoding in uploads:
+        headers = {'Content-Type': content_type}
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+        start = time.perf_counter()
+        connection.request('POST', f'/{session_id}{path}', body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            raise RuntimeError(f'Upload failed with {response.status}')
+    connection.close()
+    return latencies
+
+def measure_inspect(ip, port):
+    """
+    Measures `GET /inspect` of the whole history.
+    :return: tuple of duration (seconds) and response size (bytes)
+    """
+    connection = http.client.HTTPConnection(ip, port)
+    start = time.perf_counter()
+    connection.request('GET', '/inspect')
+    size = len(connection.getresponse().read())
+    duration = time.perf_counter() - start
+    connection.close()
+    return duration, size
+
+def run_benchmark(engine='http.server', requests=2000, concurrency=8, events_per_batch=20, inspect_every=500, seed=0):
+    """
+    Runs the benchmark against in-process server.
+    :return: dictionary of results
+    """
+    rng = random.Random(seed)
+    uploads = []
+    for _ in range(requests):
+        generate, encoding = PAYLOADS[rng.choice(list(PAYLOADS.keys()))]
+        uploads.append(generate(events_per_batch, rng) + (encoding,))
+
+    history = GenericRequestsHistory(rum_index=RUMEventsIndex())
+    server = HTTPMockServer(history, payload_decoders=PayloadDecoders.default())
+    httpd = engine_class(engine)(('127.0.0.1', 0), server)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    ip, port = httpd.server_address
+
+    latencies = []
+    inspect_samples = []
+    try:
+        rss_before = rss_bytes()
+        duration = 0
+        # Upload in rounds of `inspect_every` requests to sample `/inspect` cost as the history grows
+        for round_start in range(0, requests, inspect_every):
+            round_end = min(round_start + inspect_every, requests)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                workers = [
+                    executor.submit(upload, ip, port, uploads[first_index:round_end:concurrency], f'session-{first_index % concurrency}')
+                    for first_index in range(round_start, min(round_start + concurrency, round_end))
+                ]
+                for worker in workers:
+                    latencies += worker.result()
+            duration += time.perf_counter() - start
+            inspect_time, inspect_size = measure_inspect(ip, port)
+            inspect_samples.append({'requests': round_end, 'time': inspect_time, 'bytes': inspect_size})
+        rss_after = rss_bytes()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        thread.join()
+
+    latencies.sort()
+    return {
+        'engine': engine,
+        'requests': requests,
+        'concurrency': concurrency,
+        'events_per_batch': events_per_batch,
+        'uploaded_bytes': sum([len(upload[2]) for upload in uploads]),
+        'throughput': requests / duration if duration > 0 else 0,
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p90': percentile(latencies, 0.9),
+        'latency_p99': percentile(latencies, 0.99),
+        'rss_growth': max(rss_after - rss_before, 0),
+        'inspect_time': inspect_samples[-1]['time'] if len(inspect_samples) > 0 else 0,
+        'inspect_samples': inspect_samples,
+    }
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results against the baseline.
+    :return: list of descriptions of metrics which regressed by more than `tolerance` (fraction of baseline value)
+    """
+    regressions = []
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        expected, actual = baseline.get(metric), results.get(metric)
+        if expected is None or actual is None or expected == 0:
+            continue
+        change = (actual - expected) / expected
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append(f'{metric}: {actual:.6g} vs {expected:.6g} in baseline ({change:+.0%})')
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures throughput of the mock server under synthesized SDK traffic")
+    parser.add_argument("--engine", choices=ENGINES.keys(), default='http.server', help="The engine serving HTTP connections")
+    parser.add_argument("--requests", type=int, default=2000, help="Total number of uploads")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent connections")
+    parser.add_argument("--events-per-batch", type=int, default=20, help="Number of events in one upload")
+    parser.add_argument("--inspect-every", type=int, default=500, help="Measure `GET /inspect` after every this many uploads")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for synthesized payloads")
+    parser.add_argument("--output", help="JSON file to write results to")
+    parser.add_argument("--baseline", help="JSON file with results to compare against; exits with 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression as a fraction of baseline value")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        engine=args.engine,
+        requests=args.requests,
+        concurrency=args.concurrency,
+        events_per_batch=args.events_per_batch,
+        inspect_every=args.inspect_every,
+        seed=args.seed
+    )
+    print(json.dumps({key: value for key, value in results.items() if key != 'inspect_samples'}, indent=2))
+    if args.output is not None:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print(f'Regression - {regression}')
+        sys.exit(1 if len(regressions) > 0 else 0)
@@ -0,0 +1,72 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import hashlib
+
+def digest(data):
+    """
+    Returns 128-bit BLAKE2b hash of given bytes, identifying them in `BlobStore`.
+    """
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+class BlobStore:
+    """
+    Content-addressed store of immutable bytes (request bodies and headers), keyed by their `digest()`.
+
+    Identical bytes are kept once: `intern()` returns the stored instance shared by every holder and counts
+    the reference, `release()` drops the bytes once the last holder releases them. Each blob also carries
+    a cache of its encodings (see `GenericRequest.encoded()`), which is shared by its holders and dropped with
+    the blob. It is not synchronised - it is guarded by the lock of `GenericRequestsHistory`, like the storage
+    owning it.
+    """
+
+    def __init__(self):
+        self.__blobs = {} # digest -> `[bytes, reference count, {encoding name -> encoded bytes}]`
+        self.__size = 0 # bytes of stored blobs
+        self.__referenced_size = 0 # bytes of all references, i.e. the size without deduplication
+
+    def intern(self, data, data_digest):
+        """
+        References given bytes with given `digest()`.
+        :return: the stored instance of these bytes
+        """
+        blob = self.__blobs.get(data_digest)
+        if blob is None:
+            blob = self.__blobs[data_digest] = [data, 0, {}]
+            self.__size += len(data)
+        blob[1] += 1
+        self.__referenced_size += len(data)
+        return blob[0]
+
+    def release(self, data_digest):
+        """
+        Drops one reference to bytes with given `digest()`.
+        """
+        blob = self.__blobs[data_digest]
+        blob[1] -= 1
+        self.__referenced_size -= len(blob[0])
+        if blob[1] == 0:
+            del self.__blobs[data_digest]
+            self.__size -= len(blob[0])
+
+    def encodings(self, data_digest):
+        """
+        Returns the cache of encodings of bytes with given `digest()`, which lives as long as the bytes are stored.
+        """
+        return self.__blobs[data_digest][2]
+
+    def stats(self):
+        return {
+            "blobs": len(self.__blobs),
+            "bytes": self.__size,
+            "referenced_bytes": self.__referenced_size,
+            "encoded_bytes": sum([len(encoding) for blob in self.__blobs.values() for encoding in list(blob[2].values())]),
+        }
+
+    def clear(self):
+        self.__blobs.clear()
+        self.__size = 0
+        self.__referenced_size = 0
@@ -0,0 +1,124 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+from generic_request import GenericRequest
+from inspection_formats import BINARY_RECORD_HEADER, binary_record
+import json
+import mmap
+import struct
+
+# Content type of capture files served by `GET /capture`
+CAPTURE_CONTENT_TYPE = 'application/x-mock-server-capture'
+
+# Magic bytes starting (and ending) the capture file
+CAPTURE_MAGIC = b'MOCKCAP1'
+
+# Trailer closing the capture file: offset of the index, number of records and `CAPTURE_MAGIC`
+CAPTURE_TRAILER = struct.Struct('>QQ8s')
+
+def capture_chunks(generic_requests):
+    """
+    Encodes requests as a capture file, in chunks. The file is written append-only:
+    - `CAPTURE_MAGIC`,
+    - requests, each encoded as binary record (see `inspection_formats.binary_record()`),
+    - index: offsets of all records (big-endian `uint64`),
+    - `CAPTURE_TRAILER`.
+    If the file is truncated (e.g. the server was killed while writing it), records can still be read without the index.
+    """
+    offsets = []
+    offset = len(CAPTURE_MAGIC)
+    yield CAPTURE_MAGIC
+    for generic_request in generic_requests:
+        offsets.append(offset)
+        for part in binary_record(generic_request):
+            offset += len(part)
+            yield part
+    yield struct.pack(f'>{len(offsets)}Q', *offsets)
+    yield CAPTURE_TRAILER.pack(offset, len(offsets), CAPTURE_MAGIC)
+
+def write_capture(path, generic_requests):
+    """
+    Writes requests to capture file at given path.
+    """
+    with open(path, 'wb') as file:
+        for chunk in capture_chunks(generic_requests):
+            file.write(chunk)
+
+class CaptureFile:
+    """
+    Capture file loaded with memory mapping. Opening it only reads the index, records are decoded
+    to `GenericRequest` when accessed.
+
+    With `copy=False`, headers and bodies of decoded requests are `memoryview`s of the mapped file instead of
+    `bytes` copies, so loading a capture doesn't read or copy their data (pages are read by the OS when accessed).
+    Such requests are only valid while the file is open.
+    """
+
+    def __init__(self, path, copy=True):
+        self.copy = copy
+        with open(path, 'rb') as file:
+            try:
+                self.__mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError(f'Empty capture file: {path}')
+        if self.__mmap[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            self.__mmap.close()
+            raise ValueError(f'Not a capture file: {path}')
+        self.__view = memoryview(self.__mmap)
+        self.offsets = self.__read_index()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        return self.__generic_request(self.offsets[index])
+
+    def __iter__(self):
+        for offset in self.offsets:
+            yield self.__generic_request(offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        self.__view.release()
+        self.__mmap.close() # raises `BufferError` if requests decoded with `copy=False` are still referenced
+
+    def __read_index(self):
+        size = len(self.__mmap)
+        if size >= len(CAPTURE_MAGIC) + CAPTURE_TRAILER.size:
+            index_offset, count, magic = CAPTURE_TRAILER.unpack_from(self.__mmap, size - CAPTURE_TRAILER.size)
+            if magic == CAPTURE_MAGIC and index_offset + count * 8 + CAPTURE_TRAILER.size == size:
+                return list(struct.unpack_from(f'>{count}Q', self.__mmap, index_offset))
+
+        # No index (truncated file) - find complete records by scanning
+        offsets = []
+        offset = len(CAPTURE_MAGIC)
+        while offset + BINARY_RECORD_HEADER.size <= size:
+            lengths = BINARY_RECORD_HEADER.unpack_from(self.__mmap, offset)
+            end = offset + BINARY_RECORD_HEADER.size + sum(lengths)
+            if end > size:
+                break
+            offsets.append(offset)
+            offset = end
+        return offsets
+
+    def __generic_request(self, offset):
+        metadata_length, headers_length, body_length = BINARY_RECORD_HEADER.unpack_from(self.__mmap, offset)
+        offset += BINARY_RECORD_HEADER.size
+        metadata = json.loads(self.__mmap[offset:offset + metadata_length])
+        offset += metadata_length
+        data = self.__mmap if self.copy else self.__view # slicing `mmap` copies, slicing `memoryview` doesn't
+        headers = data[offset:offset + headers_length]
+        offset += headers_length
+        body = data[offset:offset + body_length]
+
+        generic_request = GenericRequest(metadata["method"], metadata["path"], headers, body, arrival_time=metadata.get("arrival_time"))
+        generic_request.id = metadata["id"]
+        return generic_request
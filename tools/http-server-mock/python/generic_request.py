@@ -0,0 +1,77 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+from urllib.parse import urlsplit
+from blob_store import digest
+import time
+
+def session_id_from_path(path):
+    """
+    Returns the recording session identifier for given request path, i.e. its first path component.
+    Swift `ServerSession` records requests under `/<session UUID>/...`.
+    """
+    return urlsplit(path).path.lstrip('/').split('/', 1)[0]
+
+class GenericRequest:
+    """
+    Represents data of request sent to generic endponit.
+    """
+
+    def __init__(self, http_method, path, http_headers, http_body, arrival_time=None):
+        self.id = None # set later by `GenericRequestsHistory`
+        self.session_id = session_id_from_path(path)
+        self.arrival_time = arrival_time if arrival_time is not None else time.time()
+        self.path = path
+        self.http_method = http_method
+        self.http_headers = http_headers
+        self.http_body = http_body
+        self.events = None # events decoded from the body at ingest (see `payload_decoders.py`), if it is known payload
+        self.events_size = 0 # number of bytes of JSON the `events` were decoded from
+        self.decoding_error = None # set if decoding events has failed
+        self.simulated_response = None # outcome of response rule applied to this request (see `response_rules.py`), if any
+        self.blob_encodings = {} # cached encodings of headers and body: attribute -> {encoding name -> bytes} (see `encoded()`)
+        self.digests = {} # cached digests of headers and body (see `digest()`)
+
+    @property
+    def size(self):
+        """
+        Approximate number of bytes this request occupies in the history, including its decoded events.
+        """
+        return len(self.path) + len(self.http_headers) + len(self.http_body) + self.events_size
+
+    def encoded(self, attribute, encoding_name, encode):
+        """
+        Returns `http_headers` or `http_body` encoded with `encode(bytes)`. Recorded requests never change, so each
+        encoding is computed once. In `MemoryStorage` the cache belongs to the deduplicated blob, so it is shared
+        by requests with identical content and freed together with it. `SQLiteStorage` reads a new `GenericRequest`
+        on every access and doesn't keep encodings in memory, so with it they are computed on every read.
+        """
+        encodings = self.blob_encodings.get(attribute)
+        if encodings is None:
+            encodings = self.blob_encodings[attribute] = {}
+        encoding = encodings.get(encoding_name)
+        if encoding is None:
+            encoding = encodings[encoding_name] = encode(getattr(self, attribute))
+        return encoding
+
+    def digest(self, attribute):
+        """
+        Returns the hash of `http_headers` or `http_body` (see `blob_store.digest()`), computed once.
+        """
+        attribute_digest = self.digests.get(attribute)
+        if attribute_digest is None:
+            attribute_digest = self.digests[attribute] = digest(getattr(self, attribute))
+        return attribute_digest
+
+    def header(self, field):
+        """
+        Returns the value of given header (case-insensitive) or `None` if it is not set.
+        """
+        for line in bytes(self.http_headers).decode('utf-8').split('\n'):
+            name, separator, value = line.partition(':')
+            if separator and name.strip().lower() == field.lower():
+                return value.strip()
+        return None
@@ -0,0 +1,133 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from mock_server import MockRequest, MockResponse
+from request_body import RequestBodyDecoder, BodyTooLargeError, ReadThrottle, READ_CHUNK_SIZE, parse_chunk_size
+import time
+import zlib
+
+class HTTPServerEngineRequestHandler(BaseHTTPRequestHandler):
+    """
+    Reads requests with `http.server` and passes them to `HTTPMockServer`.
+    """
+
+    # Enables keep-alive and chunked responses
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.__handle()
+
+    def do_GET(self):
+        self.__handle()
+
+    def do_PUT(self):
+        self.__handle()
+
+    def do_DELETE(self):
+        self.__handle()
+
+    # Max length of a line in chunked body
+    MAX_LINE_LENGTH = 64 * 1024
+
+    def __handle(self):
+        mock_server = self.server.mock_server
+        try:
+            start = time.perf_counter()
+            body, decoder = self.__read_body(mock_server.max_body_size, mock_server.upload_bandwidth(self.command, self.path))
+            read_time = time.perf_counter() - start
+        except BodyTooLargeError:
+            self.close_connection = True # the rest of the body is not read
+            self.__send(MockResponse(413)) # payload too large
+            return
+        except (ValueError, zlib.error):
+            self.close_connection = True
+            self.__send(MockResponse(400)) # bad request
+            return
+
+        request = MockRequest(
+            self.command, self.path, self.headers, body,
+            raw_size=decoder.raw_size, read_time=read_time, decompression_time=decoder.decompression_time
+        )
+        self.__send(mock_server.handle(request))
+
+    def __read_body(self, max_size, bandwidth):
+        """
+        Reads request body in fixed-size chunks (either with `Content-Length` or chunked transfer encoding),
+        decoding it on the fly. Reading is throttled to `bandwidth` bytes per second, if set.
+        :return: tuple of decoded body and the `RequestBodyDecoder` which decoded it
+        """
+        is_chunked = 'chunked' in self.headers.get('Transfer-Encoding', '').lower()
+        content_length = None if is_chunked else int(self.headers.get('Content-Length', 0))
+        if content_length is not None and content_length < 0:
+            raise ValueError('Negative Content-Length')
+        decoder = RequestBodyDecoder(self.headers.get('Content-Encoding'), max_size, expected_size=content_length)
+        buffer = memoryview(bytearray(READ_CHUNK_SIZE)) # reused for all chunks
+        throttle = ReadThrottle(bandwidth) if bandwidth is not None else None
+
+        if is_chunked:
+            while True:
+                chunk_size = parse_chunk_size(self.rfile.readline(self.MAX_LINE_LENGTH))
+                if chunk_size == 0:
+                    break
+                self.__read_into(decoder, buffer, chunk_size, throttle)
+                if self.rfile.readline(self.MAX_LINE_LENGTH).strip() != b'':
+                    raise ValueError('Missing CRLF after chunk')
+            while self.rfile.readline(self.MAX_LINE_LENGTH).strip() != b'':
+                pass # skip trailers
+        else:
+            self.__read_into(decoder, buffer, content_length, throttle)
+
+        return decoder.finish(), decoder
+
+    def __read_into(self, decoder, buffer, size, throttle):
+        remaining = size
+        while remaining > 0:
+            read = self.rfile.readinto(buffer[:min(remaining, len(buffer))])
+            if not read:
+                raise ValueError('Unexpected end of body')
+            decoder.feed(buffer[:read])
+            remaining -= read
+            if throttle is not None:
+                time.sleep(throttle.delay(read))
+
+    def __send(self, response):
+        self.send_response(response.status)
+        for field, value in response.headers:
+            self.send_header(field, value)
+
+        if not response.is_streamed:
+            self.send_header('Content-Length', str(len(response.body)))
+            self.end_headers()
+            self.wfile.write(response.body)
+        elif self.request_version == 'HTTP/1.1':
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for chunk in response.body:
+                if len(chunk) > 0:
+                    self.wfile.write(b'%x\r\n' % len(chunk))
+                    self.wfile.write(chunk)
+                    self.wfile.write(b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            # HTTP/1.0 clients don't support chunked encoding - the end of body is signalled by closing the connection
+            self.close_connection = True
+            self.end_headers()
+            for chunk in response.body:
+                self.wfile.write(chunk)
+
+class HTTPServerEngine(ThreadingHTTPServer):
+    """
+    Default engine, based on `http.server.ThreadingHTTPServer`. Each connection is served on its own thread,
+    so long-polling `GET /wait` doesn't block recording of requests it waits for.
+    """
+
+    # Bind with `SO_REUSEADDR`, so the port can be reused right after previous instance exits
+    allow_reuse_address = True
+
+    def __init__(self, server_address, mock_server):
+        self.mock_server = mock_server
+        super().__init__(server_address, HTTPServerEngineRequestHandler)
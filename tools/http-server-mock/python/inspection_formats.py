@@ -0,0 +1,141 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import json
+import zlib
+import base64
+import struct
+
+# Content types of streamed `/inspect` formats.
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+BINARY_CONTENT_TYPE = 'application/x-mock-server-records'
+
+# Header of one binary record: lengths of metadata JSON, headers and body.
+BINARY_RECORD_HEADER = struct.Struct('>III')
+
+def ndjson_records(generic_requests):
+    """
+    Encodes requests as newline-delimited JSON, one request per line (see `ndjson_record()`).
+    """
+    for generic_request in generic_requests:
+        yield ndjson_record(generic_request)
+
+def ndjson_record(generic_request):
+    """
+    Encodes request as one line of JSON. Body is embedded as UTF-8 text when possible (`"encoding": "utf-8"`)
+    and falls back to Base64 only for binary data (`"encoding": "base64"`). Requests answered with simulated
+    response (see `response_rules.py`) include its outcome in `"response"`.
+
+    Headers and body are encoded once per distinct blob (see `GenericRequest.encoded()`) and joined with
+    the metadata of each request.
+    """
+    metadata = json.dumps({
+        "id": generic_request.id,
+        "method": generic_request.http_method,
+        "path": generic_request.path,
+    }).encode('utf-8')
+    parts = [
+        metadata[:-1], # without closing `}`
+        b', "headers": ', generic_request.encoded('http_headers', 'json', _json_string),
+        b', ', generic_request.encoded('http_body', 'ndjson', _ndjson_body),
+    ]
+    if generic_request.simulated_response is not None:
+        parts += [b', "response": ', json.dumps(generic_request.simulated_response).encode('utf-8')]
+    parts.append(b'}\n')
+    return b''.join(parts)
+
+def _json_string(data):
+    return json.dumps(str(data, 'utf-8')).encode('utf-8') # `str()` also decodes `memoryview`
+
+def _ndjson_body(body):
+    """
+    Encodes `"body": ..., "encoding": ...` members of `ndjson_record()`.
+    """
+    try:
+        text, encoding = str(body, 'utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        text, encoding = base64.b64encode(body).decode('utf-8'), 'base64'
+    return json.dumps({"body": text, "encoding": encoding}).encode('utf-8')[1:-1] # without enclosing `{}`
+
+def binary_records(generic_requests):
+    """
+    Encodes requests as length-prefixed binary records (see `binary_record()`).
+    """
+    for generic_request in generic_requests:
+        yield from binary_record(generic_request)
+
+def binary_record(generic_request):
+    """
+    Encodes request as length-prefixed binary record, which is:
+    - `BINARY_RECORD_HEADER` with lengths of three following fields (big-endian `uint32`),
+    - metadata JSON: `{"id": ..., "method": ..., "path": ..., "arrival_time": ...}`,
+    - raw headers (`Field: value` separated with `\\n`),
+    - raw body.
+    :return: list of the record parts
+    """
+    metadata = json.dumps({
+        "id": generic_request.id,
+        "method": generic_request.http_method,
+        "path": generic_request.path,
+        "arrival_time": generic_request.arrival_time,
+    }).encode('utf-8')
+    return [
+        BINARY_RECORD_HEADER.pack(len(metadata), len(generic_request.http_headers), len(generic_request.http_body)),
+        metadata,
+        generic_request.http_headers,
+        generic_request.http_body,
+    ]
+
+def read_binary_records(data):
+    """
+    Decodes `binary_records()` back to list of `(metadata, headers, body)` tuples.
+    """
+    records = []
+    offset = 0
+    view = memoryview(data)
+    while offset < len(data):
+        metadata_length, headers_length, body_length = BINARY_RECORD_HEADER.unpack_from(data, offset)
+        offset += BINARY_RECORD_HEADER.size
+        metadata = json.loads(bytes(view[offset:offset + metadata_length]))
+        offset += metadata_length
+        headers = bytes(view[offset:offset + headers_length])
+        offset += headers_length
+        body = bytes(view[offset:offset + body_length])
+        offset += body_length
+        records.append((metadata, headers, body))
+    return records
+
+def gzip_chunks(chunks):
+    """
+    Compresses stream of chunks with gzip, without buffering the whole stream.
+    """
+    compressor = zlib.compressobj(wbits=31) # 31 = gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if len(compressed) > 0:
+            yield compressed
+    yield compressor.flush()
+
+# Streamed formats by name (used in `?format=<name>`) and by content type (used in `Accept` header).
+STREAMED_FORMATS = {
+    'ndjson': (NDJSON_CONTENT_TYPE, ndjson_records),
+    'binary': (BINARY_CONTENT_TYPE, binary_records),
+}
+
+def streamed_format(format_name, accept_header):
+    """
+    Negotiates streamed format for `/inspect` response.
+    :return: `(content_type, encoder)` or `None` if default JSON format should be used
+    """
+    if format_name is not None:
+        if format_name == 'json':
+            return None
+        return STREAMED_FORMATS[format_name] # raises `KeyError` (bad request) for unknown format
+
+    for content_type, encoder in STREAMED_FORMATS.values():
+        if content_type in accept_header:
+            return content_type, encoder
+    return None
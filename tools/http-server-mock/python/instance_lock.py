@@ -0,0 +1,85 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import os
+import time
+import fcntl
+import signal
+import tempfile
+
+class InstanceLock:
+    """
+    Exclusive lock of the server port (or of the instance name, see `instance_registry.py`), held by running
+    server instance in `<temp dir>/mock_server_<port or name>.pid`.
+
+    The lock file contains PID of the instance holding it. It is locked with `flock()`, so the lock is released
+    by the OS even if the instance crashes - a lock file which is not locked is stale and can be taken over.
+    Only the instance holding the lock for the same port (or name) is terminated, other servers are left running.
+    """
+
+    def __init__(self, key, directory=None):
+        self.path = os.path.join(directory or tempfile.gettempdir(), f'mock_server_{key}.pid')
+        self.__file = None
+
+    def acquire(self, takeover_timeout=5):
+        """
+        Acquires the lock. If it is held by another instance, that instance is asked to terminate (`SIGTERM`,
+        then `SIGKILL` after `takeover_timeout / 2` seconds).
+        :return: PID of terminated instance or `None` if no instance was running
+        """
+        file = open(self.path, 'a+')
+        terminated_pid = None
+        if not self.__try_lock(file):
+            file.seek(0)
+            content = file.read().strip()
+            terminated_pid = int(content) if content.isdigit() else None
+            deadline = time.monotonic() + takeover_timeout
+            for signal_number, wait_until in [(signal.SIGTERM, deadline - takeover_timeout / 2), (signal.SIGKILL, deadline)]:
+                if terminated_pid is not None:
+                    try:
+                        os.kill(terminated_pid, signal_number)
+                    except ProcessLookupError:
+                        pass # exited in the meantime
+                if self.__wait_for_lock(file, wait_until):
+                    break
+            else:
+                file.close()
+                raise TimeoutError(f'Failed to take over {self.path} held by PID {terminated_pid}')
+
+        file.seek(0)
+        file.truncate()
+        file.write(str(os.getpid()))
+        file.flush()
+        self.__file = file
+        return terminated_pid
+
+    def is_held(self):
+        """
+        Tells if the lock is held by a running instance, without taking it.
+        """
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'a+') as file:
+            return not self.__try_lock(file) # closing the file releases the lock taken by this check
+
+    def release(self):
+        if self.__file is not None:
+            self.__file.close() # closing the file releases the lock
+            self.__file = None
+
+    def __try_lock(self, file):
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def __wait_for_lock(self, file, deadline):
+        while not self.__try_lock(file):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
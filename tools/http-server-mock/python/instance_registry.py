@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+# Registry of named server instances, for running one server per test shard on the same host:
+#
+#   ./start_mock_server.py --instance shard-1 &          # listens on auto-assigned port
+#   URL=$(./instance_registry.py url shard-1 --wait 10)  # http://127.0.0.1:<port>
+#   ./instance_registry.py stop shard-1
+
+from instance_lock import InstanceLock
+import os
+import re
+import json
+import time
+import tempfile
+import argparse
+
+# Default directory of the registry, shared by all instances on this host
+REGISTRY_DIRECTORY = os.path.join(tempfile.gettempdir(), 'mock_server_instances')
+
+# Instance names become parts of file names (`<name>.json` and `mock_server_<name>.pid`), so they can't contain
+# path separators or other special characters
+INSTANCE_NAME_REGEXP = re.compile(r'[A-Za-z0-9._-]+')
+
+def instance_name(value):
+    """
+    Validates instance name given in command line (use as `type` of `argparse` argument).
+    """
+    if INSTANCE_NAME_REGEXP.fullmatch(value) is None:
+        raise argparse.ArgumentTypeError(f"invalid instance name '{value}' (allowed characters are letters, digits, '.', '_' and '-')")
+    return value
+
+class InstanceRegistry:
+    """
+    Named server instances running on this host. Each instance holds `InstanceLock` keyed by its name (so starting
+    an instance with the same name terminates the previous one, but never instances with other names) and publishes
+    its URL in `<name>.json`. Entries of instances which exited without unregistering are recognised by their
+    released lock and pruned when read.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or REGISTRY_DIRECTORY
+        os.makedirs(self.directory, exist_ok=True)
+
+    def lock(self, name):
+        """
+        Returns the lock to be held by the instance with given name while it is running.
+        """
+        return InstanceLock(_checked(name), directory=self.directory)
+
+    def publish(self, name, url):
+        """
+        Publishes the URL of running instance (which holds its `lock()`).
+        """
+        path = self.__entry_path(name)
+        # Write to temporary file and rename it, so the entry is never observed partially written
+        with open(path + '.tmp', 'w') as file:
+            json.dump({"name": name, "url": url, "pid": os.getpid()}, file)
+        os.replace(path + '.tmp', path)
+
+    def unregister(self, name):
+        """
+        Removes the entry of instance with given name. Its lock file is left in place, as it may be already opened
+        by the next instance with the same name.
+        """
+        try:
+            os.remove(self.__entry_path(name))
+        except FileNotFoundError:
+            pass
+
+    def lookup(self, name):
+        """
+        Returns `{"name", "url", "pid"}` of running instance with given name or `None` if it is not running.
+        """
+        path = self.__entry_path(name)
+        try:
+            with open(path) as file:
+                entry = json.load(file) # malformed entry is treated as missing
+        except (FileNotFoundError, ValueError):
+            return None
+        if not self.lock(name).is_held():
+            self.unregister(name) # stale
+            return None
+        return entry
+
+    def wait_for(self, name, timeout):
+        """
+        Waits until instance with given name publishes its URL.
+        :return: the entry of the instance or `None` if `timeout` is exceeded
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = self.lookup(name)
+            if entry is not None or time.monotonic() >= deadline:
+                return entry
+            time.sleep(0.01)
+
+    def instances(self):
+        """
+        Lists entries of all running instances.
+        """
+        names = sorted([file_name[:-len('.json')] for file_name in os.listdir(self.directory) if file_name.endswith('.json')])
+        names = [name for name in names if INSTANCE_NAME_REGEXP.fullmatch(name) is not None] # skip files not written by the registry
+        entries = [self.lookup(name) for name in names]
+        return [entry for entry in entries if entry is not None]
+
+    def stop(self, name, timeout=5):
+        """
+        Terminates instance with given name (`SIGTERM`, then `SIGKILL`) and removes its entry.
+        :return: PID of terminated instance or `None` if it was not running
+        """
+        lock = self.lock(name)
+        if not lock.is_held():
+            self.unregister(name)
+            return None
+        terminated_pid = lock.acquire(takeover_timeout=timeout)
+        lock.release()
+        self.unregister(name)
+        return terminated_pid
+
+    def __entry_path(self, name):
+        return os.path.join(self.directory, f'{_checked(name)}.json')
+
+def _checked(name):
+    if INSTANCE_NAME_REGEXP.fullmatch(name) is None:
+        raise ValueError(f'Invalid instance name: {name!r}')
+    return name
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Finds and stops named mock server instances running on this host")
+    parser.add_argument("--directory", default=REGISTRY_DIRECTORY, help="Directory of the registry")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Print name, URL and PID of running instances")
+    url_parser = commands.add_parser("url", help="Print URL of given instance")
+    url_parser.add_argument("name", type=instance_name)
+    url_parser.add_argument("--wait", type=float, default=0, help="Number of seconds to wait for the instance to start")
+    stop_parser = commands.add_parser("stop", help="Stop given instance (or all with `--all`)")
+    stop_parser.add_argument("name", nargs='?', type=instance_name)
+    stop_parser.add_argument("--all", action='store_true')
+    args = parser.parse_args()
+
+    registry = InstanceRegistry(args.directory)
+    if args.command == "list":
+        for entry in registry.instances():
+            print("{name}\t{url}\t{pid}".format(**entry))
+    elif args.command == "url":
+        entry = registry.wait_for(args.name, args.wait)
+        if entry is None:
+            parser.exit(1, f'Instance {args.name} is not running\n')
+        print(entry["url"])
+    elif args.command == "stop":
+        if args.all == (args.name is not None):
+            parser.error("Pass either instance name or `--all`")
+        for name in [entry["name"] for entry in registry.instances()] if args.all else [args.name]:
+            pid = registry.stop(name)
+            print(f'Stopped {name} (PID {pid})' if pid is not None else f'Instance {name} is not running')
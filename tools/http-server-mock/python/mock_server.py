@@ -0,0 +1,798 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+from generic_request import GenericRequest
+from inspection_formats import streamed_format, gzip_chunks
+from server_metrics import ServerMetrics, PROMETHEUS_CONTENT_TYPE
+from capture_file import capture_chunks, CAPTURE_CONTENT_TYPE
+from response_rules import ResponseSimulator
+from upload_analytics import UploadAnalytics
+from profiling import ServerProfiler, ProfilerStateError
+from urllib.parse import urlsplit, parse_qs
+import os
+import re
+import zlib
+import json
+import time
+import base64
+
+class MockRequest:
+    """
+    HTTP request received by the server engine, independent of the engine which read it.
+    """
+
+    def __init__(self, method, path, headers, body, raw_size=None, read_time=0.0, decompression_time=0.0):
+        self.method = method
+        self.path = path # original path, including the query
+        self.headers = headers # `http.client.HTTPMessage`
+        self.body = body # decoded (decompressed) by the engine
+        self.raw_size = raw_size if raw_size is not None else len(body) # number of body bytes received
+        self.read_time = read_time # seconds spent by the engine reading the body (including decompression)
+        self.decompression_time = decompression_time # seconds spent by the engine decompressing the body
+
+    @property
+    def route_path(self):
+        """
+        The path without query, used for routing.
+        """
+        return urlsplit(self.path).path
+
+    @property
+    def query(self):
+        """
+        Query parameters as a dictionary of lists.
+        """
+        return parse_qs(urlsplit(self.path).query)
+
+class MockResponse:
+    """
+    HTTP response to be written by the server engine.
+    """
+
+    def __init__(self, status, body=bytes(), headers=None):
+        self.status = status
+        self.body = body # `bytes` or iterable of `bytes` chunks, streamed by the engine
+        self.headers = headers if headers is not None else []
+
+    @property
+    def is_streamed(self):
+        return not isinstance(self.body, (bytes, bytearray))
+
+class HTTPMockServer:
+    """
+    This server exposes followig endpoints:
+
+    POST /*
+    - Generic endpoint for recording any POST request. It responds with `200` immediately, unless response rules
+    are configured (see `response_rules.py`).
+
+    GET /inspect
+    - Endpoint listing the history of recorded generic requests.
+
+    GET /inspect/<session>
+    - Endpoint listing generic requests recorded in given session (sent to `/<session>/*`).
+
+    Both `/inspect` endpoints accept optional `?since=<cursor>&limit=<n>` query to list only requests
+    recorded after given cursor. The cursor for next call is returned in `X-Next-Cursor` header.
+    By default, requests are listed in JSON array with Base64-encoded headers and body. Compact formats
+    (see `inspection_formats.py`) can be requested with `?format=ndjson|binary` or `Accept` header. These are
+    streamed with chunked transfer encoding and compressed if `Accept-Encoding: gzip` is set.
+    Responses carry `ETag` (specific to the server process, format, compression and cursor query) - if it is sent
+    back in `If-None-Match` and no request was recorded (or removed) since, `304` is returned without listing the history.
+
+    GET /capture
+    - Endpoint exporting all generic requests as a capture file (see `capture_file.py`), which can be loaded back
+    with `--load-capture` or re-sent with `replay_capture.py`.
+
+    GET /capture/<session>
+    - Endpoint exporting generic requests recorded in given session as a capture file.
+
+    GET /events
+    - Endpoint listing events decoded from payloads of all generic requests (see `payload_decoders.py`).
+
+    GET /events/<session>
+    - Endpoint listing events decoded from payloads of generic requests recorded in given session.
+
+    Both `/events` endpoints return JSON array of events and accept the same `?since=<cursor>&limit=<n>` query
+    as `/inspect` (where `limit` is the number of requests).
+
+    GET /rum?session_id=<id>&view_id=<id>&type=<type>&since_date=<ms>&until_date=<ms>
+    - Endpoint querying the index of decoded RUM events (see `rum_index.py`). All parameters are optional. Returns
+    JSON array of matching events ordered by `date`, with updates of each view collapsed to the latest
+    `_dd.document_version` (unless `all_view_updates=1` is set).
+
+    GET /wait?session=<session>&min_count=<n>&timeout=<seconds>
+    - Endpoint blocking until at least `min_count` requests are recorded (in given session or in total if `session`
+    is not set) or `timeout` is exceeded. Returns the current number of requests as `{"count": <n>}`.
+
+    GET /analytics
+    - Endpoint returning upload analytics (see `upload_analytics.py`): batch sizes, events per batch, compression
+    ratio, intervals between uploads and duplicated (re-sent) batches, per session and track.
+
+    GET /analytics/<session>
+    - Endpoint returning upload analytics of given session.
+
+    GET /validation
+    - Endpoint returning JSON schema violations found in decoded events of each session (see `schema_validation.py`).
+    Available if the server validates events (`--validate-schemas`).
+
+    GET /validation/<session>
+    - Endpoint returning JSON schema violations found in decoded events of given session.
+
+    GET /health
+    - Endpoint returning `{"status": "ok", "pid": <n>}`, cheap to call when waiting for the server to start.
+
+    GET /history
+    - Endpoint returning the size of requests history, its limits, eviction counters and the size of deduplicated
+    bodies and headers.
+
+    GET /stats
+    - Endpoint returning runtime metrics of the server (see `server_metrics.py`): requests and bytes ingested per path
+    and session, histograms of time spent in body reading, decompression, payload decoding and validation and `/inspect`
+    serialization, and the size of requests history. Returned as JSON or in Prometheus text format with
+    `?format=prometheus`.
+
+    GET /simulation
+    - Endpoint returning current response rules config.
+
+    PUT /simulation
+    - Endpoint replacing response rules with the config sent in JSON body (see `ResponseSimulator`).
+
+    DELETE /simulation
+    - Endpoint removing all response rules.
+
+    GET /sessions
+    - Endpoint listing sessions with the number and total bytes of their requests, as JSON array of
+    `{"session": <id>, "requests": <n>, "bytes": <n>, "open": <bool>}`.
+
+    PUT /sessions/<session>
+    - Endpoint opening the session explicitly (it is listed even before any request is recorded).
+
+    DELETE /sessions/<session>
+    - Endpoint closing the session: its requests are removed right away and new ones are no longer recorded.
+
+    DELETE /requests
+    - Endpoint removing all recorded generic requests.
+
+    DELETE /requests/<session>
+    - Endpoint removing generic requests recorded in given session.
+
+    PUT /profile/cpu
+    - Endpoint starting collection of CPU profile (`cProfile`) of request handling, discarding the previous one.
+
+    DELETE /profile/cpu
+    - Endpoint stopping collection of CPU profile.
+
+    GET /profile/cpu
+    - Endpoint returning collected CPU profile in binary `pstats` format (readable by `pstats.Stats`, `snakeviz`...)
+    or as text report with `?format=text&sort=<key>&limit=<n>`. Returns `409` while the profile is being collected.
+
+    PUT /profile/memory?frames=<n>
+    - Endpoint starting tracing of memory allocations (`tracemalloc`), storing `frames` frames of traceback (1 by default).
+
+    DELETE /profile/memory
+    - Endpoint stopping tracing of memory allocations and dropping taken snapshots.
+
+    GET /profile/memory?from=<snapshot>&to=<snapshot>&group_by=<key>&limit=<n>
+    - Endpoint returning text report of top memory allocations in snapshot `to` (or the current one), compared with
+    snapshot `from` if set. Returns `409` if memory allocations are not traced.
+
+    PUT /profile/memory/snapshots/<name>
+    - Endpoint taking snapshot of traced memory allocations under given name.
+
+    GET /profile/memory/snapshots/<name>
+    - Endpoint returning given snapshot in `tracemalloc.Snapshot.dump()` format (readable by `tracemalloc.Snapshot.load()`).
+
+    Profiling can be also started at launch with `--profile` (see `profiling.py`).
+
+    It doesn't do any I/O on its own - requests are read and responses are written by the server engine
+    (see `http_server_engine.py` and `asyncio_engine.py`).
+    """
+
+    # Max time a single `GET /wait` can block for
+    MAX_WAIT_TIMEOUT = 300
+
+    # Number of requests read from the history at once when streaming `/inspect` response
+    INSPECT_PAGE_SIZE = 100
+
+    # Default max size of decoded request body
+    DEFAULT_MAX_BODY_SIZE = 100 * 1024 * 1024
+
+    def __init__(self, history, max_body_size=DEFAULT_MAX_BODY_SIZE, payload_decoders=None, response_simulator=None, events_validator=None, profiler=None):
+        self.history = history
+        self.max_body_size = max_body_size # enforced by the engine when reading and decoding request body, and by payload decoders
+        self.payload_decoders = payload_decoders # `PayloadDecoders` or `None` to not decode events at ingest
+        self.events_validator = events_validator # `EventsValidator` or `None` to not validate decoded events
+        self.response_simulator = response_simulator if response_simulator is not None else ResponseSimulator()
+        self.metrics = ServerMetrics()
+        self.analytics = UploadAnalytics()
+        self.profiler = profiler if profiler is not None else ServerProfiler()
+        self.history.session_deleted_listeners.append(self.__forget_session)
+        self.__etag_epoch = os.urandom(4).hex() # history versions restart with the process, but SQLite storage survives it
+
+    def may_block(self, request):
+        """
+        Tells if handling given request may block for a long time, so engines can run it off their main loop.
+        """
+        if request.method == "POST":
+            return True # payloads are decoded and validated, and simulated responses may be delayed
+        # Taking, comparing and dumping memory snapshots of large history takes long, as well as starting and stopping
+        # tracing (`tracemalloc` holds the GIL while it resets its traces)
+        if request.route_path.startswith("/profile/memory"):
+            return True
+        # Listing the history takes time proportional to its size
+        return request.method == "GET" and (request.route_path == "/wait" or request.route_path.startswith(("/inspect", "/events", "/capture", "/rum")))
+
+    def release_waiting_requests(self):
+        """
+        Makes requests long-polling `GET /wait` return right away, e.g. when the server is shutting down.
+        """
+        self.history.release_waiters()
+
+    def upload_bandwidth(self, method, path):
+        """
+        Returns max number of body bytes per second the engine should read for given request or `None` if unlimited.
+        """
+        if not self.response_simulator.is_active:
+            return None
+        return self.response_simulator.bandwidth(method, urlsplit(path).path)
+
+    def record(self, generic_request):
+        """
+        Decodes events of given `GenericRequest` (if payload decoding is enabled), records it in the history and
+        validates its events (if schema validation is enabled).
+        :return: `False` if the request was not recorded, because its session is closed
+        """
+        if self.payload_decoders is not None:
+            start = time.perf_counter()
+            self.payload_decoders.decode(generic_request, urlsplit(generic_request.path).path, generic_request.header('Content-Type'), self.max_body_size)
+            self.metrics.observe('payload_decoding', time.perf_counter() - start)
+        is_recorded = self.history.add_request(generic_request)
+        if is_recorded and self.events_validator is not None:
+            start = time.perf_counter()
+            self.events_validator.validate(generic_request, urlsplit(generic_request.path).path)
+            self.metrics.observe('schema_validation', time.perf_counter() - start)
+            self.__forget_session_if_deleted(generic_request.session_id)
+        return is_recorded
+
+    def __forget_session(self, session_id):
+        """
+        Drops per-session state of given session, once it is deleted from the history (see `session_deleted_listeners`).
+        """
+        self.analytics.delete_session(session_id)
+        self.metrics.delete_session(session_id)
+        if self.events_validator is not None:
+            self.events_validator.delete_session(session_id)
+
+    def __forget_session_if_deleted(self, session_id):
+        # The session may be evicted (or closed) right after the request was added, before its state was updated
+        # above - so the state has to be dropped again, as it was created after the history notified its deletion
+        if not self.history.has_session(session_id):
+            self.__forget_session(session_id)
+
+    def handle(self, request):
+        """
+        Routes given `MockRequest` and returns `MockResponse`.
+        """
+        # Chunks of streamed responses are produced later by the engine, so they are not covered by the CPU profile
+        return self.profiler.run(self.__handle, request)
+
+    def __handle(self, request):
+        if request.method == "POST":
+            return self.__route(request, [
+                (r"(.*)$", self.__POST_any),
+            ])
+        elif request.method == "GET":
+            return self.__route(request, [
+                (r"/inspect$", self.__GET_inspect),
+                (r"/inspect/([^/]+)$", self.__GET_inspect_session),
+                (r"/capture$", self.__GET_capture),
+                (r"/capture/([^/]+)$", self.__GET_capture_session),
+                (r"/events$", self.__GET_events),
+                (r"/events/([^/]+)$", self.__GET_events_session),
+                (r"/rum$", self.__GET_rum),
+                (r"/wait$", self.__GET_wait),
+                (r"/analytics$", self.__GET_analytics),
+                (r"/analytics/([^/]+)$", self.__GET_analytics_session),
+                (r"/validation$", self.__GET_validation),
+                (r"/validation/([^/]+)$", self.__GET_validation_session),
+                (r"/health$", self.__GET_health),
+                (r"/history$", self.__GET_history),
+                (r"/stats$", self.__GET_stats),
+                (r"/simulation$", self.__GET_simulation),
+                (r"/sessions$", self.__GET_sessions),
+                (r"/profile/cpu$", self.__GET_profile_cpu),
+                (r"/profile/memory$", self.__GET_profile_memory),
+                (r"/profile/memory/snapshots/([^/]+)$", self.__GET_profile_memory_snapshot),
+            ])
+        elif request.method == "PUT":
+            return self.__route(request, [
+                (r"/simulation$", self.__PUT_simulation),
+                (r"/sessions/([^/]+)$", self.__PUT_session),
+                (r"/profile/cpu$", self.__PUT_profile_cpu),
+                (r"/profile/memory$", self.__PUT_profile_memory),
+                (r"/profile/memory/snapshots/([^/]+)$", self.__PUT_profile_memory_snapshot),
+            ])
+        elif request.method == "DELETE":
+            return self.__route(request, [
+                (r"/requests$", self.__DELETE_requests),
+                (r"/requests/([^/]+)$", self.__DELETE_session_requests),
+                (r"/sessions/([^/]+)$", self.__DELETE_session),
+                (r"/simulation$", self.__DELETE_simulation),
+                (r"/profile/cpu$", self.__DELETE_profile_cpu),
+                (r"/profile/memory$", self.__DELETE_profile_memory),
+            ])
+        else:
+            return MockResponse(501) # not implemented
+
+    def __POST_any(self, request, parameters):
+        """
+        POST /*
+
+        Records generic request sent to this endpoint. Its body was already decompressed by the engine.
+        The response is simulated if the request matches any response rule.
+        """
+        request_headers = '\n'.join([ f'{field}: {request.headers[field]}' for field in request.headers ]).encode('utf-8')
+        generic_request = GenericRequest("POST", request.path, request_headers, request.body)
+        simulated_response = self.response_simulator.simulate("POST", request.route_path) if self.response_simulator.is_active else None
+        if simulated_response is not None:
+            generic_request.simulated_response = simulated_response.as_json()
+        is_recorded = self.record(generic_request)
+
+        track = request.route_path[len('/' + generic_request.session_id):] or '/' # the path without the session
+        if is_recorded:
+            self.analytics.record(generic_request, track, request.raw_size)
+        self.metrics.record_request(
+            path=track,
+            session_id=generic_request.session_id,
+            raw_size=request.raw_size,
+            size=len(request.body)
+        )
+        self.__forget_session_if_deleted(generic_request.session_id)
+        self.metrics.observe('body_read', request.read_time)
+        if request.decompression_time > 0:
+            self.metrics.observe('decompression', request.decompression_time)
+
+        if simulated_response is None:
+            return bytes()
+        time.sleep(simulated_response.delay)
+        headers = [('Retry-After', str(simulated_response.retry_after))] if simulated_response.retry_after is not None else []
+        return MockResponse(simulated_response.status, headers=headers)
+
+    def __GET_inspect(self, request, parameters):
+        """
+        GET /inspect
+
+        Returns inspection info on all generic requests.
+        """
+        return self.__inspect(request, session_id=None)
+
+    def __GET_inspect_session(self, request, parameters):
+        """
+        GET /inspect/<session>
+
+        Returns inspection info on generic requests recorded in given session.
+        """
+        return self.__inspect(request, session_id=parameters[0])
+
+    def __GET_capture(self, request, parameters):
+        """
+        GET /capture
+
+        Exports all generic requests as a capture file.
+        """
+        return self.__capture(session_id=None)
+
+    def __GET_capture_session(self, request, parameters):
+        """
+        GET /capture/<session>
+
+        Exports generic requests recorded in given session as a capture file.
+        """
+        return self.__capture(session_id=parameters[0])
+
+    def __capture(self, session_id):
+        generic_requests = self.__paged_requests(0, self.history.cursor(), session_id)
+        return MockResponse(200, capture_chunks(generic_requests), headers=[('Content-Type', CAPTURE_CONTENT_TYPE)])
+
+    def __GET_events(self, request, parameters):
+        """
+        GET /events
+
+        Returns events decoded from all generic requests.
+        """
+        return self.__events(request, session_id=None)
+
+    def __GET_events_session(self, request, parameters):
+        """
+        GET /events/<session>
+
+        Returns events decoded from generic requests recorded in given session.
+        """
+        return self.__events(request, session_id=parameters[0])
+
+    def __events(self, request, session_id):
+        since, limit = self.__cursor_query(request)
+        generic_requests, next_cursor = self.history.requests_since(since, limit=limit, session_id=session_id)
+        events = []
+        for generic_request in generic_requests:
+            if generic_request.events is not None:
+                events += generic_request.events
+        return MockResponse(200, json.dumps(events).encode("utf-8"), headers=[('X-Next-Cursor', str(next_cursor))])
+
+    def __cursor_query(self, request):
+        """
+        Reads `?since=<cursor>&limit=<n>` query.
+        """
+        query = request.query
+        since = int(query['since'][0]) if 'since' in query else 0
+        limit = int(query['limit'][0]) if 'limit' in query else None
+        if since < 0 or (limit is not None and limit < 0):
+            raise ValueError('`since` and `limit` must not be negative')
+        return since, limit
+
+    def __inspect(self, request, session_id):
+        query = request.query
+        since, limit = self.__cursor_query(request)
+        negotiated_format = streamed_format(query['format'][0] if 'format' in query else None, request.headers.get('Accept', ''))
+        gzipped = negotiated_format is not None and 'gzip' in request.headers.get('Accept-Encoding', '')
+
+        # The version is read before listing requests, so the ETag is never newer than the listing
+        representation = f'{negotiated_format[0] if negotiated_format is not None else "json"} {gzipped} {since} {limit}'
+        etag = f'"{self.__etag_epoch}-{self.history.version()}-{zlib.crc32(representation.encode("utf-8")):08x}"'
+        headers = [('ETag', etag), ('Vary', 'Accept, Accept-Encoding')]
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            return MockResponse(304, headers=headers) # not modified
+        response = self.__inspection_response(negotiated_format, gzipped, since, limit, session_id)
+        response.headers += headers
+        return response
+
+    def __inspection_response(self, negotiated_format, gzipped, since, limit, session_id):
+        if negotiated_format is None:
+            generic_requests, next_cursor = self.history.requests_since(since, limit=limit, session_id=session_id)
+            start = time.perf_counter()
+            body = self.__inspection_info(generic_requests)
+            self.metrics.observe('inspect', time.perf_counter() - start)
+            return MockResponse(200, body, headers=[('X-Next-Cursor', str(next_cursor))])
+
+        if limit is not None:
+            generic_requests, next_cursor = self.history.requests_since(since, limit=limit, session_id=session_id)
+        else:
+            next_cursor = max(self.history.cursor(), since)
+            generic_requests = self.__paged_requests(since, next_cursor, session_id)
+
+        content_type, encoder = negotiated_format
+        chunks = encoder(generic_requests)
+        headers = [('Content-Type', content_type), ('X-Next-Cursor', str(next_cursor))]
+        if gzipped:
+            chunks = gzip_chunks(chunks)
+            headers.append(('Content-Encoding', 'gzip'))
+        return MockResponse(200, self.__timed_chunks(chunks), headers=headers)
+
+    def __timed_chunks(self, chunks):
+        """
+        Measures the time spent producing streamed chunks (excluding the time the engine spends writing them).
+        """
+        duration = 0.0
+        iterator = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            chunk = next(iterator, None)
+            duration += time.perf_counter() - start
+            if chunk is None:
+                break
+            yield chunk
+        self.metrics.observe('inspect', duration)
+
+    def __paged_requests(self, since, until, session_id):
+        """
+        Lazily reads requests with `since <= id < until` page by page, so only one page is held in memory.
+        """
+        cursor = since
+        while cursor < until:
+            page, cursor = self.history.requests_since(cursor, limit=self.INSPECT_PAGE_SIZE, session_id=session_id)
+            if len(page) == 0:
+                return
+            for generic_request in page:
+                if generic_request.id >= until:
+                    return
+                yield generic_request
+
+    def __inspection_info(self, generic_requests):
+        """
+        Lists requests in JSON array. Base64 of headers and body is computed once per distinct blob and cached (only
+        with `MemoryStorage`, see `GenericRequest.encoded()`), so the array is only joined from cached parts.
+        """
+        return b'[' + b', '.join([self.__inspection_fragment(generic_request) for generic_request in generic_requests]) + b']'
+
+    def __inspection_fragment(self, generic_request):
+        # Base64 strings need no escaping, so cached encodings are spliced into the JSON object as they are
+        return b''.join([
+            b'{"method": ', json.dumps(generic_request.http_method).encode("utf-8"),
+            b', "path": ', json.dumps(generic_request.path).encode("utf-8"),
+            b', "body": "', generic_request.encoded('http_body', 'base64', base64.b64encode), # use Base64 string to not corrupt the JSON
+            b'", "headers": "', generic_request.encoded('http_headers', 'base64', base64.b64encode), # use Base64 string to not corrupt the JSON
+            b'"}',
+        ])
+
+    def __GET_rum(self, request, parameters):
+        """
+        GET /rum
+
+        Queries the index of decoded RUM events.
+        """
+        if self.history.rum_index is None:
+            return MockResponse(404) # RUM events are not indexed
+        query = request.query
+        events = self.history.rum_index.query(
+            session_id=query['session_id'][0] if 'session_id' in query else None,
+            view_id=query['view_id'][0] if 'view_id' in query else None,
+            event_type=query['type'][0] if 'type' in query else None,
+            since_date=int(query['since_date'][0]) if 'since_date' in query else None,
+            until_date=int(query['until_date'][0]) if 'until_date' in query else None,
+            latest_views=query.get('all_view_updates', ['0'])[0] != '1'
+        )
+        return json.dumps(events).encode("utf-8")
+
+    def __GET_wait(self, request, parameters):
+        """
+        GET /wait
+
+        Long-polls until given number of requests is recorded.
+        """
+        query = request.query
+        session_id = query['session'][0] if 'session' in query else None
+        min_count = int(query['min_count'][0])
+        timeout = min(float(query['timeout'][0]), self.MAX_WAIT_TIMEOUT) if 'timeout' in query else self.MAX_WAIT_TIMEOUT
+        count = self.history.wait_for_requests(min_count, max(timeout, 0), session_id=session_id)
+        return json.dumps({"count": count}).encode("utf-8")
+
+    def __GET_analytics(self, request, parameters):
+        """
+        GET /analytics
+
+        Returns upload analytics of all sessions.
+        """
+        return json.dumps(self.analytics.report()).encode("utf-8")
+
+    def __GET_analytics_session(self, request, parameters):
+        """
+        GET /analytics/<session>
+
+        Returns upload analytics of given session.
+        """
+        try:
+            return json.dumps(self.analytics.report(session_id=parameters[0])).encode("utf-8")
+        except KeyError:
+            return MockResponse(404) # no uploads in this session
+
+    def __GET_validation(self, request, parameters):
+        """
+        GET /validation
+
+        Returns schema violations of all sessions.
+        """
+        if self.events_validator is None:
+            return MockResponse(404) # events are not validated
+        return json.dumps(self.events_validator.report()).encode("utf-8")
+
+    def __GET_validation_session(self, request, parameters):
+        """
+        GET /validation/<session>
+
+        Returns schema violations of given session.
+        """
+        if self.events_validator is None:
+            return MockResponse(404) # events are not validated
+        try:
+            return json.dumps(self.events_validator.report(session_id=parameters[0])).encode("utf-8")
+        except KeyError:
+            return MockResponse(404) # no events validated in this session
+
+    def __GET_health(self, request, parameters):
+        """
+        GET /health
+
+        Tells that the server is running.
+        """
+        return json.dumps({"status": "ok", "pid": os.getpid()}).encode("utf-8")
+
+    def __GET_history(self, request, parameters):
+        """
+        GET /history
+
+        Returns the size of requests history, its limits, eviction counters and the size of deduplicated bodies and headers.
+        """
+        return json.dumps(self.history.stats()).encode("utf-8")
+
+    def __GET_stats(self, request, parameters):
+        """
+        GET /stats
+
+        Returns runtime metrics of the server.
+        """
+        query = request.query
+        if query.get('format', ['json'])[0] == 'prometheus':
+            body = self.metrics.as_prometheus(self.history.stats()).encode("utf-8")
+            return MockResponse(200, body, headers=[('Content-Type', PROMETHEUS_CONTENT_TYPE)])
+        return json.dumps(self.metrics.as_json(self.history.stats())).encode("utf-8")
+
+    def __GET_simulation(self, request, parameters):
+        """
+        GET /simulation
+
+        Returns current response rules config.
+        """
+        return json.dumps(self.response_simulator.config()).encode("utf-8")
+
+    def __PUT_simulation(self, request, parameters):
+        """
+        PUT /simulation
+
+        Replaces response rules with given config.
+        """
+        self.response_simulator.configure(json.loads(request.body))
+        return bytes()
+
+    def __DELETE_simulation(self, request, parameters):
+        """
+        DELETE /simulation
+
+        Removes all response rules.
+        """
+        self.response_simulator.configure({"rules": []})
+        return bytes()
+
+    def __DELETE_requests(self, request, parameters):
+        """
+        DELETE /requests
+
+        Remove all.
+        """
+        self.history.clear() # state of sessions is dropped by `__forget_session()`
+        return bytes()
+
+    def __DELETE_session_requests(self, request, parameters):
+        """
+        DELETE /requests/<session>
+
+        Removes requests recorded in given session.
+        """
+        self.history.delete_session_requests(parameters[0])
+        return bytes()
+
+    def __GET_sessions(self, request, parameters):
+        """
+        GET /sessions
+
+        Lists sessions with the number and total bytes of their requests.
+        """
+        return json.dumps(self.history.sessions()).encode("utf-8")
+
+    def __PUT_session(self, request, parameters):
+        """
+        PUT /sessions/<session>
+
+        Opens given session.
+        """
+        self.history.open_session(parameters[0])
+        return bytes()
+
+    def __DELETE_session(self, request, parameters):
+        """
+        DELETE /sessions/<session>
+
+        Closes given session and removes its requests.
+        """
+        self.history.close_session(parameters[0])
+        return bytes()
+
+    def __PUT_profile_cpu(self, request, parameters):
+        """
+        PUT /profile/cpu
+
+        Starts collecting CPU profile.
+        """
+        self.profiler.start_cpu()
+        return bytes()
+
+    def __DELETE_profile_cpu(self, request, parameters):
+        """
+        DELETE /profile/cpu
+
+        Stops collecting CPU profile.
+        """
+        self.profiler.stop_cpu()
+        return bytes()
+
+    def __GET_profile_cpu(self, request, parameters):
+        """
+        GET /profile/cpu
+
+        Returns collected CPU profile.
+        """
+        query = request.query
+        try:
+            if query.get('format', ['pstats'])[0] == 'text':
+                report = self.profiler.cpu_stats_report(sort=query.get('sort', ['cumulative'])[0], limit=int(query.get('limit', ['50'])[0]))
+                return MockResponse(200, report.encode("utf-8"), headers=[('Content-Type', 'text/plain; charset=utf-8')])
+            return MockResponse(200, self.profiler.cpu_stats_dump(), headers=[('Content-Type', 'application/octet-stream')])
+        except ProfilerStateError:
+            return MockResponse(409) # conflict
+
+    def __PUT_profile_memory(self, request, parameters):
+        """
+        PUT /profile/memory
+
+        Starts tracing memory allocations.
+        """
+        self.profiler.start_memory(frames=int(request.query.get('frames', ['1'])[0]))
+        return bytes()
+
+    def __DELETE_profile_memory(self, request, parameters):
+        """
+        DELETE /profile/memory
+
+        Stops tracing memory allocations.
+        """
+        self.profiler.stop_memory()
+        return bytes()
+
+    def __GET_profile_memory(self, request, parameters):
+        """
+        GET /profile/memory
+
+        Returns report of top memory allocations, optionally compared with previous snapshot.
+        """
+        query = request.query
+        try:
+            report = self.profiler.memory_report(
+                group_by=query.get('group_by', ['lineno'])[0],
+                limit=int(query.get('limit', ['50'])[0]),
+                from_name=query.get('from', [None])[0],
+                to_name=query.get('to', [None])[0]
+            )
+        except ProfilerStateError:
+            return MockResponse(409) # conflict
+        return MockResponse(200, report.encode("utf-8"), headers=[('Content-Type', 'text/plain; charset=utf-8')])
+
+    def __PUT_profile_memory_snapshot(self, request, parameters):
+        """
+        PUT /profile/memory/snapshots/<name>
+
+        Takes snapshot of traced memory allocations.
+        """
+        try:
+            self.profiler.take_snapshot(parameters[0])
+        except ProfilerStateError:
+            return MockResponse(409) # conflict
+        return bytes()
+
+    def __GET_profile_memory_snapshot(self, request, parameters):
+        """
+        GET /profile/memory/snapshots/<name>
+
+        Returns given snapshot in `tracemalloc` format.
+        """
+        try:
+            dump = self.profiler.snapshot_dump(parameters[0])
+        except KeyError:
+            return MockResponse(404) # no such snapshot
+        return MockResponse(200, dump, headers=[('Content-Type', 'application/octet-stream')])
+
+    def __route(self, request, routes):
+        try:
+            for url_regexp, method in routes:
+                match = re.match(url_regexp, request.route_path)
+                if match is not None:
+                    result = method(request, match.groups())
+                    if isinstance(result, MockResponse):
+                        return result
+                    return MockResponse(200, result) # OK
+        except (IndexError, KeyError, ValueError):
+            return MockResponse(400) # bad request
+
+        return MockResponse(404) # not found
@@ -0,0 +1,482 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+# Python client of the mock server, mirroring `ServerMock` and `ServerSession` from Swift `HTTPServerMock` package:
+#
+#   server = ServerMock('http://127.0.0.1:8000')
+#   session = server.obtain_unique_recording_session()
+#   # send requests to `session.recording_url`
+#   requests = session.pull_recorded_requests(timeout=30, until=lambda requests: len(requests) >= 2)
+#   session.close()
+#
+# `AsyncServerMock` and `AsyncServerSession` provide the same API for `asyncio` code. Both keep connections
+# to the server alive and reuse them between calls, and decode recorded requests from `/inspect` as they are
+# streamed (in NDJSON format), without buffering the whole response.
+
+from urllib.parse import urlsplit, urlencode, parse_qs
+from contextlib import contextmanager
+import io
+import json
+import time
+import uuid
+import base64
+import asyncio
+import threading
+import http.client
+
+class ServerError(Exception):
+    """
+    The server responded with unexpected status.
+    """
+
+    def __init__(self, method, path, status):
+        super().__init__(f'Mock server responded with status code {status} for {method} {path}')
+        self.status = status
+
+class RecordedRequest:
+    """
+    Request recorded by the server, as returned by `/inspect` (mirrors `Request` in Swift).
+    """
+
+    def __init__(self, request_id, http_method, path_with_query, http_headers, http_body):
+        url = urlsplit(path_with_query)
+        self.id = request_id
+        self.http_method = http_method
+        self.path = url.path
+        self.query_items = parse_qs(url.query) # query parameters as a dictionary of lists
+        self.http_headers = http_headers # dictionary of header fields
+        self.http_body = http_body
+
+    @classmethod
+    def from_ndjson_record(cls, record):
+        """
+        Decodes request from one record of `GET /inspect?format=ndjson` (see `inspection_formats.py`).
+        """
+        headers = {}
+        for line in record['headers'].split('\n'):
+            field, separator, value = line.partition(': ')
+            if separator:
+                headers[field] = value
+        body = record['body'].encode('utf-8') if record['encoding'] == 'utf-8' else base64.b64decode(record['body'])
+        return cls(record['id'], record['method'], record['path'], headers, body)
+
+class NDJSONDecoder:
+    """
+    Decodes JSON lines from chunks of data, as they are received.
+    """
+
+    def __init__(self):
+        self.__buffer = bytearray()
+
+    def feed(self, chunk):
+        """
+        Consumes next chunk of data.
+        :return: list of objects decoded from lines completed by this chunk
+        """
+        self.__buffer += chunk
+        end = self.__buffer.rfind(b'\n')
+        if end < 0:
+            return []
+        lines = bytes(self.__buffer[:end]).split(b'\n')
+        del self.__buffer[:end + 1]
+        return [json.loads(line) for line in lines if len(line.strip()) > 0]
+
+def _server_address(url):
+    url = urlsplit(url)
+    return url.hostname, url.port or 80
+
+def _query_path(path, **query):
+    query = {name: value for name, value in query.items() if value is not None}
+    return f'{path}?{urlencode(query)}' if len(query) > 0 else path
+
+# Errors of reused keep-alive connection which was closed by the server while idle
+_STALE_CONNECTION_ERRORS = (ConnectionError, http.client.BadStatusLine)
+
+class ConnectionPool:
+    """
+    Thread-safe pool of keep-alive `http.client.HTTPConnection`s to one server. Connections are created on
+    demand and up to `size` idle connections are kept for reuse.
+    """
+
+    def __init__(self, host, port, size=4, timeout=60):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.timeout = timeout
+        self.__lock = threading.Lock()
+        self.__idle = [] # idle connections, most recently used last
+
+    @contextmanager
+    def stream(self, method, path, body=None, headers=None, timeout=None):
+        """
+        Sends request and yields `http.client.HTTPResponse` to read the body from. The connection is returned to
+        the pool if the body was read completely. Idempotent requests failing on a reused connection (closed by
+        the server while idle) are retried on a new one.
+        """
+        connection, is_reused = self.__acquire()
+        try:
+            connection.timeout = timeout or self.timeout # applied when connecting
+            if connection.sock is not None:
+                connection.sock.settimeout(connection.timeout)
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+            except _STALE_CONNECTION_ERRORS:
+                if not is_reused or method == 'POST':
+                    raise
+                connection.close() # next request opens new connection
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+            yield response
+        except BaseException:
+            connection.close()
+            raise
+        if response.isclosed() and not response.will_close:
+            self.__release(connection)
+        else:
+            connection.close()
+
+    def request(self, method, path, body=None, headers=None, timeout=None):
+        """
+        Sends request and reads the whole response.
+        :return: tuple of the status, `http.client.HTTPMessage` headers and the body
+        """
+        with self.stream(method, path, body=body, headers=headers, timeout=timeout) as response:
+            data = response.read()
+        return response.status, response.headers, data
+
+    def close(self):
+        with self.__lock:
+            idle, self.__idle = self.__idle, []
+        for connection in idle:
+            connection.close()
+
+    def __acquire(self):
+        with self.__lock:
+            if len(self.__idle) > 0:
+                return self.__idle.pop(), True
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+    def __release(self, connection):
+        with self.__lock:
+            if len(self.__idle) < self.size:
+                self.__idle.append(connection)
+                return
+        connection.close()
+
+class ServerMock:
+    """
+    Client of the mock server running at given URL.
+    """
+
+    def __init__(self, url, pool_size=4, timeout=60):
+        self.url = url.rstrip('/')
+        host, port = _server_address(url)
+        self.pool = ConnectionPool(host, port, size=pool_size, timeout=timeout)
+
+    def obtain_unique_recording_session(self):
+        """
+        Returns session with unique recording URL, to capture only a subset of requests.
+        """
+        return ServerSession(self, str(uuid.uuid4()))
+
+    def clear_all_requests(self):
+        self.__call('DELETE', '/requests')
+
+    def get_recorded_requests(self, session_id=None):
+        """
+        Fetches all requests recorded by the server (or only in given session).
+        """
+        return list(self.iterate_recorded_requests(session_id=session_id))
+
+    def iterate_recorded_requests(self, session_id=None, since=None, limit=None, cursor=None):
+        """
+        Yields requests recorded by the server (or only in given session) with `id >= since`, decoding them as the
+        response is received. If `cursor` list is given, the cursor for next call is appended to it.
+        """
+        path = _query_path('/inspect' if session_id is None else f'/inspect/{session_id}', format='ndjson', since=since, limit=limit)
+        with self.pool.stream('GET', path) as response:
+            if response.status != 200:
+                response.read()
+                raise ServerError('GET', path, response.status)
+            if cursor is not None:
+                cursor.append(int(response.headers['X-Next-Cursor']))
+            decoder = NDJSONDecoder()
+            while True:
+                chunk = response.read1(io.DEFAULT_BUFFER_SIZE)
+                if not chunk:
+                    break
+                for record in decoder.feed(chunk):
+                    yield RecordedRequest.from_ndjson_record(record)
+
+    def get_recorded_requests_since(self, session_id, since):
+        """
+        Fetches requests recorded in given session after given cursor.
+        :return: tuple of requests and the cursor to continue from in next call
+        """
+        cursor = []
+        requests = list(self.iterate_recorded_requests(session_id=session_id, since=since, cursor=cursor))
+        return requests, cursor[0]
+
+    def wait_for_recorded_requests(self, session_id, min_count, timeout):
+        """
+        Blocks until the server records at least `min_count` requests in given session or `timeout` is exceeded.
+        :return: the number of requests recorded in the session
+        """
+        path = _query_path('/wait', session=session_id, min_count=min_count, timeout=max(timeout, 0))
+        return json.loads(self.__call('GET', path, timeout=max(timeout, 0) + 5))['count']
+
+    def close_session(self, session_id):
+        self.__call('DELETE', f'/sessions/{session_id}')
+
+    def close(self):
+        """
+        Closes pooled connections.
+        """
+        self.pool.close()
+
+    def __call(self, method, path, timeout=None):
+        status, _, data = self.pool.request(method, path, timeout=timeout)
+        if status != 200:
+            raise ServerError(method, path, status)
+        return data
+
+class ServerSession:
+    """
+    Recording session: requests sent to `recording_url` are recorded in this session only.
+    """
+
+    def __init__(self, server, session_id):
+        self.server = server
+        self.session_id = session_id
+        self.recording_url = f'{server.url}/{session_id}'
+
+    def get_recorded_requests(self):
+        return self.server.get_recorded_requests(session_id=self.session_id)
+
+    def pull_recorded_requests(self, timeout, until):
+        """
+        Fetches requests recorded in this session until `until(requests)` is `True`. Only new requests are fetched
+        in each call and the server is long-polled between calls. Raises `TimeoutError` if `timeout` is exceeded.
+        """
+        deadline = time.monotonic() + timeout
+        requests = []
+        cursor = 0
+        while True:
+            page, cursor = self.server.get_recorded_requests_since(self.session_id, cursor)
+            requests += page
+            if until(requests):
+                return requests
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f'Exceeded {timeout}s timeout with {len(requests)} requests recorded in session {self.session_id}')
+            self.server.wait_for_recorded_requests(self.session_id, min_count=len(requests) + 1, timeout=remaining)
+
+    def close(self):
+        """
+        Closes this session on the server: its requests are removed and further ones are not recorded.
+        """
+        self.server.close_session(self.session_id)
+
+class AsyncResponse:
+    """
+    Response read by `AsyncConnectionPool`. The body is read with `read()` or `chunks()`.
+    """
+
+    def __init__(self, reader, status, headers):
+        self.reader = reader
+        self.status = status
+        self.headers = headers # `http.client.HTTPMessage`
+        self.is_complete = False
+        self.will_close = headers.get('Connection', '').lower() == 'close'
+
+    async def chunks(self):
+        """
+        Yields chunks of the body as they are received (with `Content-Length` or chunked transfer encoding).
+        """
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            while True:
+                chunk_size = int((await self.reader.readuntil(b'\r\n')).split(b';', 1)[0], 16)
+                if chunk_size == 0:
+                    await self.reader.readuntil(b'\r\n') # end of trailers
+                    break
+                yield await self.reader.readexactly(chunk_size)
+                await self.reader.readexactly(2) # CRLF after chunk
+        elif self.headers.get('Content-Length') is not None:
+            remaining = int(self.headers['Content-Length'])
+            while remaining > 0:
+                chunk = await self.reader.read(min(remaining, io.DEFAULT_BUFFER_SIZE))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(bytes(), remaining)
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            self.will_close = True # the body ends when the server closes the connection
+            while chunk := await self.reader.read(io.DEFAULT_BUFFER_SIZE):
+                yield chunk
+        self.is_complete = True
+
+    async def read(self):
+        return b''.join([chunk async for chunk in self.chunks()])
+
+class AsyncConnectionPool:
+    """
+    Pool of keep-alive connections for `asyncio` code, speaking HTTP/1.1. Connections are created on demand
+    and up to `size` idle connections are kept for reuse.
+    """
+
+    def __init__(self, host, port, size=4, timeout=60):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.timeout = timeout
+        self.__idle = [] # idle `(reader, writer)` connections, most recently used last
+
+    async def stream(self, method, path, body=None, headers=None, timeout=None):
+        """
+        Sends request and returns `AsyncResponse`. Its body must be read and then the response must be passed
+        to `release()`, which returns the connection to the pool.
+        """
+        is_reused = len(self.__idle) > 0
+        connection = self.__idle.pop() if is_reused else await asyncio.open_connection(self.host, self.port)
+        try:
+            response = await asyncio.wait_for(self.__send(connection, method, path, body, headers), timeout or self.timeout)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            connection[1].close()
+            if not is_reused or method == 'POST':
+                raise
+            connection = await asyncio.open_connection(self.host, self.port)
+            response = await asyncio.wait_for(self.__send(connection, method, path, body, headers), timeout or self.timeout)
+        except BaseException:
+            connection[1].close()
+            raise
+        response.connection = connection
+        return response
+
+    def release(self, response):
+        if response.is_complete and not response.will_close and len(self.__idle) < self.size:
+            self.__idle.append(response.connection)
+        else:
+            response.connection[1].close()
+
+    async def request(self, method, path, body=None, headers=None, timeout=None):
+        """
+        Sends request and reads the whole response.
+        :return: tuple of the status, `http.client.HTTPMessage` headers and the body
+        """
+        response = await self.stream(method, path, body=body, headers=headers, timeout=timeout)
+        try:
+            data = await asyncio.wait_for(response.read(), timeout or self.timeout)
+        finally:
+            self.release(response)
+        return response.status, response.headers, data
+
+    def close(self):
+        idle, self.__idle = self.__idle, []
+        for _, writer in idle:
+            writer.close()
+
+    async def __send(self, connection, method, path, body, headers):
+        reader, writer = connection
+        body = body or bytes()
+        head = f'{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Length: {len(body)}\r\n'
+        head += ''.join([f'{field}: {value}\r\n' for field, value in (headers or {}).items()])
+        writer.write(head.encode('iso-8859-1') + b'\r\n' + body)
+        await writer.drain()
+
+        raw_head = await reader.readuntil(b'\r\n\r\n')
+        status_line, _, raw_headers = raw_head.partition(b'\r\n')
+        status = int(status_line.split(b' ', 2)[1])
+        return AsyncResponse(reader, status, http.client.parse_headers(io.BytesIO(raw_headers)))
+
+class AsyncServerMock:
+    """
+    `asyncio` client of the mock server running at given URL (see `ServerMock`).
+    """
+
+    def __init__(self, url, pool_size=4, timeout=60):
+        self.url = url.rstrip('/')
+        host, port = _server_address(url)
+        self.pool = AsyncConnectionPool(host, port, size=pool_size, timeout=timeout)
+
+    def obtain_unique_recording_session(self):
+        return AsyncServerSession(self, str(uuid.uuid4()))
+
+    async def clear_all_requests(self):
+        await self.__call('DELETE', '/requests')
+
+    async def get_recorded_requests(self, session_id=None):
+        return [request async for request in self.iterate_recorded_requests(session_id=session_id)]
+
+    async def iterate_recorded_requests(self, session_id=None, since=None, limit=None, cursor=None):
+        """
+        Yields requests recorded by the server (or only in given session), decoding them as the response is received.
+        """
+        path = _query_path('/inspect' if session_id is None else f'/inspect/{session_id}', format='ndjson', since=since, limit=limit)
+        response = await self.pool.stream('GET', path)
+        try:
+            if response.status != 200:
+                await response.read()
+                raise ServerError('GET', path, response.status)
+            if cursor is not None:
+                cursor.append(int(response.headers['X-Next-Cursor']))
+            decoder = NDJSONDecoder()
+            async for chunk in response.chunks():
+                for record in decoder.feed(chunk):
+                    yield RecordedRequest.from_ndjson_record(record)
+        finally:
+            self.pool.release(response)
+
+    async def get_recorded_requests_since(self, session_id, since):
+        cursor = []
+        requests = [request async for request in self.iterate_recorded_requests(session_id=session_id, since=since, cursor=cursor)]
+        return requests, cursor[0]
+
+    async def wait_for_recorded_requests(self, session_id, min_count, timeout):
+        path = _query_path('/wait', session=session_id, min_count=min_count, timeout=max(timeout, 0))
+        return json.loads(await self.__call('GET', path, timeout=max(timeout, 0) + 5))['count']
+
+    async def close_session(self, session_id):
+        await self.__call('DELETE', f'/sessions/{session_id}')
+
+    def close(self):
+        self.pool.close()
+
+    async def __call(self, method, path, timeout=None):
+        status, _, data = await self.pool.request(method, path, timeout=timeout)
+        if status != 200:
+            raise ServerError(method, path, status)
+        return data
+
+class AsyncServerSession:
+    """
+    `asyncio` recording session (see `ServerSession`).
+    """
+
+    def __init__(self, server, session_id):
+        self.server = server
+        self.session_id = session_id
+        self.recording_url = f'{server.url}/{session_id}'
+
+    async def get_recorded_requests(self):
+        return await self.server.get_recorded_requests(session_id=self.session_id)
+
+    async def pull_recorded_requests(self, timeout, until):
+        deadline = time.monotonic() + timeout
+        requests = []
+        cursor = 0
+        while True:
+            page, cursor = await self.server.get_recorded_requests_since(self.session_id, cursor)
+            requests += page
+            if until(requests):
+                return requests
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f'Exceeded {timeout}s timeout with {len(requests)} requests recorded in session {self.session_id}')
+            await self.server.wait_for_recorded_requests(self.session_id, min_count=len(requests) + 1, timeout=remaining)
+
+    async def close(self):
+        await self.server.close_session(self.session_id)
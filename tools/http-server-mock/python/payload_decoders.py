@@ -0,0 +1,156 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import re
+import json
+import zlib
+
+class PayloadDecodingError(Exception):
+    pass
+
+HEADERS_SEPARATOR_REGEXP = re.compile(b'\r\n\r\n')
+
+# Each decoder is called with `(body, content_type, max_size)`, where `body` is a `memoryview` of request body and
+# `max_size` (if not `None`) bounds the size of data decompressed from the body. It returns `(events, size)`, where
+# `size` is the number of bytes of JSON the events were decoded from. It tells how much decoded events add to
+# the request in the history (e.g. compressed Session Replay segments decode to several times their size).
+
+def decode_ndjson(body, content_type, max_size=None):
+    """
+    Decodes newline-separated JSON objects (RUM, traces).
+    """
+    return [json.loads(line) for line in str(body, 'utf-8').split('\n') if len(line.strip()) > 0], len(body)
+
+def decode_json(body, content_type, max_size=None):
+    """
+    Decodes JSON array of events (logs). Single JSON object is decoded as one event.
+    """
+    decoded = json.loads(str(body, 'utf-8'))
+    return (decoded if isinstance(decoded, list) else [decoded]), len(body)
+
+def decode_multipart(body, content_type, max_size=None):
+    """
+    Decodes `multipart/form-data` payload (Session Replay). Each `segment` part is decompressed and decoded as one
+    event, other parts with JSON content are decoded as events too. Binary parts (e.g. images) are skipped.
+    """
+    events = []
+    size = 0
+    for headers, content in multipart_parts(body, content_type):
+        disposition = headers.get('content-disposition', '')
+        name = re.search(r'\bname="([^"]*)"', disposition)
+        if name is not None and name.group(1) == 'segment':
+            segment = decompress(content, max_size - size if max_size is not None else None)
+            part_events, part_size = decode_ndjson(segment, None)
+        elif 'json' in headers.get('content-type', ''):
+            part_events, part_size = decode_json(content, None)
+        else:
+            continue
+        events += part_events
+        size += part_size
+    return events, size
+
+def decompress(data, max_size=None):
+    """
+    Decompresses zlib `data`. Unlike `zlib.decompress()`, it stops as soon as the output exceeds `max_size`
+    (if given), so small compressed payloads can't expand to exhaust the memory.
+    """
+    decompressor = zlib.decompressobj()
+    decompressed = decompressor.decompress(data, max_size + 1 if max_size is not None else 0)
+    if decompressor.unconsumed_tail or (max_size is not None and len(decompressed) > max_size):
+        raise PayloadDecodingError(f'Decompressed data exceeds {max_size} bytes')
+    if not decompressor.eof:
+        raise zlib.error('Incomplete compressed data')
+    return decompressed
+
+def multipart_parts(body, content_type):
+    """
+    Splits `multipart/form-data` body (`memoryview`) into `(headers, content)` of its parts, without copying
+    their content. Header names are lowercased.
+    """
+    boundary = re.search(r'boundary="?([^";]+)"?', content_type or '')
+    if boundary is None:
+        raise PayloadDecodingError('Missing multipart boundary')
+
+    delimiter = b'--' + boundary.group(1).encode('utf-8')
+    delimiter_regexp = re.compile(re.escape(delimiter)) # `memoryview` has no `find()`, but can be searched with `re`
+    parts = []
+    match = delimiter_regexp.search(body)
+    while match is not None:
+        start = match.end()
+        if body[start:start + 2] == b'--':
+            return parts # closing delimiter
+        match = delimiter_regexp.search(body, start)
+        if match is None:
+            raise PayloadDecodingError('Missing closing multipart delimiter')
+        end = match.start()
+
+        # Each part is enclosed in CRLF: `<delimiter>\r\n<headers>\r\n\r\n<content>\r\n<delimiter>`
+        part = body[start + 2:end - 2] if body[start:start + 2] == b'\r\n' and body[end - 2:end] == b'\r\n' else body[start:end]
+        separator = HEADERS_SEPARATOR_REGEXP.search(part)
+        raw_headers, content = (part[:separator.start()], part[separator.end():]) if separator is not None else (part, part[:0])
+        headers = {}
+        for line in str(raw_headers, 'utf-8').split('\r\n'):
+            field, _, value = line.partition(':')
+            headers[field.strip().lower()] = value.strip()
+        parts.append((headers, content))
+    raise PayloadDecodingError('Missing multipart delimiter')
+
+class PayloadDecoders:
+    """
+    Decodes request payloads into events, once at ingest. The decoder is chosen by request path (first matching
+    regexp) and then by `Content-Type`. New decoders can be registered for other tracks.
+    """
+
+    def __init__(self):
+        self.__path_decoders = [] # list of `(compiled regexp, decoder)`
+        self.__content_type_decoders = {} # media type -> decoder
+
+    @classmethod
+    def default(cls):
+        """
+        Decoders for payloads sent by the SDK.
+        """
+        decoders = cls()
+        decoders.register_path(r'/api/v2/replay$', decode_multipart)
+        decoders.register_path(r'/api/v2/logs$', decode_json)
+        decoders.register_path(r'/api/v2/(rum|spans)$', decode_ndjson)
+        decoders.register_content_type('multipart/form-data', decode_multipart)
+        decoders.register_content_type('application/json', decode_json)
+        decoders.register_content_type('application/x-ndjson', decode_ndjson)
+        decoders.register_content_type('text/plain', decode_ndjson)
+        return decoders
+
+    def register_path(self, path_regexp, decoder):
+        self.__path_decoders.append((re.compile(path_regexp), decoder))
+
+    def register_content_type(self, media_type, decoder):
+        self.__content_type_decoders[media_type] = decoder
+
+    def decoder(self, path, content_type):
+        """
+        Returns decoder for given request or `None` if its payload is not known.
+        """
+        for path_regexp, decoder in self.__path_decoders:
+            if path_regexp.search(path) is not None:
+                return decoder
+        media_type = (content_type or '').split(';', 1)[0].strip().lower()
+        return self.__content_type_decoders.get(media_type)
+
+    def decode(self, generic_request, path, content_type, max_size=None):
+        """
+        Decodes events of given `GenericRequest` and caches them in its `events` (and their size in `events_size`).
+        Decoding errors are recorded in `decoding_error` and don't fail the request. Payloads decompressing to more
+        than `max_size` bytes (if given) are not decoded.
+        """
+        decoder = self.decoder(path, content_type)
+        if decoder is None:
+            return
+        try:
+            # The body (`bytes`, `bytearray` or `memoryview` of loaded capture, see `capture_file.py`) is not copied
+            with memoryview(generic_request.http_body) as body:
+                generic_request.events, generic_request.events_size = decoder(body, content_type, max_size)
+        except (ValueError, zlib.error, PayloadDecodingError) as error: # `json.JSONDecodeError` and `UnicodeDecodeError` are `ValueError`s
+            generic_request.decoding_error = str(error)
@@ -0,0 +1,181 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import io
+import os
+import sys
+import marshal
+import cProfile
+import tempfile
+import threading
+
+# `pstats` and `tracemalloc` (with `pickle` and `dataclasses` they import) take tens of milliseconds to import, which
+# would slow down every server start - so they are imported when stats or memory snapshots are first requested.
+
+# Since Python 3.12, `cProfile` is based on `sys.monitoring` and one enabled profiler observes all threads
+# (and only one can be enabled at a time). Before, it only observes the thread which enabled it.
+_PROFILER_OBSERVES_ALL_THREADS = sys.version_info >= (3, 12)
+
+class ProfilerStateError(Exception):
+    """
+    The profiler is not in the state required by the operation (e.g. stats are read while being collected).
+    """
+    pass
+
+class ServerProfiler:
+    """
+    Collects CPU profile (`cProfile`) of request handling and memory allocation snapshots (`tracemalloc`) on demand,
+    so the server can be profiled at runtime (see `/profile` endpoints of `HTTPMockServer` and `--profile`).
+
+    CPU stats are exported in `pstats` format (readable by `pstats.Stats`, `snakeviz`, `gprof2dot`...) and memory
+    snapshots in `tracemalloc.Snapshot.dump()` format (readable by `tracemalloc.Snapshot.load()`).
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__generation = 0 # incremented on every start of CPU profiling, to not reuse profiles of previous collection
+        self.__is_profiling = False
+        self.__profiles = [] # `cProfile.Profile` of each thread which handled requests (or one for all threads)
+        self.__thread_profiles = threading.local()
+        self.__snapshots = {} # name -> `tracemalloc.Snapshot`
+
+    @property
+    def is_profiling(self):
+        return self.__is_profiling
+
+    def start_cpu(self):
+        """
+        Starts collecting new CPU profile (discarding the previous one).
+        """
+        with self.__lock:
+            self.__stop_cpu()
+            self.__generation += 1
+            self.__profiles = []
+            if _PROFILER_OBSERVES_ALL_THREADS:
+                profile = cProfile.Profile()
+                profile.enable()
+                self.__profiles.append(profile)
+            self.__is_profiling = True
+
+    def stop_cpu(self):
+        with self.__lock:
+            self.__stop_cpu()
+
+    def run(self, function, *args):
+        """
+        Calls `function(*args)`, profiling it if CPU profile is being collected.
+        """
+        if not self.__is_profiling or _PROFILER_OBSERVES_ALL_THREADS:
+            return function(*args)
+
+        # `cProfile` only observes the thread which enabled it, so each thread uses its own profile
+        generation, profile = getattr(self.__thread_profiles, 'profile', (None, None))
+        if generation != self.__generation:
+            profile = cProfile.Profile()
+            with self.__lock:
+                generation = self.__generation
+                self.__profiles.append(profile)
+            self.__thread_profiles.profile = (generation, profile)
+        return profile.runcall(function, *args)
+
+    def cpu_stats(self):
+        """
+        Returns `pstats.Stats` merged from profiles of all threads. Raises `ProfilerStateError` if CPU profile is
+        still being collected.
+        """
+        import pstats
+        with self.__lock:
+            if self.__is_profiling:
+                raise ProfilerStateError('CPU profile is being collected')
+            stats = pstats.Stats(stream=io.StringIO())
+            for profile in self.__profiles:
+                stats.add(profile)
+            return stats
+
+    def cpu_stats_dump(self):
+        """
+        Returns CPU stats in binary `pstats` format, as written by `pstats.Stats.dump_stats()`.
+        """
+        return marshal.dumps(self.cpu_stats().stats)
+
+    def cpu_stats_report(self, sort='cumulative', limit=50):
+        """
+        Returns CPU stats as text report, as printed by `pstats.Stats.print_stats()`.
+        """
+        stats = self.cpu_stats()
+        stats.stream = io.StringIO()
+        stats.sort_stats(sort).print_stats(limit)
+        return stats.stream.getvalue()
+
+    def start_memory(self, frames=1):
+        """
+        Starts tracing memory allocations, with `frames` frames of traceback stored for each allocation.
+        """
+        import tracemalloc
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        tracemalloc.start(frames)
+
+    def stop_memory(self):
+        """
+        Stops tracing memory allocations and drops taken snapshots.
+        """
+        import tracemalloc
+        tracemalloc.stop()
+        with self.__lock:
+            self.__snapshots.clear()
+
+    def take_snapshot(self, name):
+        """
+        Takes snapshot of traced memory allocations and keeps it under given name.
+        """
+        snapshot = self.__snapshot()
+        with self.__lock:
+            self.__snapshots[name] = snapshot
+        return snapshot
+
+    def snapshot_dump(self, name):
+        """
+        Returns snapshot with given name in `tracemalloc.Snapshot.dump()` format.
+        """
+        with self.__lock:
+            snapshot = self.__snapshots[name]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'snapshot')
+            snapshot.dump(path)
+            with open(path, 'rb') as file:
+                return file.read()
+
+    def memory_report(self, group_by='lineno', limit=50, from_name=None, to_name=None):
+        """
+        Returns text report of top allocations in snapshot `to_name` (or current one), compared with `from_name` if set.
+        """
+        import tracemalloc
+        with self.__lock:
+            from_snapshot = self.__snapshots[from_name] if from_name is not None else None
+            to_snapshot = self.__snapshots[to_name] if to_name is not None else None
+        to_snapshot = to_snapshot or self.__snapshot()
+        if from_snapshot is not None:
+            statistics = to_snapshot.compare_to(from_snapshot, group_by)
+        else:
+            statistics = to_snapshot.statistics(group_by)
+        lines = [str(statistic) for statistic in statistics[:limit]]
+        traced_size, traced_peak = tracemalloc.get_traced_memory()
+        lines.append(f'Traced memory: {traced_size} B (peak: {traced_peak} B)')
+        return '\n'.join(lines) + '\n'
+
+    def __snapshot(self):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            raise ProfilerStateError('Memory allocations are not traced')
+        snapshot = tracemalloc.take_snapshot()
+        # Allocations of the profiler itself are not interesting
+        return snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+
+    def __stop_cpu(self):
+        if self.__is_profiling and _PROFILER_OBSERVES_ALL_THREADS:
+            self.__profiles[0].disable()
+        self.__is_profiling = False
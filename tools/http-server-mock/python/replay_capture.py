@@ -0,0 +1,64 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+# Re-sends requests from a capture file (exported with `GET /capture`) to a running mock server:
+#
+#   curl -o capture.bin http://127.0.0.1:8000/capture/<session>
+#   python3 replay_capture.py capture.bin --url http://127.0.0.1:8000 --speed 10
+
+from capture_file import CaptureFile
+from urllib.parse import urlsplit
+import time
+import argparse
+import http.client
+
+# Headers describing the original transfer, not valid for the re-sent (already decompressed) body
+SKIPPED_HEADERS = ['host', 'content-length', 'content-encoding', 'transfer-encoding', 'connection', 'expect']
+
+def replay(capture, ip, port, speed=1.0, sleep=time.sleep):
+    """
+    POSTs captured requests over one keep-alive connection, in their original order. Requests are spaced by their
+    original intervals divided by `speed`, or sent as fast as possible if `speed` is `0`.
+    :return: the number of sent requests
+    """
+    connection = http.client.HTTPConnection(ip, port)
+    first_arrival_time = None
+    start = time.monotonic()
+    count = 0
+    for generic_request in capture:
+        if speed > 0:
+            if first_arrival_time is None:
+                first_arrival_time = generic_request.arrival_time
+            delay = (generic_request.arrival_time - first_arrival_time) / speed - (time.monotonic() - start)
+            if delay > 0:
+                sleep(delay)
+
+        headers = {}
+        for line in bytes(generic_request.http_headers).decode('utf-8').split('\n'):
+            field, separator, value = line.partition(':')
+            if separator and field.strip().lower() not in SKIPPED_HEADERS:
+                headers[field.strip()] = value.strip()
+        connection.request(generic_request.http_method, generic_request.path, body=bytes(generic_request.http_body), headers=headers)
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f'Replaying {generic_request.path} failed with {response.status}')
+        count += 1
+    connection.close()
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-sends requests from a capture file to the mock server")
+    parser.add_argument("capture", help="Capture file exported with `GET /capture`")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="URL of the server to send requests to")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay rate relative to the original one (`0` sends requests as fast as possible)")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    with CaptureFile(args.capture) as capture:
+        start = time.monotonic()
+        count = replay(capture, url.hostname, url.port or 80, speed=args.speed)
+        print(f'Replayed {count} requests in {time.monotonic() - start:.3f}s')
@@ -0,0 +1,121 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import time
+import zlib
+
+# Size of chunks in which engines read request bodies
+READ_CHUNK_SIZE = 64 * 1024
+
+# `wbits` for `zlib.decompressobj()` by supported `Content-Encoding`
+DECOMPRESSION_WBITS = {
+    'deflate': zlib.MAX_WBITS, # zlib container, as sent by the SDK
+    'gzip': zlib.MAX_WBITS | 16, # gzip container
+}
+
+class BodyTooLargeError(Exception):
+    pass
+
+class RequestBodyDecoder:
+    """
+    Decodes request body fed in chunks, as they are read from the connection. Bodies with `deflate` or `gzip`
+    `Content-Encoding` are decompressed incrementally, so the compressed body is never held in memory as a whole.
+    Other bodies are stored as they are.
+
+    When the decoded body exceeds `max_size`, the rest of it is only consumed (so the connection can be reused)
+    and `finish()` raises `BodyTooLargeError`.
+    """
+
+    def __init__(self, content_encoding, max_size=None, expected_size=None):
+        wbits = DECOMPRESSION_WBITS.get((content_encoding or '').strip().lower())
+        self.max_size = max_size
+        self.raw_size = 0 # number of bytes read from the connection
+        self.decompression_time = 0.0 # seconds spent in decompression
+        self.__decompressor = zlib.decompressobj(wbits) if wbits is not None else None
+        self.__length = 0
+        self.__is_too_large = False
+        self.__body = bytearray()
+
+        if self.__decompressor is None and expected_size is not None:
+            if self.__exceeds_max_size(expected_size):
+                self.__discard()
+            else:
+                self.__body = bytearray(expected_size) # preallocated, so it is never resized while reading
+
+    def feed(self, chunk):
+        """
+        Decodes next chunk (any bytes-like object) of the body.
+        """
+        self.raw_size += len(chunk)
+        if self.__is_too_large:
+            return
+        if self.__decompressor is not None:
+            max_length = self.max_size - self.__length + 1 if self.max_size is not None else 0
+            start = time.perf_counter()
+            data = self.__decompressor.decompress(chunk, max_length)
+            self.decompression_time += time.perf_counter() - start
+            if self.__decompressor.unconsumed_tail:
+                self.__discard() # output is bigger than `max_length`
+            else:
+                self.__append(data)
+        else:
+            self.__append(chunk)
+
+    def finish(self):
+        """
+        Finishes decoding.
+        :return: the decoded body (`bytearray`)
+        """
+        if self.__decompressor is not None and not self.__is_too_large:
+            start = time.perf_counter()
+            self.__append(self.__decompressor.flush())
+            self.decompression_time += time.perf_counter() - start
+            if not self.__decompressor.eof:
+                raise zlib.error('Incomplete compressed body')
+        if self.__is_too_large:
+            raise BodyTooLargeError()
+        del self.__body[self.__length:] # no-op unless the body was shorter than expected
+        return self.__body
+
+    def __append(self, data):
+        end = self.__length + len(data)
+        if self.__exceeds_max_size(end):
+            self.__discard()
+            return
+        self.__body[self.__length:end] = data # writes into preallocated space (or grows the buffer if there's none)
+        self.__length = end
+
+    def __exceeds_max_size(self, size):
+        return self.max_size is not None and size > self.max_size
+
+    def __discard(self):
+        self.__is_too_large = True
+        self.__body = bytearray()
+        self.__decompressor = None
+
+class ReadThrottle:
+    """
+    Limits the rate of reading request body to `bandwidth` bytes per second (see `ResponseRule`).
+    """
+
+    def __init__(self, bandwidth):
+        self.bandwidth = bandwidth
+        self.__start = time.monotonic()
+        self.__size = 0
+
+    def delay(self, size):
+        """
+        Accounts `size` bytes read.
+        :return: number of seconds to wait before reading more
+        """
+        self.__size += size
+        return max(self.__size / self.bandwidth - (time.monotonic() - self.__start), 0)
+
+def parse_chunk_size(line):
+    """
+    Parses the size line of chunked transfer encoding (ignoring chunk extensions).
+    """
+    return int(line.split(b';', 1)[0].strip(), 16)
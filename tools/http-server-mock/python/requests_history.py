@@ -0,0 +1,322 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+from collections import OrderedDict
+from requests_storage import MemoryStorage
+import time
+import threading
+
+class RecordedSession:
+    """
+    Bookkeeping of requests recorded in one session, used for eviction and session listing.
+    """
+
+    def __init__(self, session_id, last_access):
+        self.session_id = session_id
+        self.count = 0 # number of requests
+        self.size = 0 # total bytes of requests
+        self.last_access = last_access
+        self.is_open = False # `True` if the session was explicitly opened with `open_session()`
+
+class GenericRequestsHistory:
+    """
+    Stores requests sent to generic endpoint.
+
+    It is safe to use from many connections at once: every access is synchronised with an internal lock.
+    Requests are kept in pluggable `storage` (see `requests_storage.py`), in memory by default.
+
+    The history can be bounded with:
+    - `max_bytes` - when exceeded, whole sessions are evicted, least recently used first;
+    - `max_session_requests` - when exceeded, oldest requests of the session are evicted;
+    - `session_ttl` - sessions not accessed for this number of seconds are evicted.
+
+    If `rum_index` is given (see `rum_index.py`), it is kept in sync with recorded and evicted requests. Other
+    per-session state (e.g. upload analytics) can be dropped with the session by adding `session_deleted_listeners`.
+
+    Sessions can be explicitly opened and closed by tests. Requests of closed session are deleted right away and
+    requests sent to it later (e.g. retried uploads) are not recorded.
+    """
+
+    def __init__(self, storage=None, max_bytes=None, max_session_requests=None, session_ttl=None, clock=time.monotonic, rum_index=None):
+        self.storage = storage if storage is not None else MemoryStorage()
+        self.rum_index = rum_index
+        self.max_bytes = max_bytes
+        self.max_session_requests = max_session_requests
+        self.session_ttl = session_ttl
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__requests_added = threading.Condition(self.__lock)
+        self.__waiters_generation = 0 # incremented to release all waiters (see `release_waiters()`)
+        self.__sessions = OrderedDict() # session identifier -> `RecordedSession`, least recently used first
+        self.__count = 0 # total number of requests
+        self.__size = 0 # total bytes of requests
+        self.__next_id = self.storage.last_id() + 1 # not reset on `clear()`, so cursors held by clients remain valid
+        self.__version = 0 # incremented on every change of recorded requests
+        self.__closed_session_ids = set()
+        self.evicted_sessions = 0
+        self.evicted_requests = 0
+        self.evicted_bytes = 0
+        # Callables notified with the identifier of every deleted session (evicted, closed or deleted explicitly).
+        # They are called under the lock of the history, so they must not call it back.
+        self.session_deleted_listeners = []
+
+        # Restore sessions persisted by previous run (if any)
+        now = self.__clock()
+        for session_id, count, size in self.storage.sessions():
+            session = RecordedSession(session_id, now)
+            session.count = count
+            session.size = size
+            self.__sessions[session_id] = session
+            self.__count += count
+            self.__size += size
+        if self.rum_index is not None:
+            for request_id, session_id, events in self.storage.events_since(0):
+                self.rum_index.add_events(request_id, session_id, events)
+
+    def add_request(self, generic_request):
+        """
+        Records given request.
+        :return: `False` if the request was not recorded, because its session is closed
+        """
+        with self.__lock:
+            if generic_request.session_id in self.__closed_session_ids:
+                return False
+            now = self.__clock()
+            self.__evict_expired_sessions(now)
+
+            generic_request.id = self.__next_id
+            self.__next_id += 1
+            session = self.__sessions.get(generic_request.session_id)
+            if session is None:
+                session = RecordedSession(generic_request.session_id, now)
+                self.__sessions[generic_request.session_id] = session
+            self.storage.add(generic_request)
+            self.__version += 1
+            if self.rum_index is not None:
+                self.rum_index.add(generic_request)
+            session.count += 1
+            session.size += generic_request.size
+            self.__count += 1
+            self.__size += generic_request.size
+            self.__touch(session, now)
+
+            if self.max_session_requests is not None and session.count > self.max_session_requests:
+                self.__evict_oldest_requests(session, session.count - self.max_session_requests)
+            if self.max_bytes is not None:
+                self.__evict_least_recently_used_sessions()
+
+            self.__requests_added.notify_all()
+            return True
+
+    def open_session(self, session_id):
+        """
+        Opens session explicitly (or reopens closed one), so it is listed even before any request is recorded.
+        """
+        with self.__lock:
+            self.__closed_session_ids.discard(session_id)
+            now = self.__clock()
+            session = self.__sessions.get(session_id)
+            if session is None:
+                session = self.__sessions[session_id] = RecordedSession(session_id, now)
+            session.is_open = True
+            self.__touch(session, now)
+
+    def close_session(self, session_id):
+        """
+        Closes session: deletes its requests and stops recording new ones.
+        """
+        with self.__lock:
+            self.__closed_session_ids.add(session_id)
+            session = self.__sessions.get(session_id)
+            if session is not None:
+                self.__delete_session(session)
+
+    def delete_session_requests(self, session_id):
+        """
+        Deletes all requests of given session.
+        """
+        with self.__lock:
+            session = self.__sessions.get(session_id)
+            if session is not None:
+                self.__delete_session(session)
+
+    def sessions(self):
+        """
+        Lists sessions with the number and total bytes of their requests, least recently used first.
+        """
+        with self.__lock:
+            self.__evict_expired_sessions(self.__clock())
+            return [
+                {"session": s.session_id, "requests": s.count, "bytes": s.size, "open": s.is_open}
+                for s in self.__sessions.values()
+            ]
+
+    def has_session(self, session_id):
+        """
+        Tells if given session has any request recorded or is open.
+        """
+        with self.__lock:
+            return session_id in self.__sessions
+
+    def all_requests(self):
+        with self.__lock:
+            return self.storage.requests(since=0)
+
+    def session_requests(self, session_id):
+        with self.__lock:
+            if self.__access_session(session_id) is None:
+                return []
+            return self.storage.requests(since=0, session_id=session_id)
+
+    def requests_since(self, since, limit=None, session_id=None):
+        """
+        Returns requests with `id >= since` (all or only recorded in given session), up to `limit`.
+        :return: tuple of requests and the cursor to pass as `since` in next call
+        """
+        with self.__lock:
+            if session_id is not None and self.__access_session(session_id) is None:
+                page = []
+            else:
+                page = self.storage.requests(since=since, limit=limit, session_id=session_id)
+            next_cursor = page[-1].id + 1 if len(page) > 0 else max(since, 0)
+            return page, next_cursor
+
+    def version(self):
+        """
+        Returns the number identifying current content of the history. It changes whenever requests are recorded,
+        evicted or cleared, so responses listing requests can be cached until it changes.
+        """
+        with self.__lock:
+            self.__evict_expired_sessions(self.__clock())
+            return self.__version
+
+    def cursor(self):
+        """
+        Returns the cursor pointing right after the last recorded request.
+        """
+        with self.__lock:
+            return self.__next_id
+
+    def wait_for_requests(self, min_count, timeout, session_id=None):
+        """
+        Blocks until at least `min_count` requests are recorded (in total or in given session) or `timeout` is exceeded.
+        :return: the number of recorded requests
+        """
+        def count():
+            if session_id is None:
+                return self.__count
+            session = self.__sessions.get(session_id)
+            return session.count if session is not None else 0
+
+        with self.__requests_added:
+            generation = self.__waiters_generation
+            self.__requests_added.wait_for(lambda: count() >= min_count or self.__waiters_generation != generation, timeout=timeout)
+            return count()
+
+    def release_waiters(self):
+        """
+        Makes pending `wait_for_requests()` calls return right away, with the number of requests recorded so far.
+        """
+        with self.__requests_added:
+            self.__waiters_generation += 1
+            self.__requests_added.notify_all()
+
+    def request(self, request_id):
+        with self.__lock:
+            generic_request = self.storage.request(int(request_id))
+            if generic_request is None:
+                raise KeyError(request_id)
+            return generic_request
+
+    def stats(self):
+        """
+        Returns current size of the history, its limits, eviction counters and stats of deduplicated blobs (if kept
+        in memory by the storage).
+        """
+        with self.__lock:
+            self.__evict_expired_sessions(self.__clock())
+            return {
+                "requests": self.__count,
+                "bytes": self.__size,
+                "sessions": len(self.__sessions),
+                "limits": {
+                    "max_bytes": self.max_bytes,
+                    "max_session_requests": self.max_session_requests,
+                    "session_ttl": self.session_ttl,
+                },
+                "evictions": {
+                    "sessions": self.evicted_sessions,
+                    "requests": self.evicted_requests,
+                    "bytes": self.evicted_bytes,
+                },
+                "blobs": self.storage.blob_stats(),
+            }
+
+    def clear(self):
+        with self.__lock:
+            self.storage.clear()
+            self.__version += 1
+            self.__closed_session_ids.clear()
+            if self.rum_index is not None:
+                self.rum_index.clear()
+            for session_id in self.__sessions:
+                for listener in self.session_deleted_listeners:
+                    listener(session_id)
+            self.__sessions.clear()
+            self.__count = 0
+            self.__size = 0
+
+    def __access_session(self, session_id):
+        session = self.__sessions.get(session_id)
+        if session is not None:
+            self.__touch(session, self.__clock())
+        return session
+
+    def __touch(self, session, now):
+        session.last_access = now
+        self.__sessions.move_to_end(session.session_id)
+
+    def __evict_oldest_requests(self, session, count):
+        evicted_size = self.storage.delete_oldest_requests(session.session_id, count)
+        self.__version += 1
+        if self.rum_index is not None:
+            self.rum_index.remove_oldest_requests(session.session_id, count)
+        session.count -= count
+        session.size -= evicted_size
+        self.__count -= count
+        self.__size -= evicted_size
+        self.evicted_requests += count
+        self.evicted_bytes += evicted_size
+
+    def __evict_session(self, session):
+        self.__delete_session(session)
+        self.evicted_sessions += 1
+        self.evicted_requests += session.count
+        self.evicted_bytes += session.size
+
+    def __delete_session(self, session):
+        self.storage.delete_session(session.session_id)
+        self.__version += 1
+        if self.rum_index is not None:
+            self.rum_index.remove_session(session.session_id)
+        del self.__sessions[session.session_id]
+        self.__count -= session.count
+        self.__size -= session.size
+        for listener in self.session_deleted_listeners:
+            listener(session.session_id)
+
+    def __evict_least_recently_used_sessions(self):
+        while self.__size > self.max_bytes and len(self.__sessions) > 0:
+            self.__evict_session(next(iter(self.__sessions.values())))
+
+    def __evict_expired_sessions(self, now):
+        if self.session_ttl is None:
+            return
+        while len(self.__sessions) > 0:
+            session = next(iter(self.__sessions.values()))
+            if now - session.last_access <= self.session_ttl:
+                break # sessions are ordered by access time, so no other session is expired
+            self.__evict_session(session)
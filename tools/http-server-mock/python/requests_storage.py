@@ -0,0 +1,313 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+from generic_request import GenericRequest
+from blob_store import BlobStore
+import json
+import heapq
+import itertools
+import threading
+
+class MemoryStorage:
+    """
+    Keeps recorded requests in process memory, in per-session lists ordered by `id`.
+
+    Headers and bodies are deduplicated in `BlobStore`: the SDK re-sends identical batches when retrying uploads
+    and Session Replay uploads the same resources repeatedly, so each distinct content is kept only once and is
+    freed when the last request referencing it is deleted.
+    """
+
+    # Attributes of `GenericRequest` kept in the blob store
+    BLOB_ATTRIBUTES = ['http_headers', 'http_body']
+
+    def __init__(self):
+        self.__sessions = {} # session identifier -> requests ordered by `id`
+        self.blobs = BlobStore()
+
+    def add(self, generic_request):
+        for attribute in self.BLOB_ATTRIBUTES:
+            attribute_digest = generic_request.digest(attribute)
+            setattr(generic_request, attribute, self.blobs.intern(getattr(generic_request, attribute), attribute_digest))
+            generic_request.blob_encodings[attribute] = self.blobs.encodings(attribute_digest) # encoded once per distinct blob
+        self.__sessions.setdefault(generic_request.session_id, []).append(generic_request)
+
+    def requests(self, since, limit=None, session_id=None):
+        """
+        Returns requests with `id >= since` (all or only recorded in given session), up to `limit`, ordered by `id`.
+        """
+        if session_id is None:
+            sessions = self.__sessions.values()
+        else:
+            sessions = [self.__sessions[session_id]] if session_id in self.__sessions else []
+
+        merged = heapq.merge(
+            *[requests[_index_of_first_request(requests, since):] for requests in sessions],
+            key=lambda request: request.id
+        )
+        return list(itertools.islice(merged, limit))
+
+    def events_since(self, since):
+        """
+        Iterates `(id, session_id, events)` of requests with `id >= since`, ordered by `id`.
+        """
+        for generic_request in self.requests(since):
+            yield generic_request.id, generic_request.session_id, generic_request.events
+
+    def request(self, request_id):
+        for requests in self.__sessions.values():
+            index = _index_of_first_request(requests, request_id)
+            if index < len(requests) and requests[index].id == request_id:
+                return requests[index]
+        return None
+
+    def delete_oldest_requests(self, session_id, count):
+        """
+        Deletes `count` oldest requests in given session.
+        :return: the total size of deleted requests
+        """
+        requests = self.__sessions[session_id]
+        deleted_size = sum([request.size for request in requests[:count]])
+        self.__release(requests[:count])
+        del requests[:count]
+        return deleted_size
+
+    def delete_session(self, session_id):
+        self.__release(self.__sessions.pop(session_id, []))
+
+    def sessions(self):
+        """
+        Lists `(session_id, count, size)` of stored sessions. Memory doesn't survive restarts, so it's always empty
+        when the history is created.
+        """
+        return [(session_id, len(requests), sum([r.size for r in requests])) for session_id, requests in self.__sessions.items()]
+
+    def last_id(self):
+        return max([requests[-1].id for requests in self.__sessions.values() if len(requests) > 0], default=-1)
+
+    def blob_stats(self):
+        """
+        Returns the number and size of stored blobs, their size without deduplication and the size of their cached encodings.
+        """
+        return self.blobs.stats()
+
+    def clear(self):
+        self.__sessions.clear()
+        self.blobs.clear()
+
+    def close(self):
+        pass
+
+    def __release(self, generic_requests):
+        for generic_request in generic_requests:
+            for attribute in self.BLOB_ATTRIBUTES:
+                self.blobs.release(generic_request.digest(attribute))
+
+class SQLiteStorage:
+    """
+    Keeps recorded requests in SQLite database file, so they don't occupy server memory and can be inspected after
+    the server is restarted (or crashed).
+
+    Inserts are buffered and written in batches of `batch_size` in one transaction, which keeps ingest throughput
+    close to in-memory storage. Pending inserts are flushed before every read and at least every `flush_interval`.
+
+    Requests are read from the file on every access, so encodings cached by `GenericRequest.encoded()` only last
+    for one read: unlike in `MemoryStorage`, headers and bodies are encoded again by every `/inspect` poll.
+    """
+
+    def __init__(self, path, batch_size=100, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.__lock = threading.RLock()
+        self.__pending = [] # rows waiting for batch insert
+        import sqlite3 # only imported when used, to not slow down startup of servers keeping requests in memory
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute('PRAGMA synchronous=NORMAL')
+        self.__connection.executescript('''
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                method TEXT NOT NULL,
+                path TEXT NOT NULL,
+                arrival_time REAL NOT NULL,
+                headers BLOB NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                events TEXT,
+                decoding_error TEXT,
+                simulated_response TEXT
+            );
+            CREATE INDEX IF NOT EXISTS requests_session ON requests (session_id, id);
+            CREATE INDEX IF NOT EXISTS requests_path ON requests (path);
+            CREATE INDEX IF NOT EXISTS requests_method ON requests (method);
+            CREATE INDEX IF NOT EXISTS requests_arrival_time ON requests (arrival_time);
+        ''')
+        # Add columns missing in database files created by older versions of this server
+        existing_columns = [row[1] for row in self.__connection.execute('PRAGMA table_info(requests)')]
+        for column in ['events', 'decoding_error', 'simulated_response']:
+            if column not in existing_columns:
+                self.__connection.execute(f'ALTER TABLE requests ADD COLUMN {column} TEXT')
+        self.__closed = threading.Event()
+        self.__flusher = threading.Thread(target=self.__flush_periodically, args=(flush_interval,), daemon=True)
+        self.__flusher.start()
+
+    def add(self, generic_request):
+        with self.__lock:
+            self.__pending.append((
+                generic_request.id,
+                generic_request.session_id,
+                generic_request.http_method,
+                generic_request.path,
+                generic_request.arrival_time,
+                generic_request.http_headers,
+                generic_request.http_body,
+                generic_request.size,
+                json.dumps(generic_request.events) if generic_request.events is not None else None,
+                generic_request.decoding_error,
+                json.dumps(generic_request.simulated_response) if generic_request.simulated_response is not None else None,
+            ))
+            if len(self.__pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """
+        Writes pending inserts in one transaction.
+        """
+        with self.__lock:
+            if len(self.__pending) == 0:
+                return
+            with self.__connection:
+                self.__connection.executemany('INSERT INTO requests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', self.__pending)
+            self.__pending.clear()
+
+    def requests(self, since, limit=None, session_id=None):
+        """
+        Returns requests with `id >= since` (all or only recorded in given session), up to `limit`, ordered by `id`.
+        """
+        query = f'SELECT {_REQUEST_COLUMNS} FROM requests WHERE id >= ?'
+        arguments = [since]
+        if session_id is not None:
+            query += ' AND session_id = ?'
+            arguments.append(session_id)
+        query += ' ORDER BY id'
+        if limit is not None:
+            query += ' LIMIT ?'
+            arguments.append(limit)
+        return [_generic_request(row) for row in self.__fetch(query, arguments)]
+
+    def events_since(self, since, page_size=1000):
+        """
+        Iterates `(id, session_id, events)` of requests with `id >= since`, ordered by `id`. Only decoded events
+        are read (not headers and bodies), page by page, so one page is held in memory at a time.
+        """
+        while True:
+            rows = self.__fetch('SELECT id, session_id, events FROM requests WHERE id >= ? ORDER BY id LIMIT ?', [since, page_size])
+            for request_id, session_id, events in rows:
+                yield request_id, session_id, json.loads(events) if events is not None else None
+            if len(rows) < page_size:
+                return
+            since = rows[-1][0] + 1
+
+    def request_events(self, request_ids):
+        """
+        Reads decoded events of requests with given identifiers.
+        :return: dictionary of request identifier -> events (deleted requests are missing)
+        """
+        request_ids = list(request_ids)
+        events_by_id = {}
+        for start in range(0, len(request_ids), 500): # SQLite limits the number of query parameters
+            page = request_ids[start:start + 500]
+            rows = self.__fetch(f'SELECT id, events FROM requests WHERE id IN ({", ".join(["?"] * len(page))})', page)
+            events_by_id.update({request_id: json.loads(events) for request_id, events in rows if events is not None})
+        return events_by_id
+
+    def request(self, request_id):
+        rows = self.__fetch(f'SELECT {_REQUEST_COLUMNS} FROM requests WHERE id = ?', [request_id])
+        return _generic_request(rows[0]) if len(rows) > 0 else None
+
+    def delete_oldest_requests(self, session_id, count):
+        """
+        Deletes `count` oldest requests in given session.
+        :return: the total size of deleted requests
+        """
+        with self.__lock:
+            self.flush()
+            oldest = 'SELECT id FROM requests WHERE session_id = ? ORDER BY id LIMIT ?'
+            with self.__connection:
+                deleted_size = self.__connection.execute(
+                    f'SELECT COALESCE(SUM(size), 0) FROM requests WHERE id IN ({oldest})', [session_id, count]
+                ).fetchone()[0]
+                self.__connection.execute(f'DELETE FROM requests WHERE id IN ({oldest})', [session_id, count])
+            return deleted_size
+
+    def delete_session(self, session_id):
+        with self.__lock:
+            self.flush()
+            with self.__connection:
+                self.__connection.execute('DELETE FROM requests WHERE session_id = ?', [session_id])
+
+    def sessions(self):
+        """
+        Lists `(session_id, count, size)` of stored sessions, including ones persisted by previous runs.
+        """
+        return self.__fetch('SELECT session_id, COUNT(*), SUM(size) FROM requests GROUP BY session_id ORDER BY MAX(id)', [])
+
+    def blob_stats(self):
+        """
+        Headers and bodies are kept in the database file, not in memory, so there are no blobs to report.
+        """
+        return None
+
+    def last_id(self):
+        return self.__fetch('SELECT COALESCE(MAX(id), -1) FROM requests', [])[0][0]
+
+    def clear(self):
+        with self.__lock:
+            self.__pending.clear()
+            with self.__connection:
+                self.__connection.execute('DELETE FROM requests')
+
+    def close(self):
+        self.__closed.set()
+        self.__flusher.join()
+        with self.__lock:
+            self.flush()
+            self.__connection.close()
+
+    def __fetch(self, query, arguments):
+        with self.__lock:
+            self.flush()
+            return self.__connection.execute(query, arguments).fetchall()
+
+    def __flush_periodically(self, interval):
+        while not self.__closed.wait(interval):
+            self.flush()
+
+# Columns read by `_generic_request()`
+_REQUEST_COLUMNS = 'id, method, path, headers, body, arrival_time, events, decoding_error, simulated_response'
+
+def _generic_request(row):
+    request_id, method, path, headers, body, arrival_time, events, decoding_error, simulated_response = row
+    generic_request = GenericRequest(method, path, headers, body, arrival_time=arrival_time)
+    generic_request.id = request_id
+    generic_request.events = json.loads(events) if events is not None else None
+    generic_request.events_size = len(events) if events is not None else 0
+    generic_request.decoding_error = decoding_error
+    generic_request.simulated_response = json.loads(simulated_response) if simulated_response is not None else None
+    return generic_request
+
+def _index_of_first_request(requests, since):
+    """
+    Binary-searches requests ordered by `id` for the first one with `id >= since`.
+    """
+    low, high = 0, len(requests)
+    while low < high:
+        middle = (low + high) // 2
+        if requests[middle].id < since:
+            low = middle + 1
+        else:
+            high = middle
+    return low
@@ -0,0 +1,182 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import re
+import json
+import random
+import threading
+
+def _number(value, name, minimum=0.0, maximum=None):
+    """
+    Checks that given config value is a number within `[minimum, maximum]`. Raises `ValueError` otherwise.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float)) \
+            or value < minimum or (maximum is not None and value > maximum):
+        bounds = f'[{minimum}, {maximum}]' if maximum is not None else f'>= {minimum}'
+        raise ValueError(f'`{name}` must be a number {bounds}, got: {json.dumps(value)}')
+    return value
+
+def _object(config, name):
+    """
+    Returns the object under given key of config (empty if not set). Raises `ValueError` if it is not an object.
+    """
+    value = config.get(name, {})
+    if not isinstance(value, dict):
+        raise ValueError(f'`{name}` must be an object, got: {json.dumps(value)}')
+    return value
+
+def delay_sampler(config):
+    """
+    Returns function sampling response delay (in seconds) from given config. The config is either a number
+    (fixed delay) or a distribution:
+    - `{"distribution": "uniform", "min": <s>, "max": <s>}`,
+    - `{"distribution": "normal", "mean": <s>, "stddev": <s>}`,
+    - `{"distribution": "exponential", "mean": <s>}`.
+    """
+    if config is None:
+        return lambda rng: 0.0
+    if not isinstance(config, dict):
+        delay = float(_number(config, 'delay'))
+        return lambda rng: delay
+
+    distribution = config.get('distribution')
+    if distribution == 'uniform':
+        low, high = float(_number(config.get('min'), 'delay.min')), float(_number(config.get('max'), 'delay.max'))
+        if low > high:
+            raise ValueError('`delay.min` must not exceed `delay.max`')
+        return lambda rng: rng.uniform(low, high)
+    elif distribution == 'normal':
+        mean, stddev = float(_number(config.get('mean'), 'delay.mean')), float(_number(config.get('stddev'), 'delay.stddev'))
+        return lambda rng: max(rng.gauss(mean, stddev), 0.0)
+    elif distribution == 'exponential':
+        mean = float(_number(config.get('mean'), 'delay.mean'))
+        return lambda rng: rng.expovariate(1 / mean) if mean > 0 else 0.0
+    raise ValueError(f'Unknown delay distribution: {distribution}')
+
+class ResponseRule:
+    """
+    Simulated response for requests matching `path` regexp (and `method`):
+    - `delay` - fixed or distributed delay of the response (see `delay_sampler()`),
+    - `errors` - `{"rate": <0...1>, "statuses": [<status>, ...]}` - fraction of requests answered with random error status,
+    - `throttling` - `{"rate": <0...1>, "retry_after": <s>}` - fraction of requests answered with `429` and `Retry-After`,
+    - `bandwidth` - max number of request body bytes read per second.
+    Invalid config (wrong types, rates or statuses out of range) raises `ValueError`.
+    """
+
+    def __init__(self, config):
+        if not isinstance(config, dict):
+            raise ValueError('Response rule must be an object')
+        self.config = config
+        if not isinstance(config.get('path', ''), str) or not isinstance(config.get('method', 'POST'), str):
+            raise ValueError('`path` and `method` must be strings')
+        try:
+            self.path_regexp = re.compile(config.get('path', ''))
+        except re.error as error:
+            raise ValueError(f'Invalid path regexp: {error}')
+        self.method = config.get('method', 'POST')
+        self.sample_delay = delay_sampler(config.get('delay'))
+        errors = _object(config, 'errors')
+        self.error_rate = float(_number(errors.get('rate', 0), 'errors.rate', maximum=1))
+        statuses = errors.get('statuses', [500])
+        if not isinstance(statuses, list) or len(statuses) == 0:
+            raise ValueError('`errors.statuses` must be a non-empty array')
+        self.error_statuses = [int(_number(status, 'errors.statuses', minimum=100, maximum=599)) for status in statuses]
+        throttling = _object(config, 'throttling')
+        self.throttling_rate = float(_number(throttling.get('rate', 0), 'throttling.rate', maximum=1))
+        self.retry_after = int(_number(throttling.get('retry_after', 1), 'throttling.retry_after'))
+        self.bandwidth = int(_number(config['bandwidth'], 'bandwidth', minimum=1)) if config.get('bandwidth') is not None else None
+        if self.error_rate + self.throttling_rate > 1:
+            raise ValueError('Sum of `errors.rate` and `throttling.rate` must not exceed 1')
+
+    def matches(self, method, path):
+        return method == self.method and self.path_regexp.search(path) is not None
+
+class SimulatedResponse:
+    """
+    Outcome of `ResponseRule` for one request.
+    """
+
+    def __init__(self, rule_index, status, delay, retry_after=None):
+        self.rule_index = rule_index
+        self.status = status
+        self.delay = delay # seconds
+        self.retry_after = retry_after # seconds (only for `429`)
+
+    def as_json(self):
+        return {"rule": self.rule_index, "status": self.status, "delay": self.delay, "retry_after": self.retry_after}
+
+class ResponseSimulator:
+    """
+    Decides how the server responds to requests, according to rules loaded from config file or set with `PUT /simulation`.
+    The config is `{"seed": <n>, "rules": [<ResponseRule config>, ...]}` - the first matching rule applies.
+    Without rules, all requests are answered with `200` immediately.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__rules = []
+        self.__rng = random.Random()
+        self.__config = {"rules": []}
+
+    @classmethod
+    def from_file(cls, path):
+        simulator = cls()
+        with open(path) as file:
+            simulator.configure(json.load(file))
+        return simulator
+
+    def configure(self, config):
+        """
+        Replaces rules with ones from given config. Raises `ValueError` for invalid config.
+        """
+        if not isinstance(config, dict) or not isinstance(config.get('rules', []), list) \
+                or not isinstance(config.get('seed'), (int, float, str, type(None))):
+            raise ValueError('Invalid simulation config')
+        rules = [ResponseRule(rule_config) for rule_config in config.get('rules', [])]
+        with self.__lock:
+            self.__rules = rules
+            self.__rng = random.Random(config.get('seed'))
+            self.__config = config
+
+    def config(self):
+        with self.__lock:
+            return self.__config
+
+    @property
+    def is_active(self):
+        return len(self.__rules) > 0
+
+    def bandwidth(self, method, path):
+        """
+        Returns max number of request body bytes to read per second or `None` if reading is not throttled.
+        """
+        with self.__lock:
+            rule_index = self.__matching_rule_index(method, path)
+            return self.__rules[rule_index].bandwidth if rule_index is not None else None
+
+    def simulate(self, method, path):
+        """
+        Draws the response for given request.
+        :return: `SimulatedResponse` or `None` if no rule matches
+        """
+        with self.__lock:
+            rule_index = self.__matching_rule_index(method, path)
+            if rule_index is None:
+                return None
+            rule = self.__rules[rule_index]
+            delay = rule.sample_delay(self.__rng)
+            draw = self.__rng.random()
+            if draw < rule.throttling_rate:
+                return SimulatedResponse(rule_index, 429, delay, retry_after=rule.retry_after)
+            elif draw < rule.throttling_rate + rule.error_rate:
+                return SimulatedResponse(rule_index, self.__rng.choice(rule.error_statuses), delay)
+            return SimulatedResponse(rule_index, 200, delay)
+
+    def __matching_rule_index(self, method, path):
+        for index, rule in enumerate(self.__rules):
+            if rule.matches(method, path):
+                return index
+        return None
@@ -0,0 +1,192 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+from collections import deque
+import threading
+import bisect
+
+class IndexedEvent:
+    """
+    RUM event decoded from one generic request, as stored in `RUMEventsIndex`: its keys and the event itself,
+    unless the index reads events back from the storage.
+    """
+
+    def __init__(self, sequence, request_id, position, event, keeps_event):
+        self.sequence = sequence # ingest order, used to order events with equal `date`
+        self.request_id = request_id
+        self.position = position # index of the event in `events` of its request
+        self.event = event if keeps_event else None
+        self.is_removed = False
+        self.session_id = _session_id(event)
+        self.view_id = _view_id(event)
+        self.type = event['type']
+        # Malformed events are indexed too (so they can be inspected), with non-numeric values read as `0`
+        self.date = _number(event.get('date'))
+        self.document_version = _number(event['_dd'].get('document_version')) if isinstance(event.get('_dd'), dict) else 0
+
+class RUMEventsIndex:
+    """
+    Incremental index of RUM events decoded from recorded requests (see `payload_decoders.py`), keyed by
+    RUM `session.id`, `view.id` and event `type` and sorted by `date`, so queries only visit matching events
+    instead of the whole history.
+
+    It is kept in sync by `GenericRequestsHistory`: events are indexed when requests are added and dropped when
+    requests are evicted. Dropped events are only flagged and compacted once they outnumber live events.
+
+    If `load_events(request_ids)` is given (e.g. `SQLiteStorage.request_events`), the index keeps only keys of
+    events and reads matching events back from the storage, so they don't occupy server memory.
+    """
+
+    def __init__(self, load_events=None):
+        self.__lock = threading.Lock()
+        self.__load_events = load_events
+        self.__reset()
+
+    def add(self, generic_request):
+        """
+        Indexes RUM events of given request (if any).
+        """
+        self.add_events(generic_request.id, generic_request.session_id, generic_request.events)
+
+    def add_events(self, request_id, session_id, events):
+        """
+        Indexes RUM events decoded from request with given identifier, recorded in given session.
+        """
+        with self.__lock:
+            indexed_events = []
+            for position, event in enumerate(events or []):
+                if not _is_rum_event(event):
+                    continue
+                indexed_event = IndexedEvent(self.__next_sequence, request_id, position, event, keeps_event=self.__load_events is None)
+                self.__next_sequence += 1
+                self.__index(indexed_event)
+                indexed_events.append(indexed_event)
+            # Every request is tracked (even with no RUM events), so evictions can be mirrored by count
+            self.__recording_sessions.setdefault(session_id, deque()).append(indexed_events)
+
+    def remove_oldest_requests(self, session_id, count):
+        """
+        Drops events of `count` oldest requests recorded in given session.
+        """
+        with self.__lock:
+            requests = self.__recording_sessions.get(session_id, deque())
+            for _ in range(min(count, len(requests))):
+                self.__remove(requests.popleft())
+            self.__compact_if_needed()
+
+    def remove_session(self, session_id):
+        """
+        Drops events of all requests recorded in given session.
+        """
+        with self.__lock:
+            for indexed_events in self.__recording_sessions.pop(session_id, deque()):
+                self.__remove(indexed_events)
+            self.__compact_if_needed()
+
+    def clear(self):
+        with self.__lock:
+            self.__reset()
+
+    def __reset(self):
+        self.__next_sequence = 0
+        self.__live_count = 0
+        self.__removed_count = 0
+        self.__recording_sessions = {} # session of the mock server -> queue of indexed events lists, one per request
+        self.__by_session = {} # RUM `session.id` -> indexed events
+        self.__by_view = {} # `view.id` -> indexed events
+        self.__by_type = {} # event `type` -> indexed events
+        self.__date_keys = [] # `(date, sequence)` of indexed events, sorted
+        self.__by_date = [] # indexed events in the order of `__date_keys`
+
+    def query(self, session_id=None, view_id=None, event_type=None, since_date=None, until_date=None, latest_views=True):
+        """
+        Returns RUM events matching all given keys, ordered by `date`. Only `since_date <= date < until_date`
+        events are returned if dates are given. With `latest_views`, updates of each view are collapsed to the one
+        with highest `_dd.document_version`.
+        """
+        with self.__lock:
+            candidates = [
+                index.get(key, []) for index, key in [
+                    (self.__by_session, session_id), (self.__by_view, view_id), (self.__by_type, event_type)
+                ] if key is not None
+            ]
+            if len(candidates) == 0 or since_date is not None or until_date is not None:
+                # Events in the date range are found by bisecting, `(date,)` sorts before all `(date, sequence)` keys
+                start = bisect.bisect_left(self.__date_keys, (since_date,)) if since_date is not None else 0
+                end = bisect.bisect_left(self.__date_keys, (until_date,)) if until_date is not None else len(self.__date_keys)
+                if len(candidates) == 0 or end - start < min([len(c) for c in candidates]):
+                    candidates = [self.__by_date[start:end]]
+            matching = min(candidates, key=len) # scan the most selective index, check other keys per event
+
+            results = []
+            latest_view_updates = {} # `view.id` -> position of its latest update in `results`
+            for indexed_event in matching:
+                if indexed_event.is_removed \
+                        or (session_id is not None and indexed_event.session_id != session_id) \
+                        or (view_id is not None and indexed_event.view_id != view_id) \
+                        or (event_type is not None and indexed_event.type != event_type) \
+                        or (since_date is not None and indexed_event.date < since_date) \
+                        or (until_date is not None and indexed_event.date >= until_date):
+                    continue
+                if latest_views and indexed_event.type == 'view':
+                    position = latest_view_updates.get(indexed_event.view_id)
+                    if position is not None:
+                        if results[position].document_version <= indexed_event.document_version:
+                            results[position] = indexed_event
+                        continue
+                    latest_view_updates[indexed_event.view_id] = len(results)
+                results.append(indexed_event)
+
+            results.sort(key=lambda e: (e.date, e.sequence))
+            if self.__load_events is None:
+                return [indexed_event.event for indexed_event in results]
+
+        # Requests evicted since the query are missing in the storage, so their events are skipped
+        events_by_id = self.__load_events({indexed_event.request_id for indexed_event in results})
+        return [events_by_id[e.request_id][e.position] for e in results if e.request_id in events_by_id]
+
+    def __index(self, indexed_event):
+        self.__by_session.setdefault(indexed_event.session_id, []).append(indexed_event)
+        self.__by_type.setdefault(indexed_event.type, []).append(indexed_event)
+        if indexed_event.view_id is not None:
+            self.__by_view.setdefault(indexed_event.view_id, []).append(indexed_event)
+        date_key = (indexed_event.date, indexed_event.sequence)
+        position = bisect.bisect(self.__date_keys, date_key) # events mostly arrive in `date` order, so it is near the end
+        self.__date_keys.insert(position, date_key)
+        self.__by_date.insert(position, indexed_event)
+        self.__live_count += 1
+
+    def __remove(self, indexed_events):
+        for indexed_event in indexed_events:
+            indexed_event.is_removed = True
+        self.__live_count -= len(indexed_events)
+        self.__removed_count += len(indexed_events)
+
+    def __compact_if_needed(self):
+        if self.__removed_count <= self.__live_count:
+            return
+        live_events = sorted(
+            [e for events in self.__by_type.values() for e in events if not e.is_removed],
+            key=lambda e: e.sequence
+        )
+        self.__by_session, self.__by_view, self.__by_type = {}, {}, {}
+        self.__date_keys, self.__by_date = [], []
+        self.__live_count, self.__removed_count = 0, 0
+        for indexed_event in live_events:
+            self.__index(indexed_event)
+
+def _is_rum_event(event):
+    return isinstance(event, dict) and isinstance(event.get('type'), str) and isinstance(event.get('session'), dict)
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+def _session_id(event):
+    return event['session'].get('id')
+
+def _view_id(event):
+    view = event.get('view')
+    return view.get('id') if isinstance(view, dict) else None
@@ -0,0 +1,567 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import os
+import re
+import json
+import threading
+
+# Schemas of RUM and Session Replay events, relative to `schemas` directory of `rum-events-format` repo
+# (cloned to `tools/rum-models-generator/rum-events-format` by `tools/rum-models-generator/run.py`)
+RUM_SCHEMA = 'rum-events-mobile-schema.json'
+SR_SCHEMA = 'session-replay-mobile-schema.json'
+
+# Validator compiled from a schema is a function taking JSON instance and returning `None` if it is valid or list
+# of `(JSON pointer, message)` violations otherwise. Schemas accepting any instance are compiled to `None`, so they
+# cost nothing when validating.
+
+def _json_key(value):
+    """
+    Hashable key of JSON value, distinguishing `true` from `1` (which are equal in Python).
+    """
+    if isinstance(value, bool):
+        return ('boolean', value)
+    if isinstance(value, (int, float)):
+        return ('number', value)
+    if isinstance(value, (dict, list)):
+        return ('json', json.dumps(value, sort_keys=True))
+    return (type(value).__name__, value)
+
+def _escaped_pointer_token(key):
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+def _nested(errors, key):
+    token = '/' + _escaped_pointer_token(key)
+    return [(token + path, message) for path, message in errors]
+
+def _is_integer(value):
+    return (isinstance(value, int) and not isinstance(value, bool)) or (isinstance(value, float) and value.is_integer())
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+_TYPE_CHECKS = {
+    'object': lambda value: isinstance(value, dict),
+    'array': lambda value: isinstance(value, list),
+    'string': lambda value: isinstance(value, str),
+    'boolean': lambda value: isinstance(value, bool),
+    'null': lambda value: value is None,
+    'integer': _is_integer,
+    'number': _is_number,
+}
+
+# Types checked with one `isinstance()` (numbers need to exclude `bool`, which is a subclass of `int`)
+_PYTHON_TYPES = {'object': dict, 'array': list, 'string': str, 'boolean': bool, 'null': type(None)}
+
+# Draft-07 keywords constraining instances, which are not implemented - schemas using them are rejected when
+# compiled, so they can't pass validation silently
+_UNSUPPORTED_KEYWORDS = [
+    'multipleOf', 'minProperties', 'maxProperties', 'propertyNames', 'dependencies', 'contains', 'additionalItems',
+    'contentMediaType', 'contentEncoding',
+]
+
+class UnsupportedSchemaError(ValueError):
+    pass
+
+def _all_of(validators):
+    """
+    Validator collecting violations of all given validators.
+    """
+    if len(validators) == 0:
+        return None
+    if len(validators) == 1:
+        return validators[0]
+
+    def validate(instance):
+        errors = None
+        for validator in validators:
+            result = validator(instance)
+            if result is not None:
+                errors = result if errors is None else errors + result
+        return errors
+    return validate
+
+class SchemaValidators:
+    """
+    Compiles JSON schemas (the subset of draft-07 used by `rum-events-format`) into validator functions.
+
+    Each schema document is loaded once and each `$ref` is resolved and compiled once, so validators of schemas
+    referencing the same definitions share compiled code. Keywords which only annotate the schema (`title`,
+    `description`, `readOnly`, `format`...) are ignored. Schemas using validation keywords which are not
+    implemented (see `_UNSUPPORTED_KEYWORDS`) raise `UnsupportedSchemaError`.
+
+    Validators check only what is needed on the hot path: object keywords iterate over properties present in
+    the instance, and `oneOf` branches discriminated by a `const` property (e.g. RUM event `type`) are picked
+    by a dictionary lookup instead of validating the instance against every branch.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__documents = {} # absolute file path -> loaded JSON document
+        self.__references = {} # `(absolute file path, JSON pointer)` -> one-element list with compiled validator
+        self.__compiling = set() # references being compiled (referenced recursively)
+
+    def compile_file(self, path):
+        """
+        Returns validator of JSON schema in given file.
+        """
+        with self.__lock:
+            return self.__reference('', os.path.abspath(path), resolve=True)
+
+    def compile(self, schema, base_path):
+        """
+        Returns validator of given JSON schema. Its relative `$ref`s are resolved against `base_path`.
+        """
+        with self.__lock:
+            return self.__compile(schema, os.path.abspath(base_path))
+
+    def __document(self, path):
+        document = self.__documents.get(path)
+        if document is None:
+            with open(path) as file:
+                document = self.__documents[path] = json.load(file)
+        return document
+
+    def __resolve(self, ref, base_path):
+        """
+        Returns `(absolute file path, JSON pointer)` of given `$ref`.
+        """
+        location, _, pointer = ref.partition('#')
+        path = os.path.normpath(os.path.join(os.path.dirname(base_path), location)) if location else base_path
+        return path, pointer
+
+    def __schema_at(self, path, pointer):
+        schema = self.__document(path)
+        for token in pointer.split('/')[1:]:
+            token = token.replace('~1', '/').replace('~0', '~')
+            schema = schema[int(token)] if isinstance(schema, list) else schema[token]
+        return schema
+
+    def __reference(self, ref, base_path, resolve=False):
+        """
+        Returns validator of referenced schema, compiling it on first use. Recursive references are compiled to
+        a function looking up the validator when called.
+        """
+        key = (base_path, '') if resolve else self.__resolve(ref, base_path)
+        cell = self.__references.get(key)
+        if cell is None:
+            cell = self.__references[key] = [None]
+            self.__compiling.add(key)
+            path, pointer = key
+            cell[0] = self.__compile(self.__schema_at(path, pointer), path)
+            self.__compiling.remove(key)
+        if key in self.__compiling:
+            return lambda instance: cell[0](instance) if cell[0] is not None else None
+        return cell[0]
+
+    def __referenced_schema(self, schema, base_path):
+        """
+        Follows `$ref`s of given schema.
+        :return: tuple of the schema and path of its document
+        """
+        seen = set()
+        while isinstance(schema, dict) and '$ref' in schema:
+            key = self.__resolve(schema['$ref'], base_path)
+            if key in seen:
+                break
+            seen.add(key)
+            base_path = key[0]
+            schema = self.__schema_at(*key)
+        return schema, base_path
+
+    def __compile(self, schema, base_path):
+        if schema is True or schema == {}:
+            return None
+        if schema is False:
+            return lambda instance: [('', 'no value is allowed')]
+        if '$ref' in schema:
+            return self.__reference(schema['$ref'], base_path) # keywords next to `$ref` are ignored in draft-07
+        unsupported = [keyword for keyword in _UNSUPPORTED_KEYWORDS if keyword in schema]
+        if len(unsupported) > 0:
+            raise UnsupportedSchemaError(f'Keywords {", ".join(unsupported)} used in {base_path} are not supported')
+
+        checks = []
+        if 'type' in schema:
+            checks.append(self.__type(schema['type']))
+        if 'const' in schema:
+            checks.append(self.__enum([schema['const']]))
+        if 'enum' in schema:
+            checks.append(self.__enum(schema['enum']))
+        # Keywords applying to one type of instances are compiled together, into one check
+        for keywords, compile_keywords in [
+            (['properties', 'required', 'additionalProperties', 'patternProperties'], self.__object),
+            (['items', 'minItems', 'maxItems', 'uniqueItems'], self.__array),
+            (['minLength', 'maxLength', 'pattern'], self.__string),
+            (['minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum'], self.__number),
+        ]:
+            if any(keyword in schema for keyword in keywords):
+                checks.append(compile_keywords(schema, base_path))
+        if 'allOf' in schema:
+            checks += [validator for validator in (self.__compile(subschema, base_path) for subschema in schema['allOf']) if validator is not None]
+        if 'anyOf' in schema:
+            checks.append(self.__any_of(schema['anyOf'], base_path))
+        if 'oneOf' in schema:
+            checks.append(self.__one_of(schema['oneOf'], base_path))
+        if 'not' in schema:
+            checks.append(self.__not(schema['not'], base_path))
+        if 'if' in schema:
+            checks.append(self.__if(schema, base_path))
+        return _all_of([check for check in checks if check is not None])
+
+    def __type(self, types):
+        types = [types] if isinstance(types, str) else types
+        type_checks = [_TYPE_CHECKS[name] for name in types]
+        message = f'is not of type {" or ".join(types)}'
+        if all(name in _PYTHON_TYPES for name in types):
+            python_types = tuple(_PYTHON_TYPES[name] for name in types)
+            return lambda instance: None if isinstance(instance, python_types) else [('', message)]
+
+        def check(instance):
+            for type_check in type_checks:
+                if type_check(instance):
+                    return None
+            return [('', message)]
+        return check
+
+    def __enum(self, values):
+        keys = {_json_key(value) for value in values}
+        message = f'is not one of {json.dumps(values)}' if len(values) > 1 else f'is not {json.dumps(values[0])}'
+
+        def check(instance):
+            return None if _json_key(instance) in keys else [('', message)]
+        return check
+
+    def __object(self, schema, base_path):
+        properties = {name: self.__compile(subschema, base_path) for name, subschema in schema.get('properties', {}).items()}
+        required = schema.get('required', [])
+        pattern_properties = [(re.compile(pattern), self.__compile(subschema, base_path)) for pattern, subschema in schema.get('patternProperties', {}).items()]
+        additional = schema.get('additionalProperties', True)
+        additional_validator = self.__compile(additional, base_path) if additional is not False else None
+
+        def check(instance):
+            if not isinstance(instance, dict):
+                return None
+            errors = None
+            for name in required:
+                if name not in instance:
+                    errors = (errors or []) + [('', f'is missing required property "{name}"')]
+            for name, value in instance.items():
+                if name in properties:
+                    validator = properties[name]
+                else:
+                    matched = False
+                    for pattern, pattern_validator in pattern_properties:
+                        if pattern.search(name) is not None:
+                            matched = True
+                            result = pattern_validator(value) if pattern_validator is not None else None
+                            if result is not None:
+                                errors = (errors or []) + _nested(result, name)
+                    if matched:
+                        continue
+                    if additional is False:
+                        errors = (errors or []) + [('', f'has unexpected property "{name}"')]
+                        continue
+                    validator = additional_validator
+                if validator is not None:
+                    result = validator(value)
+                    if result is not None:
+                        errors = (errors or []) + _nested(result, name)
+            return errors
+        return check
+
+    def __array(self, schema, base_path):
+        items = schema.get('items', True)
+        item_validators = [self.__compile(subschema, base_path) for subschema in items] if isinstance(items, list) else None
+        item_validator = self.__compile(items, base_path) if not isinstance(items, list) else None
+        min_items = schema.get('minItems')
+        max_items = schema.get('maxItems')
+        unique_items = schema.get('uniqueItems', False)
+
+        def check(instance):
+            if not isinstance(instance, list):
+                return None
+            errors = None
+            if min_items is not None and len(instance) < min_items:
+                errors = [('', f'has less than {min_items} items')]
+            if max_items is not None and len(instance) > max_items:
+                errors = [('', f'has more than {max_items} items')]
+            if unique_items and len({_json_key(item) for item in instance}) < len(instance):
+                errors = (errors or []) + [('', 'has non-unique items')]
+            if item_validator is not None:
+                for index, item in enumerate(instance):
+                    result = item_validator(item)
+                    if result is not None:
+                        errors = (errors or []) + _nested(result, index)
+            elif item_validators is not None:
+                for index, (validator, item) in enumerate(zip(item_validators, instance)):
+                    result = validator(item) if validator is not None else None
+                    if result is not None:
+                        errors = (errors or []) + _nested(result, index)
+            return errors
+        return check
+
+    def __string(self, schema, base_path):
+        min_length = schema.get('minLength')
+        max_length = schema.get('maxLength')
+        pattern = re.compile(schema['pattern']) if 'pattern' in schema else None
+
+        def check(instance):
+            if not isinstance(instance, str):
+                return None
+            if min_length is not None and len(instance) < min_length:
+                return [('', f'is shorter than {min_length}')]
+            if max_length is not None and len(instance) > max_length:
+                return [('', f'is longer than {max_length}')]
+            if pattern is not None and pattern.search(instance) is None:
+                return [('', f'does not match "{pattern.pattern}"')]
+            return None
+        return check
+
+    def __number(self, schema, base_path):
+        bounds = [
+            (schema.get('minimum'), lambda value, bound: value >= bound, 'is less than'),
+            (schema.get('maximum'), lambda value, bound: value <= bound, 'is greater than'),
+            (schema.get('exclusiveMinimum'), lambda value, bound: value > bound, 'is less than or equal to'),
+            (schema.get('exclusiveMaximum'), lambda value, bound: value < bound, 'is greater than or equal to'),
+        ]
+        bounds = [(bound, is_within, message) for bound, is_within, message in bounds if _is_number(bound)]
+
+        def check(instance):
+            if not _is_number(instance):
+                return None
+            for bound, is_within, message in bounds:
+                if not is_within(instance, bound):
+                    return [('', f'{message} {bound}')]
+            return None
+        return check
+
+    def __any_of(self, subschemas, base_path):
+        validators = [self.__compile(subschema, base_path) for subschema in subschemas]
+        if None in validators:
+            return None # one of subschemas accepts any instance
+
+        def check(instance):
+            for validator in validators:
+                if validator(instance) is None:
+                    return None
+            return [('', f'does not match any of {len(validators)} schemas of `anyOf`')]
+        return check
+
+    def __one_of(self, subschemas, base_path):
+        validators = [self.__compile(subschema, base_path) for subschema in subschemas]
+        discriminator, candidates_by_value, undiscriminated = self.__discriminator(subschemas, validators, base_path)
+        discriminator_values = [value for _, value in candidates_by_value.keys()]
+
+        def check(instance):
+            candidates = validators
+            if discriminator is not None and isinstance(instance, dict) and discriminator in instance:
+                candidates = candidates_by_value.get(_json_key(instance[discriminator]), undiscriminated)
+            matches = 0
+            closest_errors = None
+            for validator in candidates:
+                errors = validator(instance) if validator is not None else None
+                if errors is None:
+                    matches += 1
+                elif closest_errors is None or len(errors) < len(closest_errors):
+                    closest_errors = errors
+            if matches == 1:
+                return None
+            if matches > 1:
+                return [('', f'matches {matches} schemas of `oneOf`')]
+            if len(candidates) == 0:
+                return [('/' + _escaped_pointer_token(discriminator), f'is not one of {json.dumps(discriminator_values)}')]
+            if len(candidates) == 1:
+                return closest_errors
+            return [('', f'does not match any of {len(candidates)} schemas of `oneOf`')] + (closest_errors or [])
+        return check
+
+    def __discriminator(self, subschemas, validators, base_path):
+        """
+        Finds property with `const` value distinguishing `oneOf` subschemas. Only subschemas having the same value
+        (or no `const` for that property) can match an instance, so only these need to be validated.
+        :return: tuple of the property name (or `None`), `{value key: [validator, ...]}` and list of validators
+        of subschemas with no `const` for the property
+        """
+        consts = [self.__property_consts(subschema, base_path, depth=0) for subschema in subschemas]
+        names = {name for subschema_consts in consts for name in subschema_consts}
+        best_name = max(names, key=lambda name: (len({c[name] for c in consts if name in c}), name), default=None)
+        if best_name is None or len({c[best_name] for c in consts if best_name in c}) < 2:
+            return None, {}, []
+
+        undiscriminated = [validator for validator, c in zip(validators, consts) if best_name not in c]
+        candidates_by_value = {}
+        for validator, c in zip(validators, consts):
+            if best_name in c:
+                candidates_by_value.setdefault(c[best_name], list(undiscriminated)).append(validator)
+        return best_name, candidates_by_value, undiscriminated
+
+    def __property_consts(self, schema, base_path, depth):
+        """
+        Collects `{property name: key of const value}` of object schema, following `$ref`s and `allOf`.
+        """
+        schema, base_path = self.__referenced_schema(schema, base_path)
+        consts = {}
+        if not isinstance(schema, dict) or depth > 8:
+            return consts
+        for name, subschema in schema.get('properties', {}).items():
+            subschema, _ = self.__referenced_schema(subschema, base_path)
+            if isinstance(subschema, dict):
+                if 'const' in subschema:
+                    consts[name] = _json_key(subschema['const'])
+                elif len(subschema.get('enum', [])) == 1:
+                    consts[name] = _json_key(subschema['enum'][0])
+        for subschema in schema.get('allOf', []):
+            consts.update(self.__property_consts(subschema, base_path, depth + 1))
+        return consts
+
+    def __not(self, subschema, base_path):
+        validator = self.__compile(subschema, base_path)
+        if validator is None:
+            return lambda instance: [('', 'is not allowed')]
+        return lambda instance: [('', 'matches schema of `not`')] if validator(instance) is None else None
+
+    def __if(self, schema, base_path):
+        if_validator = self.__compile(schema['if'], base_path)
+        then_validator = self.__compile(schema.get('then', True), base_path)
+        else_validator = self.__compile(schema.get('else', True), base_path)
+
+        def check(instance):
+            validator = then_validator if if_validator is None or if_validator(instance) is None else else_validator
+            return validator(instance) if validator is not None else None
+        return check
+
+class SessionViolations:
+    """
+    Schema violations found in events of one session.
+    """
+
+    def __init__(self):
+        self.events = 0 # number of validated events
+        self.invalid_events = 0
+        self.counts = {} # `(schema, path with array indexes replaced by '*', message)` -> number of violations
+        self.samples = [] # first violations, with the event they were found in
+
+    def as_json(self):
+        return {
+            "events": self.events,
+            "invalid_events": self.invalid_events,
+            "violations": [
+                {"schema": schema, "path": path, "message": message, "count": count}
+                for (schema, path, message), count in sorted(self.counts.items(), key=lambda item: -item[1])
+            ],
+            "samples": self.samples,
+        }
+
+def is_rum_event(event):
+    return isinstance(event, dict) and 'type' in event and isinstance(event.get('application'), dict) and isinstance(event.get('session'), dict)
+
+def is_session_replay_segment(event):
+    return isinstance(event, dict) and 'records' in event
+
+class EventsValidator:
+    """
+    Validates events decoded from request payloads (see `payload_decoders.py`) against JSON schemas chosen by
+    request path (first matching regexp), and reports violations per session.
+
+    The SDK sends uploads to custom intake URL as they are, so `ServerSession` records them under
+    `/<session>` instead of the intake path. Events of such requests are matched by `Content-Type` of the request
+    and then by their shape, like payloads are matched by `PayloadDecoders`.
+    """
+
+    # Max number of violations kept with their event, per session
+    MAX_SAMPLES = 20
+
+    def __init__(self, validators=None):
+        self.validators = validators if validators is not None else SchemaValidators()
+        self.__lock = threading.Lock()
+        self.__tracks = [] # list of `(compiled path regexp, schema name, validator, select, media type, detect)`
+        self.__sessions = {} # session identifier -> `SessionViolations`
+
+    @classmethod
+    def default(cls, schemas_dir):
+        """
+        Validates RUM and Session Replay events against schemas from `rum-events-format` repo.
+        """
+        validator = cls()
+        validator.register(r'/api/v2/rum$', os.path.join(schemas_dir, RUM_SCHEMA), media_type='text/plain', detect=is_rum_event)
+        # Multipart payload of Session Replay also has JSON part with segment metadata, which is not a segment
+        validator.register(
+            r'/api/v2/replay$', os.path.join(schemas_dir, SR_SCHEMA), select=is_session_replay_segment,
+            media_type='multipart/form-data', detect=is_session_replay_segment
+        )
+        return validator
+
+    def register(self, path_regexp, schema_path, select=None, media_type=None, detect=None):
+        """
+        Validates events of requests matching `path_regexp` against JSON schema in `schema_path` (compiled right away).
+        Only events for which `select(event)` is `True` are validated (all by default).
+
+        Requests sent to paths matching no track are validated if their `Content-Type` has given `media_type`,
+        but only events for which `detect(event)` is `True`.
+        """
+        validator = self.validators.compile_file(schema_path)
+        self.__tracks.append((re.compile(path_regexp), os.path.basename(schema_path), validator, select, media_type, detect))
+
+    def validate(self, generic_request, path):
+        """
+        Validates decoded events of given `GenericRequest` and records their violations in its session.
+        :return: the number of invalid events
+        """
+        if generic_request.events is None:
+            return 0
+        track = next((track for track in self.__tracks if track[0].search(path) is not None), None)
+        if track is not None:
+            _, schema_name, validator, select, _, _ = track
+            tracks = [(schema_name, validator, select)]
+        else:
+            media_type = (generic_request.header('Content-Type') or '').split(';', 1)[0].strip().lower()
+            tracks = [(schema_name, validator, detect) for _, schema_name, validator, _, track_media_type, detect in self.__tracks if detect is not None and track_media_type == media_type]
+            if len(tracks) == 0:
+                return 0
+
+        validated_count = 0
+        violations = [] # list of `(event index, schema name, errors)`
+        for index, event in enumerate(generic_request.events):
+            # Event is validated by the first track selecting it
+            event_track = next((candidate for candidate in tracks if candidate[2] is None or candidate[2](event)), None)
+            if event_track is None:
+                continue
+            schema_name, validator, _ = event_track
+            validated_count += 1
+            errors = validator(event) if validator is not None else None
+            if errors is not None:
+                violations.append((index, schema_name, errors))
+
+        with self.__lock:
+            session = self.__sessions.get(generic_request.session_id)
+            if session is None:
+                session = self.__sessions[generic_request.session_id] = SessionViolations()
+            session.events += validated_count
+            session.invalid_events += len(violations)
+            for index, schema_name, errors in violations:
+                for pointer, message in errors:
+                    key = (schema_name, re.sub(r'/\d+(?=/|$)', '/*', pointer), message)
+                    session.counts[key] = session.counts.get(key, 0) + 1
+                    if len(session.samples) < self.MAX_SAMPLES:
+                        session.samples.append({"request_id": generic_request.id, "event_index": index, "schema": schema_name, "path": pointer, "message": message})
+        return len(violations)
+
+    def report(self, session_id=None):
+        """
+        Returns violations of all sessions or only given one.
+        """
+        with self.__lock:
+            if session_id is not None:
+                return {"sessions": {session_id: self.__sessions[session_id].as_json()}}
+            return {"sessions": {session_id: session.as_json() for session_id, session in self.__sessions.items()}}
+
+    def delete_session(self, session_id):
+        with self.__lock:
+            self.__sessions.pop(session_id, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__sessions.clear()
@@ -8,12 +8,15 @@
 
 import socket
 
+# Port the server listens on by default (`0` lets the OS assign free port, see `--instance` in `start_mock_server.py`)
+DEFAULT_PORT = 8000
+
 class ServerAddress():
 	def __init__(self, ip, port):
 		self.ip = ip
 		self.port = port
 
-def get_private_IP():
+def get_private_IP(port=DEFAULT_PORT):
 	"""
 	Returns private IP on the local network or `None` if the local network is not reachable.
     """
@@ -21,26 +24,26 @@ def get_private_IP():
 	s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 	try:
 		s.connect(('10.255.255.255', 1))
-		return ServerAddress(s.getsockname()[0], 8000)
+		return ServerAddress(s.getsockname()[0], port)
 	except:
 		return None
 	finally:
 		s.close()
 
-def get_localhost():
+def get_localhost(port=DEFAULT_PORT):
 	"""
 	Returns localhost address.
     """
 
-	return ServerAddress('127.0.0.1', 8000)
+	return ServerAddress('127.0.0.1', port)
 
-def get_best_server_address():
+def get_best_server_address(port=DEFAULT_PORT):
 	"""
 	Returns private IP if possible, localhost otherwise.
     """
 
-	private_ip = get_private_IP()
-	return private_ip if private_ip is not None else get_localhost()
+	private_ip = get_private_IP(port)
+	return private_ip if private_ip is not None else get_localhost(port)
 
 if __name__ == "__main__":
 	address = get_best_server_address()
@@ -0,0 +1,133 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+from bisect import bisect_left
+import threading
+
+# Upper bounds (in seconds) of histogram buckets. Fixed, so observing a value is one binary search and one increment.
+DURATION_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# Content type of Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class Histogram:
+    """
+    Histogram with fixed buckets. Counts are not cumulative (unlike in Prometheus output).
+    """
+
+    def __init__(self, bounds=DURATION_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # the last bucket is `+Inf`
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_json(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {str(bound): count for bound, count in zip(self.bounds + ['+Inf'], self.counts)},
+        }
+
+class Counter:
+    """
+    Number of requests and their bytes, as received (`raw_bytes`) and after decompression (`bytes`).
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.raw_bytes = 0
+        self.bytes = 0
+
+    def as_json(self):
+        return {"requests": self.requests, "raw_bytes": self.raw_bytes, "bytes": self.bytes}
+
+class ServerMetrics:
+    """
+    Hot-path counters of `HTTPMockServer`: requests and bytes ingested per path and per session, and durations
+    of reading request bodies, decompressing them, decoding and validating payloads and serializing `/inspect` responses.
+    """
+
+    # Durations measured by the server, with their descriptions
+    DURATIONS = {
+        'body_read': 'Time spent reading request bodies (including decompression)',
+        'decompression': 'Time spent decompressing request bodies',
+        'payload_decoding': 'Time spent decoding events from request payloads',
+        'schema_validation': 'Time spent validating decoded events against JSON schemas',
+        'inspect': 'Time spent serializing `/inspect` responses',
+    }
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__paths = {} # path (without session and query) -> `Counter`
+        self.__sessions = {} # session identifier -> `Counter`
+        self.__durations = {name: Histogram() for name in self.DURATIONS}
+
+    def record_request(self, path, session_id, raw_size, size):
+        with self.__lock:
+            for counters, key in [(self.__paths, path), (self.__sessions, session_id)]:
+                counter = counters.get(key)
+                if counter is None:
+                    counter = counters[key] = Counter()
+                counter.requests += 1
+                counter.raw_bytes += raw_size
+                counter.bytes += size
+
+    def delete_session(self, session_id):
+        with self.__lock:
+            self.__sessions.pop(session_id, None)
+
+    def observe(self, duration_name, seconds):
+        with self.__lock:
+            self.__durations[duration_name].observe(seconds)
+
+    def as_json(self, history_stats):
+        """
+        Returns all metrics, including given stats of the requests history, as JSON-serializable dictionary.
+        """
+        with self.__lock:
+            return {
+                "history": {"requests": history_stats["requests"], "bytes": history_stats["bytes"], "sessions": history_stats["sessions"]},
+                "paths": {path: counter.as_json() for path, counter in self.__paths.items()},
+                "sessions": {session_id: counter.as_json() for session_id, counter in self.__sessions.items()},
+                "durations": {name: histogram.as_json() for name, histogram in self.__durations.items()},
+            }
+
+    def as_prometheus(self, history_stats):
+        """
+        Returns all metrics, including given stats of the requests history, in Prometheus text format.
+        """
+        lines = []
+        with self.__lock:
+            for label, counters in [('path', self.__paths), ('session', self.__sessions)]:
+                for metric, attribute, description in [
+                    (f'mock_server_{label}_requests_total', 'requests', f'Number of recorded requests by {label}'),
+                    (f'mock_server_{label}_raw_bytes_total', 'raw_bytes', f'Bytes of request bodies received by {label}'),
+                    (f'mock_server_{label}_bytes_total', 'bytes', f'Bytes of decompressed request bodies by {label}'),
+                ]:
+                    lines += [f'# HELP {metric} {description}', f'# TYPE {metric} counter']
+                    lines += [f'{metric}{{{label}="{_escaped(key)}"}} {getattr(counter, attribute)}' for key, counter in counters.items()]
+
+            for name, histogram in self.__durations.items():
+                metric = f'mock_server_{name}_seconds'
+                lines += [f'# HELP {metric} {self.DURATIONS[name]}', f'# TYPE {metric} histogram']
+                cumulative_count = 0
+                for bound, count in zip(histogram.bounds + ['+Inf'], histogram.counts):
+                    cumulative_count += count
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative_count}')
+                lines += [f'{metric}_sum {histogram.sum}', f'{metric}_count {histogram.count}']
+
+        for key, description in [('requests', 'Number of requests in history'), ('bytes', 'Bytes of requests in history'), ('sessions', 'Number of sessions in history')]:
+            metric = f'mock_server_history_{key}'
+            lines += [f'# HELP {metric} {description}', f'# TYPE {metric} gauge', f'{metric} {history_stats[key]}']
+        return '\n'.join(lines) + '\n'
+
+def _escaped(label_value):
+    return label_value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
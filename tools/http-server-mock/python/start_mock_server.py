@@ -6,161 +6,138 @@
 # Copyright 2019-Present Datadog, Inc.
 # -----------------------------------------------------------
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from server_address import get_localhost, get_best_server_address
-import re
-import json
+from server_address import get_localhost, get_best_server_address, DEFAULT_PORT
+from requests_history import GenericRequestsHistory
+from requests_storage import MemoryStorage, SQLiteStorage
+from mock_server import HTTPMockServer
+from payload_decoders import PayloadDecoders
+from rum_index import RUMEventsIndex
+from capture_file import CaptureFile
+from instance_lock import InstanceLock
+from instance_registry import InstanceRegistry, instance_name
+from response_rules import ResponseSimulator
 import os
-import sys
-import time
-import base64
-import zlib
-
-# If `--prefer-localhost` argument is set, the server will listen on http://127.0.0.1:8000.
-# By default it tries to discover private IP address on local network and uses localhost as fallback.
-prefer_localhost_flag = "--prefer-localhost" in sys.argv
-
-class HTTPMockServer(BaseHTTPRequestHandler):
-    """
-    This server exposes followig endpoints:
-
-    POST /*
-    - Generic endpoint for recording any POST request.
-
-    GET /inspect
-    - Endpoint listing the history of recorded generic requests.
-    """
-
-    def do_POST(self):
-        """
-        Routes all incoming POST requests
-        """
-        self.__route([
-            (r"(.*)$", self.__POST_any),
-        ])
-
-    def do_GET(self):
-        """
-        Routes all incoming GET requests
-        """
-        self.__route([
-            (r"/inspect$", self.__GET_inspect),
-        ])
-
-    def do_DELETE(self):
-        """
-        Routes all incoming DELETE requests
-        """
-        self.__route([
-            (r"/requests$", self.__DELETE_requests),
-        ])
-
-    def __POST_any(self, parameters):
-        """
-        POST /*
-
-        Records generic request sent to this endpoint.
-        """
-        global history
-        request_path = parameters[0]
-        request_body = self.rfile.read(int(self.headers['Content-Length']))
-        request_headers = '\n'.join([ f'{field}: {self.headers[field]}' for field in self.headers ]).encode('utf-8')
-
-        # Decompress 'deflate' encoded body 
-        if 'Content-Encoding' in self.headers and self.headers['Content-Encoding'] == 'deflate':
-            request_body = zlib.decompress(request_body)
-
-        request = GenericRequest("POST", request_path, request_headers, request_body)
-        history.add_request(request)
-        return bytes()
-
-    def __GET_inspect(self, parameters):
-        """
-        GET /inspect
-
-        Returns inspection info on all generic requests.
-        """
-        global history
-        inspection_info = []
-        for request in history.all_requests():
-            inspection_info.append({
-                "method": request.http_method,
-                "path": request.path,
-                "body": base64.b64encode(request.http_body).decode("utf-8") , # use Base64 string to not corrupt the JSON
-                "headers": base64.b64encode(request.http_headers).decode("utf-8") # use Base64 string to not corrupt the JSON
-            })
-
-        return json.dumps(inspection_info).encode("utf-8")
-
-    def __DELETE_requests(self, parameters):
-        """
-        DELETE /requests
-
-        Remove all.
-        """
-        global history
-        history.clear()
-        return bytes()
-
-    def __route(self, routes):
-        try:
-            for url_regexp, method in routes:
-                match = re.match(url_regexp, self.path)
-                if match is not None:
-                    result = method(match.groups())
-                    self.send_response(200) # OK
-                    self.end_headers()
-                    self.wfile.write(result)
-                    return
-        except (IndexError, KeyError) as e:
-            self.send_response(400) # bad request
-            self.end_headers()
-            return
-
-        self.send_response(404) # not found
-        self.end_headers()
-        return
-
-class GenericRequest:
-    """
-    Represents data of request sent to generic endponit.
-    """
-
-    def __init__(self, http_method, path, http_headers, http_body):
-        self.id = None # set later by `GenericRequestsHistory`
-        self.path = path
-        self.http_method = http_method
-        self.http_headers = http_headers
-        self.http_body = http_body
-
-class GenericRequestsHistory:
+import json
+import tempfile
+import argparse
+import importlib
+
+# Engines as `(module, class)`, imported only when used (importing `asyncio` takes longer than starting the server).
+ENGINES = {
+    # `http.server` engine - serves each connection on its own thread.
+    'http.server': ('http_server_engine', 'HTTPServerEngine'),
+    # `asyncio` engine with HTTP/1.1 keep-alive - serves many connections concurrently.
+    'asyncio': ('asyncio_engine', 'AsyncioEngine'),
+}
+
+def engine_class(name):
     """
-    Stores requests sent to generic endpoint.
+    Imports the class of engine with given name.
     """
-
-    __requests = []
-
-    def add_request(self, generic_request):
-        generic_request.id = len(self.__requests)
-        self.__requests.append(generic_request)
-
-    def all_requests(self):
-        return self.__requests
-
-    def request(self, request_id):
-        return self.__requests[int(request_id)]
-
-    def clear(self):
-        self.__requests.clear()
-
-# If any previous instance of this server is running - kill it
-os.system('pkill -f start_mock_server.py')
-time.sleep(1) # wait a bit until socket is eventually released
-
-# Configure the server
-history = GenericRequestsHistory()
-address = get_localhost() if prefer_localhost_flag is True else get_best_server_address()
-httpd = HTTPServer((address.ip, address.port), HTTPMockServer)
-
-print("Starting server on http://{ip}:{port}".format( ip = address.ip, port = address.port))
-httpd.serve_forever()
+    module_name, class_name = ENGINES[name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+# Schemas cloned by `tools/rum-models-generator/run.py`
+DEFAULT_SCHEMAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../rum-models-generator/rum-events-format/schemas')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # If `--prefer-localhost` argument is set, the server will listen on http://127.0.0.1:8000.
+    # By default it tries to discover private IP address on local network and uses localhost as fallback.
+    parser.add_argument("--prefer-localhost", action='store_true', help="Listen on localhost instead of private IP")
+    parser.add_argument("--port", type=int, help=f"Port to listen on (`0` for port assigned by the OS); {DEFAULT_PORT} by default, or `0` with `--instance`")
+    # Instance mode, for running several servers on one host (e.g. one per test shard): the server listens on auto-assigned
+    # port and publishes its URL under given name in the registry (see `instance_registry.py`).
+    parser.add_argument("--instance", metavar="NAME", type=instance_name, help="Run as named instance on auto-assigned port, registered in `instance_registry.py`")
+    parser.add_argument("--engine", choices=ENGINES.keys(), default='http.server', help="The engine serving HTTP connections")
+    parser.add_argument("--max-body-size", type=int, default=HTTPMockServer.DEFAULT_MAX_BODY_SIZE, help="Max size of decompressed request body; bigger requests are rejected with 413")
+    parser.add_argument("--skip-payload-decoding", action='store_true', help="Don't decode events from payloads at ingest (disables `GET /events` and `GET /rum`)")
+    # Storage of recorded requests - in memory by default. With `sqlite`, requests are kept in a database file,
+    # which survives server restarts.
+    parser.add_argument("--storage", choices=['memory', 'sqlite'], default='memory', help="Where to keep recorded requests")
+    parser.add_argument("--storage-path", help="Database file for `sqlite` storage; `mock_server_requests_<port or instance name>.sqlite` in temporary directory by default")
+    # History limits - by default it is unbounded. Evictions can be inspected with `GET /history`.
+    parser.add_argument("--max-history-bytes", type=int, help="Max total size of recorded requests; least recently used sessions are evicted when exceeded")
+    parser.add_argument("--max-session-requests", type=int, help="Max number of requests in one session; oldest requests are evicted when exceeded")
+    parser.add_argument("--session-ttl", type=float, help="Number of seconds after which idle sessions are evicted")
+    # Requests exported with `GET /capture` can be loaded on start, so they are served by `/inspect` as if recorded.
+    parser.add_argument("--load-capture", help="Capture file to load into the history on start")
+    # Response rules simulating intake latency, errors and throttling - can be also set with `PUT /simulation`.
+    parser.add_argument("--response-rules", help="JSON file with response rules (see `response_rules.py`)")
+    # JSON schemas of RUM and Session Replay events - by default, ones cloned by `tools/rum-models-generator/run.py`.
+    parser.add_argument("--validate-schemas", nargs='?', const=DEFAULT_SCHEMAS_DIR, metavar="SCHEMAS_DIR", help="Validate decoded events against JSON schemas from `rum-events-format` (see `GET /validation`)")
+    # Profiling of the server itself - collected profiles are read with `GET /profile/cpu` and `GET /profile/memory`.
+    parser.add_argument("--profile", action='store_true', help="Collect CPU profile and trace memory allocations from the start (see `PUT /profile/cpu` and `PUT /profile/memory`)")
+    # Readiness handshake - once the socket is listening, the server URL is printed to stdout and (optionally)
+    # written to the ready file, so launchers don't need to poll the port.
+    parser.add_argument("--ready-file", help="File to write `{\"url\": ..., \"pid\": ...}` to once the server is ready")
+    args = parser.parse_args()
+    if args.validate_schemas is not None and args.skip_payload_decoding:
+        parser.error("--validate-schemas requires payload decoding")
+
+    # If previous instance of this server is running on the same port (or with the same name) - take it over.
+    # Port assigned by the OS is never held by previous instance, so unnamed servers on port `0` don't lock anything.
+    port = args.port if args.port is not None else (0 if args.instance is not None else DEFAULT_PORT)
+    address = get_localhost(port) if args.prefer_localhost is True else get_best_server_address(port)
+    registry = InstanceRegistry() if args.instance is not None else None
+    if registry is not None:
+        instance_lock = registry.lock(args.instance)
+    else:
+        instance_lock = InstanceLock(address.port) if address.port != 0 else None
+    terminated_pid = instance_lock.acquire() if instance_lock is not None else None
+    if terminated_pid is not None:
+        print("Terminated previous instance (PID {pid})".format(pid = terminated_pid))
+
+    # Configure the server
+    if args.storage == 'sqlite':
+        # Servers running concurrently must not share the database, so the default one is specific to the instance
+        # (or port, so restarted server finds requests recorded by previous run)
+        storage_key = args.instance if args.instance is not None else (address.port if address.port != 0 else f'pid_{os.getpid()}')
+        storage = SQLiteStorage(args.storage_path or os.path.join(tempfile.gettempdir(), f'mock_server_requests_{storage_key}.sqlite'))
+    else:
+        storage = MemoryStorage()
+    history = GenericRequestsHistory(
+        storage=storage,
+        max_bytes=args.max_history_bytes,
+        max_session_requests=args.max_session_requests,
+        session_ttl=args.session_ttl,
+        # With `sqlite` storage, indexed events are read back from the database instead of being kept in memory
+        rum_index=None if args.skip_payload_decoding else RUMEventsIndex(load_events=storage.request_events if args.storage == 'sqlite' else None)
+    )
+    validator = None
+    if args.validate_schemas is not None:
+        from schema_validation import EventsValidator # compiling schemas is only needed with validation
+        validator = EventsValidator.default(args.validate_schemas)
+    server = HTTPMockServer(
+        history,
+        max_body_size=args.max_body_size,
+        payload_decoders=None if args.skip_payload_decoding else PayloadDecoders.default(),
+        response_simulator=ResponseSimulator.from_file(args.response_rules) if args.response_rules is not None else None,
+        events_validator=validator
+    )
+    if args.profile:
+        server.profiler.start_cpu()
+        server.profiler.start_memory()
+    if args.load_capture is not None:
+        # Loaded requests refer to the mapped file instead of copying its data, so it stays open while the server runs
+        capture = CaptureFile(args.load_capture, copy=False)
+        for generic_request in capture:
+            server.record(generic_request)
+        print("Loaded {count} requests from {path}".format(count = len(capture), path = args.load_capture))
+
+    httpd = engine_class(args.engine)((address.ip, address.port), server) # binds with `SO_REUSEADDR` and starts listening
+
+    url = "http://{ip}:{port}".format(ip = address.ip, port = httpd.server_address[1]) # the port assigned by the OS if `0` was requested
+    if args.ready_file is not None:
+        # Write to temporary file and rename it, so the ready file is never observed partially written
+        with open(args.ready_file + '.tmp', 'w') as ready_file:
+            json.dump({"url": url, "pid": os.getpid()}, ready_file)
+        os.replace(args.ready_file + '.tmp', args.ready_file)
+    if registry is not None:
+        registry.publish(args.instance, url)
+    print("Starting server on {url} ({engine})".format(url = url, engine = args.engine), flush=True)
+    try:
+        httpd.serve_forever()
+    finally:
+        if registry is not None:
+            registry.unregister(args.instance)
@@ -0,0 +1,24 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+from contextlib import contextmanager
+import threading
+
+@contextmanager
+def running_server(engine_class, mock_server):
+    """
+    Runs `mock_server` with given engine on an ephemeral localhost port in a background thread.
+    :return: the `(ip, port)` the server listens on
+    """
+    engine = engine_class(('127.0.0.1', 0), mock_server)
+    thread = threading.Thread(target=engine.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield engine.server_address
+    finally:
+        engine.shutdown()
+        engine.server_close()
+        thread.join()
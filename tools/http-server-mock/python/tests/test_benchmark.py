@@ -0,0 +1,25 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import unittest
+from benchmark import run_benchmark, compare
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    def test_it_runs_benchmark(self):
+        results = run_benchmark(engine='asyncio', requests=30, concurrency=3, events_per_batch=5, inspect_every=10)
+        self.assertEqual(30, results['requests'])
+        self.assertGreater(results['throughput'], 0)
+        self.assertLessEqual(results['latency_p50'], results['latency_p99'])
+        self.assertListEqual([10, 20, 30], [sample['requests'] for sample in results['inspect_samples']])
+
+    def test_it_reports_regressions_beyond_tolerance(self):
+        baseline = {'throughput': 1000, 'latency_p50': 0.010, 'latency_p99': 0.020, 'rss_growth': 100, 'inspect_time': 0.5}
+        results = {'throughput': 700, 'latency_p50': 0.011, 'latency_p99': 0.030, 'rss_growth': 50, 'inspect_time': 0.5}
+        regressions = compare(results, baseline, tolerance=0.2)
+        self.assertEqual(2, len(regressions))
+        self.assertTrue(regressions[0].startswith('throughput'))
+        self.assertTrue(regressions[1].startswith('latency_p99'))
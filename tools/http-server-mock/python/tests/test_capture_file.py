@@ -0,0 +1,109 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import os
+import json
+import shutil
+import http.client
+import tempfile
+import unittest
+from generic_request import GenericRequest
+from requests_history import GenericRequestsHistory
+from mock_server import HTTPMockServer
+from payload_decoders import PayloadDecoders
+from http_server_engine import HTTPServerEngine
+from capture_file import CaptureFile, write_capture, CAPTURE_TRAILER
+from replay_capture import replay
+from tests.server_runner import running_server
+
+
+def recorded_requests(count):
+    requests = []
+    for i in range(count):
+        request = GenericRequest('POST', f'/session/{i}', b'Content-Type: text/plain', b'\x00body %d' % i, arrival_time=100.0 + i)
+        request.id = i
+        requests.append(request)
+    return requests
+
+
+class CaptureFileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'capture.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_it_reads_requests_through_index(self):
+        write_capture(self.path, recorded_requests(3))
+
+        with CaptureFile(self.path) as capture:
+            self.assertEqual(3, len(capture))
+            request = capture[2]
+            self.assertEqual((2, '/session/2', b'\x00body 2', 102.0), (request.id, request.path, request.http_body, request.arrival_time))
+            self.assertEqual('text/plain', request.header('content-type'))
+            self.assertListEqual(['/session/0', '/session/1', '/session/2'], [r.path for r in capture])
+
+    def test_it_reads_complete_requests_from_truncated_file(self):
+        write_capture(self.path, recorded_requests(3))
+        with open(self.path, 'r+b') as file:
+            file.truncate(os.path.getsize(self.path) - CAPTURE_TRAILER.size - 3 * 8 - 1) # cut the index and last byte
+
+        with CaptureFile(self.path) as capture:
+            self.assertListEqual(['/session/0', '/session/1'], [r.path for r in capture])
+
+    def test_it_serves_requests_loaded_without_copying(self):
+        requests = recorded_requests(2) + [GenericRequest('POST', '/session/rum', b'Content-Type: text/plain', b'{"type": "view"}', arrival_time=103.0)]
+        write_capture(self.path, requests)
+        server = HTTPMockServer(GenericRequestsHistory(), payload_decoders=PayloadDecoders.default())
+        capture = CaptureFile(self.path, copy=False)
+        for generic_request in capture:
+            server.record(generic_request)
+
+        self.assertIsInstance(server.history.all_requests()[0].http_body, memoryview)
+        with running_server(HTTPServerEngine, server) as (ip, port):
+            def get(path):
+                connection = http.client.HTTPConnection(ip, port)
+                connection.request('GET', path)
+                body = connection.getresponse().read()
+                connection.close()
+                return body
+
+            records = [json.loads(line) for line in get('/inspect?format=ndjson').splitlines()]
+            self.assertListEqual(['\x00body 0', '\x00body 1', '{"type": "view"}'], [r['body'] for r in records])
+            self.assertEqual(3, len(json.loads(get('/inspect'))))
+            self.assertListEqual([{'type': 'view'}], json.loads(get('/events')))
+            with open(os.path.join(self.directory, 'exported.bin'), 'wb') as file:
+                file.write(get('/capture'))
+
+        with CaptureFile(os.path.join(self.directory, 'exported.bin')) as exported:
+            self.assertListEqual([r.http_body for r in requests], [r.http_body for r in exported])
+        server.history.clear()
+        del generic_request
+        capture.close()
+
+    def test_it_exports_and_replays_session(self):
+        source = HTTPMockServer(GenericRequestsHistory())
+        for request in recorded_requests(5) + [GenericRequest('POST', '/other/0', b'', b'')]:
+            source.record(request)
+        target_history = GenericRequestsHistory()
+
+        with running_server(HTTPServerEngine, source) as (ip, port):
+            connection = http.client.HTTPConnection(ip, port)
+            connection.request('GET', '/capture/session')
+            with open(self.path, 'wb') as file:
+                file.write(connection.getresponse().read())
+            connection.close()
+
+        delays = []
+        with running_server(HTTPServerEngine, HTTPMockServer(target_history)) as (ip, port):
+            with CaptureFile(self.path) as capture:
+                self.assertEqual(5, replay(capture, ip, port, speed=2, sleep=delays.append))
+
+        self.assertListEqual([f'/session/{i}' for i in range(5)], [r.path for r in target_history.all_requests()])
+        self.assertEqual(b'\x00body 4', target_history.all_requests()[-1].http_body)
+        self.assertEqual(4, len(delays)) # original 1s intervals at 2x speed, from the first request
+        self.assertAlmostEqual(2.0, delays[-1], delta=0.5)
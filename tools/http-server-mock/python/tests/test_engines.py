@@ -0,0 +1,225 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import gzip
+import json
+import zlib
+import time
+import socket
+import unittest
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from requests_history import GenericRequestsHistory
+from mock_server import HTTPMockServer
+from http_server_engine import HTTPServerEngine
+from asyncio_engine import AsyncioEngine
+from inspection_formats import read_binary_records
+from tests.server_runner import running_server
+
+
+class EnginesTestCase(unittest.TestCase):
+    def check_it_records_and_inspects_requests(self, engine_class):
+        with running_server(engine_class, HTTPMockServer(GenericRequestsHistory())) as (ip, port):
+            connection = http.client.HTTPConnection(ip, port)
+            connection.request('POST', '/session/resource?q=1', body=b'hello', headers={'Header1': 'Value1'})
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual(200, response.status)
+            connection.close()
+
+            connection = http.client.HTTPConnection(ip, port)
+            connection.request('GET', '/inspect')
+            inspection = json.loads(connection.getresponse().read())
+            connection.close()
+
+            self.assertEqual(1, len(inspection))
+            self.assertEqual('POST', inspection[0]['method'])
+            self.assertEqual('/session/resource?q=1', inspection[0]['path'])
+
+    def test_http_server_engine(self):
+        self.check_it_records_and_inspects_requests(HTTPServerEngine)
+
+    def test_asyncio_engine(self):
+        self.check_it_records_and_inspects_requests(AsyncioEngine)
+
+    def test_asyncio_engine_keeps_connection_alive(self):
+        history = GenericRequestsHistory()
+        with running_server(AsyncioEngine, HTTPMockServer(history)) as (ip, port):
+            connection = http.client.HTTPConnection(ip, port)
+            for i in range(10):
+                connection.request('POST', f'/session/{i}', body=b'body')
+                response = connection.getresponse()
+                response.read()
+                self.assertEqual(200, response.status)
+                self.assertFalse(response.will_close)
+            connection.close()
+
+            self.assertEqual(10, len(history.all_requests()))
+
+    def test_asyncio_engine_is_not_blocked_by_slow_upload(self):
+        history = GenericRequestsHistory()
+        with running_server(AsyncioEngine, HTTPMockServer(history)) as (ip, port):
+            # Start an upload which never sends its whole body
+            slow_client = socket.create_connection((ip, port))
+            slow_client.sendall(b'POST /slow HTTP/1.1\r\nHost: x\r\nContent-Length: 1000\r\n\r\npartial')
+
+            def upload(i):
+                connection = http.client.HTTPConnection(ip, port, timeout=5)
+                connection.request('POST', f'/fast/{i}', body=b'body')
+                status = connection.getresponse().status
+                connection.close()
+                return status
+
+            with ThreadPoolExecutor(max_workers=20) as executor:
+                statuses = list(executor.map(upload, range(100)))
+
+            slow_client.close()
+            self.assertEqual([200] * 100, statuses)
+            self.assertEqual(100, len(history.all_requests()))
+
+    def test_asyncio_engine_is_not_blocked_by_inspection(self):
+        class SlowHistory(GenericRequestsHistory):
+            def __init__(self):
+                super().__init__()
+                self.listing = threading.Event()
+                self.listed = threading.Event()
+
+            def requests_since(self, since, limit=None, session_id=None):
+                self.listing.set()
+                self.listed.wait(timeout=5) # e.g. serializing large history
+                return super().requests_since(since, limit=limit, session_id=session_id)
+
+        history = SlowHistory()
+        with running_server(AsyncioEngine, HTTPMockServer(history)) as (ip, port):
+            def inspect():
+                connection = http.client.HTTPConnection(ip, port, timeout=5)
+                connection.request('GET', '/inspect')
+                status = connection.getresponse().status
+                connection.close()
+                return status
+
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                inspection = executor.submit(inspect)
+                self.assertTrue(history.listing.wait(timeout=5))
+                connection = http.client.HTTPConnection(ip, port, timeout=2)
+                connection.request('POST', '/session/1', body=b'body')
+                self.assertEqual(200, connection.getresponse().status)
+                connection.close()
+                history.listed.set()
+                self.assertEqual(200, inspection.result(timeout=5))
+
+    def test_asyncio_engine_releases_waiting_requests_on_close(self):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with running_server(AsyncioEngine, HTTPMockServer(GenericRequestsHistory())) as (ip, port):
+                def wait():
+                    connection = http.client.HTTPConnection(ip, port, timeout=10)
+                    connection.request('GET', '/wait?min_count=1&timeout=300')
+                    connection.getresponse().read()
+                waiting = executor.submit(wait)
+                time.sleep(0.2)
+            start = time.monotonic()
+            self.assertRaises(Exception, lambda: waiting.result(timeout=10)) # connection closed without response
+            while any(thread.name.startswith('AsyncioEngine') for thread in threading.enumerate()) and time.monotonic() - start < 5:
+                time.sleep(0.05)
+            self.assertLess(time.monotonic() - start, 5)
+
+    def test_asyncio_engine_rejects_malformed_request(self):
+        with running_server(AsyncioEngine, HTTPMockServer(GenericRequestsHistory())) as (ip, port):
+            client = socket.create_connection((ip, port))
+            client.sendall(b'garbage\r\n\r\n')
+            self.assertTrue(client.recv(1024).startswith(b'HTTP/1.1 400 Bad Request'))
+            client.close()
+
+    def check_it_records_requests_while_waiting_for_them(self, engine_class):
+        with running_server(engine_class, HTTPMockServer(GenericRequestsHistory())) as (ip, port):
+            def wait():
+                connection = http.client.HTTPConnection(ip, port)
+                connection.request('GET', '/wait?session=session&min_count=2&timeout=5')
+                count = json.loads(connection.getresponse().read())['count']
+                connection.close()
+                return count
+
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                waiting = executor.submit(wait)
+                for i in range(2):
+                    connection = http.client.HTTPConnection(ip, port)
+                    connection.request('POST', f'/session/{i}', body=b'body')
+                    connection.getresponse().read()
+                    connection.close()
+                self.assertEqual(2, waiting.result(timeout=5))
+
+    def test_http_server_engine_wait(self):
+        self.check_it_records_requests_while_waiting_for_them(HTTPServerEngine)
+
+    def test_asyncio_engine_wait(self):
+        self.check_it_records_requests_while_waiting_for_them(AsyncioEngine)
+
+    def check_it_streams_inspection_in_compact_formats(self, engine_class):
+        with running_server(engine_class, HTTPMockServer(GenericRequestsHistory())) as (ip, port):
+            connection = http.client.HTTPConnection(ip, port)
+            for i in range(250):
+                connection.request('POST', f'/session/{i}', body=b'\x00\xff binary')
+                connection.getresponse().read()
+
+            connection.request('GET', '/inspect/session?format=binary', headers={'Accept-Encoding': 'gzip'})
+            response = connection.getresponse()
+            self.assertEqual('chunked', response.getheader('Transfer-Encoding'))
+            self.assertEqual('gzip', response.getheader('Content-Encoding'))
+            self.assertEqual('250', response.getheader('X-Next-Cursor'))
+            records = read_binary_records(gzip.decompress(response.read()))
+            self.assertEqual(250, len(records))
+            metadata = records[-1][0]
+            self.assertEqual({'id': 249, 'method': 'POST', 'path': '/session/249'}, {key: metadata[key] for key in ['id', 'method', 'path']})
+            self.assertIn('arrival_time', metadata)
+            self.assertEqual(b'\x00\xff binary', records[-1][2])
+
+            connection.request('GET', '/inspect?since=248', headers={'Accept': 'application/x-ndjson'})
+            lines = connection.getresponse().read().splitlines()
+            self.assertEqual([248, 249], [json.loads(line)['id'] for line in lines])
+            connection.close()
+
+    def test_http_server_engine_streaming(self):
+        self.check_it_streams_inspection_in_compact_formats(HTTPServerEngine)
+
+    def test_asyncio_engine_streaming(self):
+        self.check_it_streams_inspection_in_compact_formats(AsyncioEngine)
+
+    def check_it_decodes_uploaded_bodies(self, engine_class):
+        body = b'{"event": "value"}\n' * 10000
+        history = GenericRequestsHistory()
+        mock_server = HTTPMockServer(history, max_body_size=len(body))
+        with running_server(engine_class, mock_server) as (ip, port):
+            def post(connection, path, body, headers, encode_chunked=False):
+                connection.request('POST', path, body=body, headers=headers, encode_chunked=encode_chunked)
+                response = connection.getresponse()
+                response.read()
+                return response.status
+
+            def chunks(data, size=1000):
+                for offset in range(0, len(data), size):
+                    yield data[offset:offset + size]
+
+            connection = http.client.HTTPConnection(ip, port)
+            self.assertEqual(200, post(connection, '/session/chunked-gzip', chunks(gzip.compress(body)), {'Content-Encoding': 'gzip'}, encode_chunked=True))
+            self.assertEqual(200, post(connection, '/session/deflate', zlib.compress(body), {'Content-Encoding': 'deflate'}))
+            self.assertEqual(413, post(connection, '/session/too-large', zlib.compress(body + b'x'), {'Content-Encoding': 'deflate'}))
+            connection.close()
+
+            connection = http.client.HTTPConnection(ip, port)
+            self.assertEqual(400, post(connection, '/session/corrupted', b'not deflate', {'Content-Encoding': 'deflate'}))
+            connection.close()
+
+            self.assertEqual([body, body], [r.http_body for r in history.all_requests()])
+            stats = mock_server.metrics.as_json(history.stats())
+            self.assertEqual(2 * len(body), stats['sessions']['session']['bytes'])
+            self.assertEqual(2, stats['durations']['decompression']['count'])
+
+    def test_http_server_engine_body_decoding(self):
+        self.check_it_decodes_uploaded_bodies(HTTPServerEngine)
+
+    def test_asyncio_engine_body_decoding(self):
+        self.check_it_decodes_uploaded_bodies(AsyncioEngine)
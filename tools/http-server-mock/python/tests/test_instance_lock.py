@@ -0,0 +1,61 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+from instance_lock import InstanceLock
+
+# Holds the lock in a separate process until it is terminated
+HOLDER_SCRIPT = '''
+import sys, time
+from instance_lock import InstanceLock
+lock = InstanceLock(8000, directory=sys.argv[1])
+lock.acquire()
+print('locked', flush=True)
+time.sleep(60)
+'''
+
+
+class InstanceLockTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_it_takes_over_stale_lock_file(self):
+        with open(os.path.join(self.directory, 'mock_server_8000.pid'), 'w') as file:
+            file.write('999999999') # left by crashed instance - not locked
+
+        lock = InstanceLock(8000, directory=self.directory)
+        self.assertIsNone(lock.acquire())
+        with open(lock.path) as file:
+            self.assertEqual(str(os.getpid()), file.read())
+        lock.release()
+
+    def test_it_terminates_instance_running_on_the_same_port_only(self):
+        environment = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        holder = subprocess.Popen([sys.executable, '-c', HOLDER_SCRIPT, self.directory], stdout=subprocess.PIPE, env=environment)
+        try:
+            self.assertEqual(b'locked\n', holder.stdout.readline())
+
+            other_port_lock = InstanceLock(8001, directory=self.directory)
+            self.assertIsNone(other_port_lock.acquire())
+            other_port_lock.release()
+            self.assertIsNone(holder.poll())
+
+            lock = InstanceLock(8000, directory=self.directory)
+            self.assertEqual(holder.pid, lock.acquire(takeover_timeout=2))
+            self.assertIsNotNone(holder.wait(timeout=2))
+            lock.release()
+        finally:
+            holder.kill()
+            holder.wait()
+            holder.stdout.close()
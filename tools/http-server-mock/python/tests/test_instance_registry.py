@@ -0,0 +1,80 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import os
+import sys
+import argparse
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+from instance_registry import InstanceRegistry, instance_name
+
+# Registers instance with given name in a separate process and runs until it is terminated
+INSTANCE_SCRIPT = '''
+import sys, time
+from instance_registry import InstanceRegistry
+registry = InstanceRegistry(sys.argv[1])
+lock = registry.lock(sys.argv[2])
+lock.acquire()
+registry.publish(sys.argv[2], 'http://127.0.0.1:' + sys.argv[3])
+print('published', flush=True)
+time.sleep(60)
+'''
+
+
+class InstanceRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.registry = InstanceRegistry(self.directory)
+        self.instances = []
+
+    def tearDown(self):
+        for instance in self.instances:
+            instance.kill()
+            instance.wait()
+            instance.stdout.close()
+        shutil.rmtree(self.directory)
+
+    def start_instance(self, name, port):
+        environment = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        instance = subprocess.Popen([sys.executable, '-c', INSTANCE_SCRIPT, self.directory, name, str(port)], stdout=subprocess.PIPE, env=environment)
+        self.instances.append(instance)
+        self.assertEqual(b'published\n', instance.stdout.readline())
+        return instance
+
+    def test_it_finds_and_stops_instances_by_name(self):
+        shard_1 = self.start_instance('shard-1', 50001)
+        shard_2 = self.start_instance('shard-2', 50002)
+
+        self.assertEqual('http://127.0.0.1:50001', self.registry.lookup('shard-1')['url'])
+        self.assertListEqual([('shard-1', shard_1.pid), ('shard-2', shard_2.pid)], [(e['name'], e['pid']) for e in self.registry.instances()])
+
+        self.assertEqual(shard_1.pid, self.registry.stop('shard-1', timeout=2))
+        self.assertIsNotNone(shard_1.wait(timeout=2))
+        self.assertIsNone(shard_2.poll())
+        self.assertListEqual(['shard-2'], [e['name'] for e in self.registry.instances()])
+        self.assertIsNone(self.registry.stop('shard-1'))
+
+    def test_it_prunes_entries_of_exited_instances(self):
+        with open(os.path.join(self.directory, 'crashed.json'), 'w') as file:
+            json.dump({'name': 'crashed', 'url': 'http://127.0.0.1:50003', 'pid': 999999999}, file) # not locked
+
+        self.assertIsNone(self.registry.lookup('crashed'))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'crashed.json')))
+        self.assertIsNone(self.registry.wait_for('crashed', timeout=0.05))
+
+    def test_it_rejects_instance_names_unsafe_in_file_names(self):
+        self.assertEqual('shard-1.ios_17', instance_name('shard-1.ios_17'))
+        for name in ['', '../shard', 'shard/1', 'shard 1', 'shard\x00']:
+            self.assertRaises(argparse.ArgumentTypeError, lambda: instance_name(name))
+            self.assertRaises(ValueError, lambda: self.registry.lock(name))
+            self.assertRaises(ValueError, lambda: self.registry.lookup(name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,280 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import io
+import json
+import base64
+import os
+import time
+import tempfile
+import unittest
+import threading
+from http.client import parse_headers
+from requests_history import GenericRequestsHistory
+from mock_server import HTTPMockServer, MockRequest
+from payload_decoders import PayloadDecoders
+from rum_index import RUMEventsIndex
+from schema_validation import EventsValidator
+
+
+def mock_request(method, path, body=bytes(), headers=None):
+    raw_headers = ''.join([f'{field}: {value}\r\n' for field, value in (headers or {}).items()]) + '\r\n'
+    return MockRequest(method, path, parse_headers(io.BytesIO(raw_headers.encode('iso-8859-1'))), body)
+
+
+class HTTPMockServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPMockServer(GenericRequestsHistory())
+
+    def inspect(self, path):
+        response = self.server.handle(mock_request('GET', path))
+        self.assertEqual(200, response.status)
+        return json.loads(response.body)
+
+    def test_it_inspects_requests_recorded_in_given_session(self):
+        self.server.handle(mock_request('POST', '/session-a/resource/1', b'a1'))
+        self.server.handle(mock_request('POST', '/session-b/resource/1', b'b1'))
+        self.server.handle(mock_request('POST', '/session-a/resource/2?q=1', b'a2'))
+
+        inspection = self.inspect('/inspect/session-a')
+        self.assertListEqual(['/session-a/resource/1', '/session-a/resource/2?q=1'], [r['path'] for r in inspection])
+        self.assertListEqual([b'a1', b'a2'], [base64.b64decode(r['body']) for r in inspection])
+
+        self.assertEqual(1, len(self.inspect('/inspect/session-b')))
+        self.assertEqual(0, len(self.inspect('/inspect/unknown-session')))
+        self.assertEqual(3, len(self.inspect('/inspect')))
+
+    def test_it_clears_session_index(self):
+        self.server.handle(mock_request('POST', '/session-a/resource/1', b'a1'))
+        self.server.handle(mock_request('DELETE', '/requests'))
+
+        self.assertEqual(0, len(self.inspect('/inspect/session-a')))
+
+    def test_it_inspects_requests_incrementally(self):
+        for i in range(5):
+            self.server.handle(mock_request('POST', f'/session-a/resource/{i}'))
+            self.server.handle(mock_request('POST', f'/session-b/resource/{i}'))
+
+        response = self.server.handle(mock_request('GET', '/inspect/session-a?since=0&limit=2'))
+        self.assertListEqual(['/session-a/resource/0', '/session-a/resource/1'], [r['path'] for r in json.loads(response.body)])
+        cursor = dict(response.headers)['X-Next-Cursor']
+
+        response = self.server.handle(mock_request('GET', f'/inspect/session-a?since={cursor}'))
+        self.assertListEqual([f'/session-a/resource/{i}' for i in range(2, 5)], [r['path'] for r in json.loads(response.body)])
+        cursor = dict(response.headers)['X-Next-Cursor']
+
+        response = self.server.handle(mock_request('GET', f'/inspect/session-a?since={cursor}'))
+        self.assertListEqual([], json.loads(response.body))
+        self.assertEqual(cursor, dict(response.headers)['X-Next-Cursor'])
+
+        self.server.handle(mock_request('POST', '/session-a/resource/5'))
+        response = self.server.handle(mock_request('GET', f'/inspect/session-a?since={cursor}'))
+        self.assertListEqual(['/session-a/resource/5'], [r['path'] for r in json.loads(response.body)])
+
+    def test_cursor_remains_valid_after_clear(self):
+        self.server.handle(mock_request('POST', '/session-a/resource/1'))
+        response = self.server.handle(mock_request('GET', '/inspect'))
+        cursor = dict(response.headers)['X-Next-Cursor']
+
+        self.server.handle(mock_request('DELETE', '/requests'))
+        self.server.handle(mock_request('POST', '/session-a/resource/2'))
+
+        self.assertEqual(['/session-a/resource/2'], [r['path'] for r in self.inspect(f'/inspect?since={cursor}')])
+
+    def test_it_rejects_invalid_cursor(self):
+        self.assertEqual(400, self.server.handle(mock_request('GET', '/inspect?since=abc')).status)
+        self.assertEqual(400, self.server.handle(mock_request('GET', '/inspect?limit=-1')).status)
+
+    def test_it_waits_until_session_holds_given_number_of_requests(self):
+        def send_requests():
+            for i in range(3):
+                time.sleep(0.05)
+                self.server.handle(mock_request('POST', f'/session-a/resource/{i}'))
+        threading.Thread(target=send_requests).start()
+
+        start = time.monotonic()
+        self.assertEqual({'count': 3}, self.inspect('/wait?session=session-a&min_count=3&timeout=5'))
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_it_stops_waiting_after_timeout(self):
+        self.server.handle(mock_request('POST', '/session-b/resource/1'))
+        self.assertEqual({'count': 0}, self.inspect('/wait?session=session-a&min_count=1&timeout=0.1'))
+        self.assertEqual({'count': 1}, self.inspect('/wait?min_count=1&timeout=0.1'))
+
+    def test_it_encodes_inspection_as_ndjson(self):
+        self.server.handle(mock_request('POST', '/session-a/text', '{"event": 1}'.encode('utf-8')))
+        self.server.handle(mock_request('POST', '/session-a/binary', b'\xff\xfe'))
+
+        response = self.server.handle(mock_request('GET', '/inspect/session-a?format=ndjson'))
+        self.assertTrue(response.is_streamed)
+        self.assertIn(('Content-Type', 'application/x-ndjson'), response.headers)
+        records = [json.loads(line) for line in b''.join(response.body).splitlines()]
+        self.assertEqual(('{"event": 1}', 'utf-8'), (records[0]['body'], records[0]['encoding']))
+        self.assertEqual((base64.b64encode(b'\xff\xfe').decode('utf-8'), 'base64'), (records[1]['body'], records[1]['encoding']))
+
+    def test_it_rejects_unknown_inspection_format(self):
+        self.assertEqual(400, self.server.handle(mock_request('GET', '/inspect?format=xml')).status)
+
+    def test_it_returns_events_decoded_at_ingest(self):
+        server = HTTPMockServer(GenericRequestsHistory(), payload_decoders=PayloadDecoders.default())
+        server.handle(mock_request('POST', '/session-a/rum', b'{"type": "view"}\n{"type": "action"}', {'Content-Type': 'text/plain;charset=UTF-8'}))
+        server.handle(mock_request('POST', '/session-b/logs', b'[{"message": "log"}]', {'Content-Type': 'application/json'}))
+        server.handle(mock_request('POST', '/session-a/unknown', b'\x00', {'Content-Type': 'application/octet-stream'}))
+
+        response = server.handle(mock_request('GET', '/events/session-a'))
+        self.assertListEqual([{'type': 'view'}, {'type': 'action'}], json.loads(response.body))
+        self.assertEqual('3', dict(response.headers)['X-Next-Cursor'])
+
+        response = server.handle(mock_request('GET', '/events?since=1'))
+        self.assertListEqual([{'message': 'log'}], json.loads(response.body))
+
+    def test_it_queries_indexed_rum_events(self):
+        server = HTTPMockServer(GenericRequestsHistory(rum_index=RUMEventsIndex()), payload_decoders=PayloadDecoders.default())
+        events = [
+            {'type': 'view', 'date': 0, 'session': {'id': 's'}, 'view': {'id': 'v'}, '_dd': {'document_version': 1}},
+            {'type': 'resource', 'date': 1, 'session': {'id': 's'}, 'view': {'id': 'v'}},
+            {'type': 'view', 'date': 0, 'session': {'id': 's'}, 'view': {'id': 'v'}, '_dd': {'document_version': 2}},
+        ]
+        body = '\n'.join([json.dumps(e) for e in events]).encode('utf-8')
+        server.handle(mock_request('POST', '/session/api/v2/rum', body, {'Content-Type': 'text/plain;charset=UTF-8'}))
+
+        response = server.handle(mock_request('GET', '/rum?view_id=v'))
+        self.assertListEqual([events[2], events[1]], json.loads(response.body))
+        response = server.handle(mock_request('GET', '/rum?type=view&all_view_updates=1'))
+        self.assertEqual(2, len(json.loads(response.body)))
+        self.assertEqual(404, HTTPMockServer(GenericRequestsHistory()).handle(mock_request('GET', '/rum')).status)
+
+    def test_it_returns_runtime_metrics(self):
+        self.server.handle(mock_request('POST', '/session/api/v2/rum', b'body'))
+        self.server.handle(mock_request('GET', '/inspect'))
+
+        stats = json.loads(self.server.handle(mock_request('GET', '/stats')).body)
+        self.assertEqual(1, stats['paths']['/api/v2/rum']['requests'])
+        self.assertEqual(1, stats['durations']['inspect']['count'])
+        self.assertEqual(1, stats['history']['requests'])
+
+        response = self.server.handle(mock_request('GET', '/stats?format=prometheus'))
+        self.assertIn('text/plain', dict(response.headers)['Content-Type'])
+        self.assertIn(b'mock_server_session_requests_total{session="session"} 1\n', response.body)
+
+    def test_it_returns_upload_analytics(self):
+        self.server.handle(mock_request('POST', '/session/api/v2/rum', b'batch'))
+        self.server.handle(mock_request('POST', '/session/api/v2/rum', b'batch'))
+
+        report = json.loads(self.server.handle(mock_request('GET', '/analytics/session')).body)
+        self.assertEqual(2, report['sessions']['session']['tracks']['/api/v2/rum']['uploads'])
+        self.assertEqual(1, report['tracks']['/api/v2/rum']['duplicates'])
+        self.assertEqual(404, self.server.handle(mock_request('GET', '/analytics/unknown')).status)
+
+    def test_it_drops_state_of_evicted_sessions(self):
+        server = HTTPMockServer(GenericRequestsHistory(max_bytes=100))
+        server.handle(mock_request('POST', '/session-a/api/v2/rum', b'a' * 60))
+        server.handle(mock_request('POST', '/session-b/api/v2/rum', b'b' * 60)) # evicts `session-a`
+        server.handle(mock_request('POST', '/session-c/api/v2/rum', b'c' * 200)) # evicts `session-b` and itself
+
+        self.assertEqual(404, server.handle(mock_request('GET', '/analytics/session-a')).status)
+        self.assertListEqual([], list(json.loads(server.handle(mock_request('GET', '/analytics')).body)['sessions']))
+        self.assertListEqual([], list(json.loads(server.handle(mock_request('GET', '/stats')).body)['sessions']))
+
+    def test_it_returns_schema_violations(self):
+        with tempfile.TemporaryDirectory() as directory:
+            schema_path = os.path.join(directory, 'schema.json')
+            with open(schema_path, 'w') as file:
+                json.dump({'type': 'object', 'required': ['type']}, file)
+            validator = EventsValidator()
+            validator.register(r'/rum$', schema_path)
+        server = HTTPMockServer(GenericRequestsHistory(), payload_decoders=PayloadDecoders.default(), events_validator=validator)
+        server.handle(mock_request('POST', '/session/rum', b'{"type": "view"}\n{"date": 1}', {'Content-Type': 'text/plain'}))
+
+        report = json.loads(server.handle(mock_request('GET', '/validation/session')).body)
+        self.assertEqual(1, report['sessions']['session']['invalid_events'])
+        self.assertEqual(1, json.loads(server.handle(mock_request('GET', '/stats')).body)['durations']['schema_validation']['count'])
+        server.handle(mock_request('DELETE', '/requests'))
+        self.assertDictEqual({'sessions': {}}, json.loads(server.handle(mock_request('GET', '/validation')).body))
+        self.assertEqual(404, server.handle(mock_request('GET', '/validation/session')).status)
+        self.assertEqual(404, self.server.handle(mock_request('GET', '/validation')).status)
+
+    def test_it_validates_events_recorded_by_server_session(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ['rum-events-mobile-schema.json', 'session-replay-mobile-schema.json']:
+                with open(os.path.join(directory, name), 'w') as file:
+                    json.dump({'type': 'object', 'required': ['date']}, file)
+            validator = EventsValidator.default(directory)
+        server = HTTPMockServer(GenericRequestsHistory(), payload_decoders=PayloadDecoders.default(), events_validator=validator)
+        # `ServerSession` is set as custom RUM endpoint, so uploads are sent to its recording URL as they are
+        rum = b'{"type": "view", "date": 1, "application": {}, "session": {}}\n{"type": "action", "application": {}, "session": {}}'
+        server.handle(mock_request('POST', '/3f0c8d6e-session', rum, {'Content-Type': 'text/plain;charset=UTF-8'}))
+
+        report = json.loads(server.handle(mock_request('GET', '/validation/3f0c8d6e-session')).body)['sessions']['3f0c8d6e-session']
+        self.assertEqual((2, 1), (report['events'], report['invalid_events']))
+        self.assertEqual('rum-events-mobile-schema.json', report['samples'][0]['schema'])
+
+    def test_it_returns_not_modified_inspection_until_history_changes(self):
+        self.server.handle(mock_request('POST', '/session/1', b'body'))
+        response = self.server.handle(mock_request('GET', '/inspect'))
+        etag = dict(response.headers)['ETag']
+
+        cached = self.server.handle(mock_request('GET', '/inspect', headers={'If-None-Match': etag}))
+        self.assertEqual(304, cached.status)
+
+        self.server.handle(mock_request('POST', '/session/2', b'body'))
+        response = self.server.handle(mock_request('GET', '/inspect', headers={'If-None-Match': etag}))
+        self.assertEqual(200, response.status)
+        self.assertEqual(2, len(json.loads(response.body)))
+        self.assertNotEqual(etag, dict(response.headers)['ETag'])
+
+        etag = dict(response.headers)['ETag']
+        self.server.handle(mock_request('DELETE', '/requests'))
+        self.assertEqual(200, self.server.handle(mock_request('GET', '/inspect', headers={'If-None-Match': etag})).status)
+
+    def test_it_varies_inspection_etag_with_representation_and_server(self):
+        self.server.handle(mock_request('POST', '/session/1', b'body'))
+        responses = [
+            self.server.handle(mock_request('GET', '/inspect')),
+            self.server.handle(mock_request('GET', '/inspect?format=ndjson')),
+            self.server.handle(mock_request('GET', '/inspect', headers={'Accept': 'application/x-ndjson', 'Accept-Encoding': 'gzip'})),
+            self.server.handle(mock_request('GET', '/inspect?limit=1')),
+            HTTPMockServer(self.server.history).handle(mock_request('GET', '/inspect')), # e.g. restarted with the same SQLite file
+        ]
+        etags = [dict(response.headers)['ETag'] for response in responses]
+        self.assertEqual(len(etags), len(set(etags)))
+        self.assertEqual('Accept, Accept-Encoding', dict(responses[0].headers)['Vary'])
+
+        ndjson = self.server.handle(mock_request('GET', '/inspect?format=ndjson', headers={'If-None-Match': etags[0]}))
+        self.assertEqual(200, ndjson.status)
+        cached = self.server.handle(mock_request('GET', '/inspect?format=ndjson', headers={'If-None-Match': etags[1]}))
+        self.assertEqual(304, cached.status)
+        self.assertEqual('Accept, Accept-Encoding', dict(cached.headers)['Vary'])
+
+    def test_it_caches_encodings_of_identical_bodies_once(self):
+        self.server.handle(mock_request('POST', '/session/1', b'body'))
+        self.server.handle(mock_request('POST', '/session/2', b'body'))
+        first = self.server.handle(mock_request('GET', '/inspect')).body
+        self.assertEqual([{'method': 'POST', 'path': '/session/1', 'body': 'Ym9keQ==', 'headers': ''}], json.loads(first)[:1])
+
+        request_1, request_2 = self.server.history.all_requests()
+        self.assertIs(request_1.blob_encodings['http_body'], request_2.blob_encodings['http_body'])
+        self.assertEqual(8, self.server.history.stats()['blobs']['encoded_bytes']) # Base64 of body, empty headers
+
+        request_1.blob_encodings['http_body']['base64'] = b'Y2FjaGVk'
+        self.assertEqual(['Y2FjaGVk', 'Y2FjaGVk'], [r['body'] for r in json.loads(self.server.handle(mock_request('GET', '/inspect')).body)])
+
+        self.server.handle(mock_request('DELETE', '/requests'))
+        self.assertEqual(0, self.server.history.stats()['blobs']['encoded_bytes'])
+
+    def test_it_manages_session_lifecycle(self):
+        self.assertEqual(200, self.server.handle(mock_request('PUT', '/sessions/a')).status)
+        self.server.handle(mock_request('POST', '/a/1', b'body'))
+        self.server.handle(mock_request('POST', '/b/1', b'body'))
+        sessions = json.loads(self.server.handle(mock_request('GET', '/sessions')).body)
+        self.assertListEqual([('a', 1, True), ('b', 1, False)], [(s['session'], s['requests'], s['open']) for s in sessions])
+
+        self.server.handle(mock_request('DELETE', '/requests/b'))
+        self.server.handle(mock_request('DELETE', '/sessions/a'))
+        self.server.handle(mock_request('POST', '/a/2', b'body'))
+        self.assertListEqual([], json.loads(self.server.handle(mock_request('GET', '/sessions')).body))
+        self.assertListEqual([], json.loads(self.server.handle(mock_request('GET', '/inspect')).body))
+        self.assertEqual({}, json.loads(self.server.handle(mock_request('GET', '/analytics')).body)['sessions'])
@@ -0,0 +1,80 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import asyncio
+import unittest
+import threading
+import http.client
+from requests_history import GenericRequestsHistory
+from mock_server import HTTPMockServer
+from mock_server_client import ServerMock, AsyncServerMock, NDJSONDecoder, ServerError
+from http_server_engine import HTTPServerEngine
+from asyncio_engine import AsyncioEngine
+from tests.server_runner import running_server
+
+
+def send(ip, port, path, body):
+    connection = http.client.HTTPConnection(ip, port)
+    connection.request('POST', path, body=body, headers={'Content-Type': 'application/octet-stream'})
+    connection.getresponse().read()
+    connection.close()
+
+
+class MockServerClientTestCase(unittest.TestCase):
+    def test_it_decodes_ndjson_incrementally(self):
+        decoder = NDJSONDecoder()
+        self.assertListEqual([], decoder.feed(b'{"a": '))
+        self.assertListEqual([{'a': 1}], decoder.feed(b'1}\n{"b"'))
+        self.assertListEqual([{'b': 2}, {'c': 3}], decoder.feed(b': 2}\n{"c": 3}\n'))
+
+    def check_it_records_and_pulls_requests_over_kept_alive_connection(self, engine_class):
+        with running_server(engine_class, HTTPMockServer(GenericRequestsHistory())) as (ip, port):
+            server = ServerMock(f'http://{ip}:{port}', pool_size=1)
+            session = server.obtain_unique_recording_session()
+            other_session = server.obtain_unique_recording_session()
+            send(ip, port, f'/{session.session_id}/1?q=a', b'first')
+            send(ip, port, f'/{other_session.session_id}/1', b'other')
+
+            threading.Timer(0.2, lambda: send(ip, port, f'/{session.session_id}/2', b'\xff\x00')).start()
+            requests = session.pull_recorded_requests(timeout=10, until=lambda requests: len(requests) >= 2)
+            self.assertListEqual([f'/{session.session_id}/1', f'/{session.session_id}/2'], [r.path for r in requests])
+            self.assertListEqual([b'first', b'\xff\x00'], [r.http_body for r in requests])
+            self.assertDictEqual({'q': ['a']}, requests[0].query_items)
+            self.assertEqual('application/octet-stream', requests[0].http_headers['Content-Type'])
+            self.assertRaises(TimeoutError, lambda: session.pull_recorded_requests(timeout=0.1, until=lambda requests: len(requests) > 2))
+
+            session.close()
+            self.assertListEqual([], session.get_recorded_requests())
+            self.assertEqual(1, len(server.get_recorded_requests()))
+            server.clear_all_requests()
+            self.assertListEqual([], server.get_recorded_requests())
+            self.assertRaises(ServerError, lambda: server.wait_for_recorded_requests('s', min_count='x', timeout=1))
+            server.close()
+
+    def test_it_records_and_pulls_requests_with_http_server_engine(self):
+        self.check_it_records_and_pulls_requests_over_kept_alive_connection(HTTPServerEngine)
+
+    def test_it_records_and_pulls_requests_with_asyncio_engine(self):
+        self.check_it_records_and_pulls_requests_over_kept_alive_connection(AsyncioEngine)
+
+    def test_it_pulls_requests_with_asyncio_client(self):
+        with running_server(AsyncioEngine, HTTPMockServer(GenericRequestsHistory())) as (ip, port):
+            async def pull():
+                server = AsyncServerMock(f'http://{ip}:{port}', pool_size=1)
+                session = server.obtain_unique_recording_session()
+                send(ip, port, f'/{session.session_id}/1', b'first')
+                threading.Timer(0.2, lambda: send(ip, port, f'/{session.session_id}/2', b'second')).start()
+                requests = await session.pull_recorded_requests(timeout=10, until=lambda requests: len(requests) >= 2)
+                self.assertListEqual([b'first', b'second'], [r.http_body for r in requests])
+
+                await session.close()
+                self.assertListEqual([], await server.get_recorded_requests())
+                server.close()
+            asyncio.run(pull())
+
+
+if __name__ == '__main__':
+    unittest.main()
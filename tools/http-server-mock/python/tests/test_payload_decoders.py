@@ -0,0 +1,86 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import json
+import zlib
+import unittest
+from generic_request import GenericRequest
+from payload_decoders import PayloadDecoders
+
+BOUNDARY = '00000000-0000-0000-0000-000000000000'
+
+
+def multipart_body(parts):
+    """
+    Builds `multipart/form-data` body the same way as SDK's `MultipartFormData`.
+    """
+    body = b''
+    for name, filename, mime_type, data in parts:
+        body += f'--{BOUNDARY}\r\n'.encode('utf-8')
+        body += f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'.encode('utf-8')
+        body += f'Content-Type: {mime_type}\r\n\r\n'.encode('utf-8')
+        body += data + b'\r\n'
+    return body + f'--{BOUNDARY}--'.encode('utf-8')
+
+
+def decoded(path, content_type, body, max_size=None):
+    generic_request = GenericRequest('POST', path, b'', body)
+    PayloadDecoders.default().decode(generic_request, path, content_type, max_size)
+    return generic_request
+
+
+class PayloadDecodersTestCase(unittest.TestCase):
+    def test_it_decodes_ndjson(self):
+        request = decoded('/session', 'text/plain;charset=UTF-8', b'{"type": "view"}\n{"type": "action"}')
+        self.assertListEqual([{'type': 'view'}, {'type': 'action'}], request.events)
+
+    def test_it_decodes_json_array(self):
+        request = decoded('/session', 'application/json', b'[{"message": "a"}, {"message": "b"}]')
+        self.assertListEqual([{'message': 'a'}, {'message': 'b'}], request.events)
+
+    def test_it_decodes_session_replay_multipart(self):
+        segments = [{'records': [i], 'view': {'id': str(i)}} for i in range(2)]
+        body = multipart_body(
+            [('segment', f'file{i}', 'application/octet-stream', zlib.compress(json.dumps(s).encode('utf-8') + b'\n')) for i, s in enumerate(segments)] +
+            [('image', 'abc', 'image/png', b'\x89PNG\r\n\x1a\n\r\n'), ('event', 'blob', 'application/json', b'[{"metadata": 1}]')]
+        )
+        request = decoded('/session', f'multipart/form-data; boundary={BOUNDARY}', body)
+        self.assertListEqual(segments + [{'metadata': 1}], request.events)
+        # Decompressed segments count towards the size of request in the history
+        decoded_size = sum([len(json.dumps(s)) + 1 for s in segments]) + len(b'[{"metadata": 1}]')
+        self.assertEqual(decoded_size, request.events_size)
+        self.assertEqual(len('/session') + len(body) + decoded_size, request.size)
+
+    def test_it_does_not_decompress_segments_beyond_max_size(self):
+        segment = json.dumps({'records': ['x' * 1000]}).encode('utf-8')
+        body = multipart_body([('segment', f'file{i}', 'application/octet-stream', zlib.compress(segment)) for i in range(2)])
+        content_type = f'multipart/form-data; boundary={BOUNDARY}'
+
+        self.assertEqual(2, len(decoded('/session', content_type, body, max_size=2 * len(segment)).events))
+        request = decoded('/session', content_type, body, max_size=2 * len(segment) - 1)
+        self.assertIsNone(request.events)
+        self.assertIn('exceeds', request.decoding_error)
+        bomb = multipart_body([('segment', 'file', 'application/octet-stream', zlib.compress(b' ' * 10_000_000))])
+        self.assertIsNotNone(decoded('/session', content_type, bomb, max_size=1024).decoding_error)
+
+    def test_it_decodes_bodies_of_any_bytes_like_type(self):
+        body = b'{"type": "view"}\n{"type": "action"}'
+        for http_body in [body, bytearray(body), memoryview(body)]:
+            self.assertEqual(2, len(decoded('/session', 'text/plain', http_body).events))
+
+    def test_it_chooses_decoder_by_path_before_content_type(self):
+        request = decoded('/session/api/v2/rum', 'application/json', b'{"type": "view"}\n{"type": "action"}')
+        self.assertEqual(2, len(request.events))
+
+    def test_it_records_decoding_error(self):
+        request = decoded('/session', 'application/json', b'{not json')
+        self.assertIsNone(request.events)
+        self.assertIsNotNone(request.decoding_error)
+
+    def test_it_skips_unknown_payloads(self):
+        request = decoded('/session', 'application/octet-stream', b'\x00')
+        self.assertIsNone(request.events)
+        self.assertIsNone(request.decoding_error)
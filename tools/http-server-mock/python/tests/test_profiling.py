@@ -0,0 +1,96 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import os
+import pstats
+import tempfile
+import unittest
+import tracemalloc
+import http.client
+from requests_history import GenericRequestsHistory
+from mock_server import HTTPMockServer
+from http_server_engine import HTTPServerEngine
+from tests.server_runner import running_server
+from tests.test_mock_server import mock_request
+
+
+class ServerProfilingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPMockServer(GenericRequestsHistory())
+
+    def tearDown(self):
+        self.server.handle(mock_request('DELETE', '/profile/cpu'))
+        self.server.handle(mock_request('DELETE', '/profile/memory'))
+
+    def test_it_collects_cpu_profile_in_pstats_format(self):
+        self.assertEqual(200, self.server.handle(mock_request('PUT', '/profile/cpu')).status)
+        self.server.handle(mock_request('POST', '/session/1', b'body'))
+        self.assertEqual(409, self.server.handle(mock_request('GET', '/profile/cpu')).status) # still collected
+        self.server.handle(mock_request('DELETE', '/profile/cpu'))
+
+        response = self.server.handle(mock_request('GET', '/profile/cpu'))
+        self.assertEqual(200, response.status)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'server.pstats')
+            with open(path, 'wb') as file:
+                file.write(response.body)
+            functions = [function_name for (_, _, function_name) in pstats.Stats(path).stats]
+        self.assertIn('add_request', functions)
+
+        report = self.server.handle(mock_request('GET', '/profile/cpu?format=text&sort=tottime&limit=5')).body.decode('utf-8')
+        self.assertIn('function calls', report)
+
+    def test_it_merges_cpu_profiles_of_server_threads(self):
+        with running_server(HTTPServerEngine, self.server) as (ip, port):
+            def send(method, path):
+                connection = http.client.HTTPConnection(ip, port)
+                connection.request(method, path, body=b'body')
+                response = connection.getresponse()
+                body = response.read()
+                connection.close()
+                return response.status, body
+
+            send('PUT', '/profile/cpu')
+            for i in range(3):
+                send('POST', f'/session/{i}')
+            send('DELETE', '/profile/cpu')
+            status, body = send('GET', '/profile/cpu?format=text')
+        self.assertEqual(200, status)
+        self.assertIn('__POST_any', body.decode('utf-8'))
+
+    def test_it_runs_memory_profiling_off_engine_loop(self):
+        for method, path in [('PUT', '/profile/memory'), ('DELETE', '/profile/memory'), ('PUT', '/profile/memory/snapshots/a'), ('GET', '/profile/memory/snapshots/a')]:
+            self.assertTrue(self.server.may_block(mock_request(method, path)), f'{method} {path}')
+        self.assertFalse(self.server.may_block(mock_request('PUT', '/profile/cpu')))
+
+    def test_it_takes_and_compares_memory_snapshots(self):
+        self.assertEqual(409, self.server.handle(mock_request('PUT', '/profile/memory/snapshots/before')).status) # not traced
+        self.server.handle(mock_request('PUT', '/profile/memory?frames=5'))
+        self.server.handle(mock_request('PUT', '/profile/memory/snapshots/before'))
+        for i in range(100):
+            self.server.handle(mock_request('POST', f'/session/{i}', b'x' * 1024 + bytes([i])))
+        self.server.handle(mock_request('PUT', '/profile/memory/snapshots/after'))
+
+        diff = self.server.handle(mock_request('GET', '/profile/memory?from=before&to=after&limit=5')).body.decode('utf-8')
+        self.assertIn('Traced memory', diff)
+        self.assertRegex(diff, r'size=[^,]*\(\+[1-9]') # positive size delta (reported file names differ between Python versions)
+
+        response = self.server.handle(mock_request('GET', '/profile/memory/snapshots/after'))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'after.snapshot')
+            with open(path, 'wb') as file:
+                file.write(response.body)
+            snapshot = tracemalloc.Snapshot.load(path)
+        self.assertEqual(5, snapshot.traceback_limit)
+
+        self.assertEqual(404, self.server.handle(mock_request('GET', '/profile/memory/snapshots/unknown')).status)
+        self.assertEqual(400, self.server.handle(mock_request('GET', '/profile/memory?from=unknown')).status)
+        self.server.handle(mock_request('DELETE', '/profile/memory'))
+        self.assertEqual(409, self.server.handle(mock_request('GET', '/profile/memory')).status)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import gzip
+import zlib
+import unittest
+from request_body import RequestBodyDecoder, BodyTooLargeError
+
+
+def feed_in_chunks(decoder, data, chunk_size=7):
+    for offset in range(0, len(data), chunk_size):
+        decoder.feed(memoryview(data)[offset:offset + chunk_size])
+    return decoder.finish()
+
+
+class RequestBodyDecoderTestCase(unittest.TestCase):
+    body = b'{"event": "value"}\n' * 100
+
+    def test_it_decompresses_deflate_body(self):
+        decoder = RequestBodyDecoder('deflate')
+        self.assertEqual(self.body, feed_in_chunks(decoder, zlib.compress(self.body)))
+        self.assertEqual(len(zlib.compress(self.body)), decoder.raw_size)
+
+    def test_it_decompresses_gzip_body(self):
+        self.assertEqual(self.body, feed_in_chunks(RequestBodyDecoder('gzip'), gzip.compress(self.body)))
+
+    def test_it_keeps_body_with_other_encoding(self):
+        self.assertEqual(self.body, feed_in_chunks(RequestBodyDecoder(None, expected_size=len(self.body)), self.body))
+        self.assertEqual(self.body, feed_in_chunks(RequestBodyDecoder('br'), self.body))
+
+    def test_it_rejects_body_exceeding_max_size(self):
+        with self.assertRaises(BodyTooLargeError):
+            feed_in_chunks(RequestBodyDecoder('deflate', max_size=1000), zlib.compress(self.body))
+        with self.assertRaises(BodyTooLargeError):
+            feed_in_chunks(RequestBodyDecoder(None, max_size=1000, expected_size=len(self.body)), self.body)
+        self.assertEqual(self.body, feed_in_chunks(RequestBodyDecoder('gzip', max_size=len(self.body)), gzip.compress(self.body)))
+
+    def test_it_rejects_truncated_body(self):
+        with self.assertRaises(zlib.error):
+            feed_in_chunks(RequestBodyDecoder('deflate'), zlib.compress(self.body)[:-10])
@@ -0,0 +1,97 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import unittest
+from generic_request import GenericRequest
+from requests_history import GenericRequestsHistory
+
+
+def generic_request(path, body=b''):
+    return GenericRequest("POST", path, b'', body)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class GenericRequestsHistoryTestCase(unittest.TestCase):
+    def test_it_evicts_least_recently_used_sessions_when_exceeding_max_bytes(self):
+        history = GenericRequestsHistory(max_bytes=90)
+        history.add_request(generic_request('/a', b'x' * 30)) # 32 bytes
+        history.add_request(generic_request('/b', b'x' * 30))
+        history.session_requests('a') # `a` becomes more recently used than `b`
+        history.add_request(generic_request('/c', b'x' * 30))
+
+        self.assertListEqual(['/a', '/c'], [r.path for r in history.all_requests()])
+        stats = history.stats()
+        self.assertEqual(64, stats['bytes'])
+        self.assertDictEqual({'sessions': 1, 'requests': 1, 'bytes': 32}, stats['evictions'])
+
+    def test_it_evicts_oldest_requests_when_exceeding_max_session_requests(self):
+        history = GenericRequestsHistory(max_session_requests=2)
+        for i in range(4):
+            history.add_request(generic_request(f'/a/{i}'))
+        history.add_request(generic_request('/b/0'))
+
+        self.assertListEqual(['/a/2', '/a/3'], [r.path for r in history.session_requests('a')])
+        self.assertListEqual(['/a/2', '/a/3', '/b/0'], [r.path for r in history.all_requests()])
+        self.assertEqual(2, history.stats()['evictions']['requests'])
+
+    def test_it_evicts_idle_sessions(self):
+        clock = FakeClock()
+        history = GenericRequestsHistory(session_ttl=10, clock=clock)
+        deleted_session_ids = []
+        history.session_deleted_listeners.append(deleted_session_ids.append)
+        history.add_request(generic_request('/a/0'))
+        clock.now = 5
+        history.add_request(generic_request('/b/0'))
+        clock.now = 12
+        history.add_request(generic_request('/c/0'))
+
+        self.assertListEqual(['/b/0', '/c/0'], [r.path for r in history.all_requests()])
+        clock.now = 16
+        self.assertEqual(1, history.stats()['sessions'])
+        self.assertEqual(2, history.stats()['evictions']['sessions'])
+        self.assertListEqual(['a', 'b'], deleted_session_ids)
+
+    def test_it_returns_requests_of_all_sessions_in_order(self):
+        history = GenericRequestsHistory()
+        for path in ['/a/0', '/b/0', '/a/1', '/c/0', '/b/1']:
+            history.add_request(generic_request(path))
+
+        page, cursor = history.requests_since(1, limit=3)
+        self.assertListEqual(['/b/0', '/a/1', '/c/0'], [r.path for r in page])
+        self.assertEqual(4, cursor)
+        self.assertEqual('/b/1', history.request(4).path)
+
+    def test_it_deletes_requests_of_one_session(self):
+        history = GenericRequestsHistory()
+        history.add_request(generic_request('/a/0', b'x' * 10))
+        history.add_request(generic_request('/b/0', b'x' * 10))
+        history.delete_session_requests('a')
+
+        self.assertListEqual(['/b/0'], [r.path for r in history.all_requests()])
+        self.assertListEqual([{'session': 'b', 'requests': 1, 'bytes': 14, 'open': False}], history.sessions())
+        self.assertEqual(0, history.stats()['evictions']['sessions'])
+        self.assertTrue(history.add_request(generic_request('/a/1')))
+
+    def test_it_opens_and_closes_sessions(self):
+        history = GenericRequestsHistory()
+        history.open_session('a')
+        self.assertListEqual([{'session': 'a', 'requests': 0, 'bytes': 0, 'open': True}], history.sessions())
+
+        history.add_request(generic_request('/a/0', b'x' * 10))
+        history.close_session('a')
+        self.assertFalse(history.add_request(generic_request('/a/1'))) # e.g. retried upload
+        self.assertListEqual([], history.all_requests())
+        self.assertEqual(0, history.stats()['bytes'])
+
+        history.open_session('a')
+        self.assertTrue(history.add_request(generic_request('/a/2')))
@@ -0,0 +1,125 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import os
+import unittest
+from tempfile import TemporaryDirectory
+from generic_request import GenericRequest
+from requests_history import GenericRequestsHistory
+from requests_storage import MemoryStorage, SQLiteStorage
+from rum_index import RUMEventsIndex
+
+
+def generic_request(path, body=b''):
+    return GenericRequest("POST", path, b'Header: value', body)
+
+
+class StorageTestCase:
+    """
+    Tests common to all storage backends.
+    """
+
+    def make_storage(self):
+        raise NotImplementedError()
+
+    def setUp(self):
+        self.storage = self.make_storage()
+        self.history = GenericRequestsHistory(storage=self.storage)
+
+    def tearDown(self):
+        self.storage.close()
+
+    def test_it_stores_and_queries_requests(self):
+        for path in ['/a/0', '/b/0', '/a/1', '/b/1']:
+            self.history.add_request(generic_request(path, path.encode('utf-8')))
+
+        requests = self.history.all_requests()
+        self.assertListEqual([0, 1, 2, 3], [r.id for r in requests])
+        self.assertListEqual([b'/a/0', b'/b/0', b'/a/1', b'/b/1'], [r.http_body for r in requests])
+        self.assertEqual(b'Header: value', requests[0].http_headers)
+
+        page, cursor = self.history.requests_since(1, limit=1, session_id='a')
+        self.assertListEqual(['/a/1'], [r.path for r in page])
+        self.assertEqual(3, cursor)
+        self.assertEqual('/b/1', self.history.request(3).path)
+
+    def test_it_deletes_requests(self):
+        history = GenericRequestsHistory(storage=self.storage, max_session_requests=1, max_bytes=40)
+        history.add_request(generic_request('/a/0'))
+        history.add_request(generic_request('/a/1'))
+        history.add_request(generic_request('/b/0'))
+        history.add_request(generic_request('/c/0'))
+
+        self.assertListEqual(['/b/0', '/c/0'], [r.path for r in history.all_requests()])
+        self.assertEqual(2, history.stats()['evictions']['requests'])
+
+        history.clear()
+        self.assertListEqual([], history.all_requests())
+
+
+class MemoryStorageTestCase(StorageTestCase, unittest.TestCase):
+    def make_storage(self):
+        return MemoryStorage()
+
+    def test_it_stores_identical_bodies_and_headers_once(self):
+        history = GenericRequestsHistory(storage=self.storage, max_session_requests=2)
+        history.add_request(generic_request('/a/0', b'x' * 100))
+        history.add_request(generic_request('/a/1', b'x' * 100)) # retried upload
+        history.add_request(generic_request('/b/0', b'x' * 100))
+        history.add_request(generic_request('/b/1', b'y' * 50))
+
+        requests = history.all_requests()
+        self.assertIs(requests[0].http_body, requests[2].http_body)
+        self.assertIs(requests[0].http_headers, requests[3].http_headers)
+        self.assertDictEqual({'blobs': 3, 'bytes': 163, 'referenced_bytes': 402, 'encoded_bytes': 0}, history.stats()['blobs'])
+
+        history.add_request(generic_request('/b/2', b'z' * 10)) # evicts `/b/0`
+        self.assertDictEqual({'blobs': 4, 'bytes': 173, 'referenced_bytes': 312, 'encoded_bytes': 0}, history.stats()['blobs'])
+        history.close_session('a')
+        self.assertDictEqual({'blobs': 3, 'bytes': 73, 'referenced_bytes': 86, 'encoded_bytes': 0}, history.stats()['blobs'])
+        history.clear()
+        self.assertDictEqual({'blobs': 0, 'bytes': 0, 'referenced_bytes': 0, 'encoded_bytes': 0}, history.stats()['blobs'])
+
+
+class SQLiteStorageTestCase(StorageTestCase, unittest.TestCase):
+    def make_storage(self):
+        self.directory = TemporaryDirectory()
+        return SQLiteStorage(os.path.join(self.directory.name, 'requests.sqlite'), batch_size=2)
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_it_restores_requests_recorded_by_previous_run(self):
+        for path in ['/a/0', '/b/0', '/a/1']:
+            self.history.add_request(generic_request(path, b'body'))
+        self.storage.close()
+
+        self.storage = SQLiteStorage(self.storage.path)
+        history = GenericRequestsHistory(storage=self.storage)
+        self.assertListEqual(['/a/0', '/b/0', '/a/1'], [r.path for r in history.all_requests()])
+        self.assertEqual(3, history.stats()['requests'])
+        self.assertEqual(2, history.wait_for_requests(min_count=2, timeout=0, session_id='a'))
+
+        history.add_request(generic_request('/a/2'))
+        self.assertEqual(3, history.request(3).id)
+
+    def test_it_rebuilds_rum_index_from_stored_events(self):
+        for date in range(3):
+            request = generic_request('/a/0', b'body')
+            request.events = [{'type': 'action', 'date': date, 'session': {'id': 's'}}, {'message': 'not a RUM event'}]
+            self.history.add_request(request)
+        self.storage.close()
+
+        self.storage = SQLiteStorage(self.storage.path)
+        self.assertListEqual([1, 2], [request_id for request_id, _, _ in self.storage.events_since(1, page_size=1)])
+        index = RUMEventsIndex(load_events=self.storage.request_events)
+        history = GenericRequestsHistory(storage=self.storage, max_session_requests=2, rum_index=index)
+        self.assertListEqual([0, 1, 2], [e['date'] for e in index.query(event_type='action')])
+        self.assertIsNone(index.query()[0].get('message'))
+
+        history.add_request(generic_request('/a/1')) # evicts the oldest requests
+        self.assertListEqual([2], [e['date'] for e in index.query(session_id='s')])
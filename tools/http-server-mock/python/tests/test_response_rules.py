@@ -0,0 +1,109 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import time
+import json
+import unittest
+import http.client
+from collections import Counter
+from requests_history import GenericRequestsHistory
+from mock_server import HTTPMockServer
+from response_rules import ResponseSimulator
+from http_server_engine import HTTPServerEngine
+from asyncio_engine import AsyncioEngine
+from tests.server_runner import running_server
+from tests.test_mock_server import mock_request
+
+
+def simulator(rules, seed=0):
+    simulator = ResponseSimulator()
+    simulator.configure({'seed': seed, 'rules': rules})
+    return simulator
+
+
+class ResponseSimulatorTestCase(unittest.TestCase):
+    def test_it_applies_first_matching_rule(self):
+        rules = simulator([{'path': '/api/v2/logs$', 'delay': 0.5}, {'path': '/api/v2/', 'delay': 1}])
+        self.assertEqual(0.5, rules.simulate('POST', '/session/api/v2/logs').delay)
+        self.assertEqual(1, rules.simulate('POST', '/session/api/v2/rum').rule_index)
+        self.assertIsNone(rules.simulate('POST', '/session/other'))
+        self.assertIsNone(rules.simulate('GET', '/session/api/v2/rum'))
+
+    def test_it_draws_errors_and_throttling_at_configured_rates(self):
+        rules = simulator([{'errors': {'rate': 0.2, 'statuses': [500, 503]}, 'throttling': {'rate': 0.3, 'retry_after': 7}}])
+        outcomes = [rules.simulate('POST', '/session') for _ in range(2000)]
+        statuses = Counter([outcome.status for outcome in outcomes])
+
+        self.assertAlmostEqual(0.3, statuses[429] / 2000, delta=0.05)
+        self.assertAlmostEqual(0.2, (statuses[500] + statuses[503]) / 2000, delta=0.05)
+        self.assertSetEqual({7}, {o.retry_after for o in outcomes if o.status == 429})
+
+    def test_it_samples_delays_from_distribution(self):
+        rules = simulator([{'delay': {'distribution': 'uniform', 'min': 0.1, 'max': 0.2}}])
+        delays = [rules.simulate('POST', '/session').delay for _ in range(100)]
+        self.assertTrue(all([0.1 <= delay <= 0.2 for delay in delays]))
+
+    def test_it_rejects_invalid_config(self):
+        for config in [{'rules': {}}, {'rules': [{'path': '('}]}, {'rules': [{'errors': {'rate': 2}}]}, {'rules': [{'delay': {'distribution': 'unknown'}}]},
+                       {'rules': [{'errors': 'bad'}]}, {'rules': [{'errors': {'statuses': [600]}}]}, {'rules': [{'errors': {'statuses': ['500']}}]},
+                       {'rules': [{'throttling': {'rate': 'high'}}]}, {'rules': [{'delay': 'slow'}]}, {'rules': [{'delay': {'distribution': 'uniform', 'min': None, 'max': 1}}]},
+                       {'rules': [{'path': 1}]}, {'rules': [{'bandwidth': -1}]}, {'seed': [1], 'rules': []}]:
+            with self.assertRaises(ValueError):
+                ResponseSimulator().configure(config)
+
+        server = HTTPMockServer(GenericRequestsHistory())
+        self.assertEqual(400, server.handle(mock_request('PUT', '/simulation', json.dumps({'rules': [{'errors': 'bad'}]}).encode('utf-8'))).status)
+
+
+class SimulatedResponsesTestCase(unittest.TestCase):
+    def check_it_simulates_responses(self, engine_class):
+        history = GenericRequestsHistory()
+        server = HTTPMockServer(history)
+        with running_server(engine_class, server) as (ip, port):
+            connection = http.client.HTTPConnection(ip, port)
+            config = {'rules': [{'path': '/api/v2/rum$', 'throttling': {'rate': 1, 'retry_after': 3}}, {'path': '/slow$', 'delay': 0.2, 'bandwidth': 20000},
+                                {'path': '/broken$', 'errors': {'rate': 1, 'statuses': [599]}}]}
+            connection.request('PUT', '/simulation', body=json.dumps(config))
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual(200, response.status)
+
+            connection.request('POST', '/session/api/v2/rum', body=b'batch')
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual((429, '3'), (response.status, response.getheader('Retry-After')))
+
+            start = time.monotonic()
+            connection.request('POST', '/session/slow', body=b'x' * 10000)
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual(200, response.status)
+            self.assertGreater(time.monotonic() - start, 0.2 + 0.4) # delay and 10 kB at 20 kB/s
+
+            connection.request('POST', '/session/broken', body=b'batch')
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual(599, response.status) # status without standard reason phrase
+
+            connection.request('DELETE', '/simulation')
+            connection.getresponse().read()
+            connection.request('POST', '/session/api/v2/rum', body=b'batch')
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual(200, response.status)
+            connection.close()
+
+        outcomes = [r.simulated_response for r in history.all_requests()]
+        self.assertEqual({'rule': 0, 'status': 429, 'delay': 0.0, 'retry_after': 3}, outcomes[0])
+        self.assertEqual({'rule': 1, 'status': 200, 'delay': 0.2, 'retry_after': None}, outcomes[1])
+        self.assertEqual(599, outcomes[2]['status'])
+        self.assertIsNone(outcomes[3])
+
+    def test_http_server_engine(self):
+        self.check_it_simulates_responses(HTTPServerEngine)
+
+    def test_asyncio_engine(self):
+        self.check_it_simulates_responses(AsyncioEngine)
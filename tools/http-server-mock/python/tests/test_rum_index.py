@@ -0,0 +1,72 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import unittest
+from generic_request import GenericRequest
+from requests_history import GenericRequestsHistory
+from rum_index import RUMEventsIndex
+
+
+def rum_event(event_type, date, session_id='s1', view_id='v1', document_version=None):
+    event = {'type': event_type, 'date': date, 'session': {'id': session_id}, 'view': {'id': view_id}}
+    if document_version is not None:
+        event['_dd'] = {'document_version': document_version}
+    return event
+
+
+def generic_request(path, events):
+    request = GenericRequest("POST", path, b'', b'')
+    request.events = events
+    return request
+
+
+class RUMEventsIndexTestCase(unittest.TestCase):
+    def test_it_queries_events_by_session_view_and_type(self):
+        index = RUMEventsIndex()
+        history = GenericRequestsHistory(rum_index=index)
+        history.add_request(generic_request('/a', [
+            rum_event('resource', 30, view_id='v1'),
+            rum_event('action', 20, view_id='v1'),
+            rum_event('resource', 10, view_id='v2'),
+            rum_event('error', 40, session_id='s2', view_id='v3'),
+            {'message': 'not a RUM event'},
+        ]))
+
+        self.assertListEqual([20, 30], [e['date'] for e in index.query(view_id='v1')])
+        self.assertListEqual([10, 30], [e['date'] for e in index.query(session_id='s1', event_type='resource')])
+        self.assertListEqual([40], [e['date'] for e in index.query(session_id='s2')])
+        self.assertListEqual([20, 30], [e['date'] for e in index.query(since_date=20, until_date=40)])
+        self.assertListEqual([], index.query(view_id='unknown'))
+
+    def test_it_collapses_view_updates_to_latest_document_version(self):
+        index = RUMEventsIndex()
+        history = GenericRequestsHistory(rum_index=index)
+        history.add_request(generic_request('/a', [rum_event('view', 0, document_version=1), rum_event('view', 0, document_version=3)]))
+        history.add_request(generic_request('/a', [rum_event('view', 0, document_version=2)]))
+
+        self.assertListEqual([3], [e['_dd']['document_version'] for e in index.query(event_type='view')])
+        self.assertEqual(3, len(index.query(event_type='view', latest_views=False)))
+
+    def test_it_drops_events_of_evicted_requests(self):
+        index = RUMEventsIndex()
+        history = GenericRequestsHistory(max_session_requests=2, rum_index=index)
+        for date in range(4):
+            history.add_request(generic_request('/a', [rum_event('action', date)]))
+        history.add_request(generic_request('/b', [rum_event('action', 10)]))
+
+        self.assertListEqual([2, 3, 10], [e['date'] for e in index.query(event_type='action')])
+        history.clear()
+        self.assertListEqual([], index.query())
+
+    def test_it_indexes_events_with_malformed_date_and_document_version(self):
+        index = RUMEventsIndex()
+        history = GenericRequestsHistory(rum_index=index)
+        malformed_view = dict(rum_event('view', '2024-01-01'), _dd='not an object')
+        history.add_request(generic_request('/a', [rum_event('view', 20, view_id='v2', document_version=1), malformed_view, rum_event('action', None)]))
+
+        self.assertListEqual(['2024-01-01', None, 20], [e['date'] for e in index.query()]) # malformed dates are read as `0`
+        self.assertListEqual([20], [e['date'] for e in index.query(since_date=1)])
+        self.assertListEqual(['2024-01-01'], [e['date'] for e in index.query(view_id='v1', event_type='view', until_date=1)])
@@ -0,0 +1,146 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import os
+import json
+import tempfile
+import unittest
+from generic_request import GenericRequest
+from schema_validation import SchemaValidators, EventsValidator, UnsupportedSchemaError
+
+# Schemas laid out like in `rum-events-format` repo: events schema referencing event schemas in subdirectory,
+# which reference common schema.
+SCHEMAS = {
+    'events-schema.json': {
+        'oneOf': [{'$ref': 'rum/view-schema.json'}, {'$ref': 'rum/action-schema.json'}],
+    },
+    'rum/_common-schema.json': {
+        'type': 'object',
+        'required': ['date', 'session'],
+        'properties': {
+            'date': {'type': 'integer', 'minimum': 0},
+            'session': {'type': 'object', 'required': ['id'], 'properties': {'id': {'type': 'string', 'pattern': '^[0-9a-f-]+$'}}},
+        },
+    },
+    'rum/view-schema.json': {
+        'allOf': [
+            {'$ref': '_common-schema.json'},
+            {
+                'required': ['type', 'view'],
+                'properties': {
+                    'type': {'type': 'string', 'const': 'view'},
+                    'view': {'$ref': '#/definitions/view'},
+                },
+            },
+        ],
+        'definitions': {
+            'view': {
+                'type': 'object',
+                'required': ['id'],
+                'properties': {'id': {'type': 'string'}, 'parent': {'$ref': '#/definitions/view'}}, # recursive
+                'additionalProperties': False,
+            },
+        },
+    },
+    'rum/action-schema.json': {
+        'allOf': [
+            {'$ref': '_common-schema.json'},
+            {
+                'required': ['type', 'action'],
+                'properties': {
+                    'type': {'const': 'action'},
+                    'action': {'type': 'object', 'properties': {'type': {'enum': ['tap', 'scroll']}, 'frustration': {'type': 'array', 'items': {'type': 'string'}, 'uniqueItems': True}}},
+                },
+            },
+        ],
+    },
+}
+
+def view(**overrides):
+    event = {'type': 'view', 'date': 1, 'session': {'id': 'abc-1'}, 'view': {'id': 'v1'}}
+    event.update(overrides)
+    return event
+
+def request(request_id, path, events, content_type=None):
+    headers = f'Content-Type: {content_type}'.encode('utf-8') if content_type is not None else b''
+    generic_request = GenericRequest('POST', path, headers, b'')
+    generic_request.id = request_id
+    generic_request.events = events
+    return generic_request
+
+
+class SchemaValidationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        for name, schema in SCHEMAS.items():
+            path = os.path.join(self.directory.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as file:
+                json.dump(schema, file)
+        self.schema_path = os.path.join(self.directory.name, 'events-schema.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_it_validates_events_against_referenced_schemas(self):
+        validate = SchemaValidators().compile_file(self.schema_path)
+
+        self.assertIsNone(validate(view()))
+        self.assertIsNone(validate(view(view={'id': 'v2', 'parent': {'id': 'v1'}})))
+        self.assertIsNone(validate({'type': 'action', 'date': 2, 'session': {'id': 'abc'}, 'action': {'type': 'tap'}}))
+
+        self.assertListEqual([('/view/parent', 'is missing required property "id"')], validate(view(view={'id': 'v2', 'parent': {}})))
+        self.assertListEqual([('/view', 'has unexpected property "name"')], validate(view(view={'id': 'v2', 'name': 'x'})))
+        self.assertListEqual([('/date', 'is not of type integer'), ('/session/id', 'does not match "^[0-9a-f-]+$"')], validate(view(date=True, session={'id': 'xyz'})))
+        self.assertListEqual([('/action/type', 'is not one of ["tap", "scroll"]')], validate({'type': 'action', 'date': 2, 'session': {'id': 'a'}, 'action': {'type': 'swipe'}}))
+        self.assertListEqual([('/action/frustration', 'has non-unique items')], validate({'type': 'action', 'date': 2, 'session': {'id': 'a'}, 'action': {'frustration': ['a', 'a']}}))
+        self.assertListEqual([('/type', 'is not one of ["view", "action"]')], validate(view(type='error')))
+        self.assertEqual('does not match any of 2 schemas of `oneOf`', validate({'date': 1})[0][1])
+
+    def test_it_compiles_referenced_schemas_once(self):
+        validators = SchemaValidators()
+        common = validators.compile_file(os.path.join(self.directory.name, 'rum/_common-schema.json'))
+        self.assertIs(common, validators.compile({'$ref': 'rum/_common-schema.json'}, self.schema_path))
+        self.assertIsNone(validators.compile({'title': 'anything', 'description': 'goes'}, self.schema_path))
+
+    def test_it_rejects_schemas_with_unsupported_keywords(self):
+        validators = SchemaValidators()
+        with self.assertRaises(UnsupportedSchemaError):
+            validators.compile({'type': 'object', 'properties': {'tags': {'type': 'array', 'contains': {'const': 'a'}}}}, self.schema_path)
+
+    def test_it_reports_violations_per_session(self):
+        validator = EventsValidator()
+        validator.register(r'/rum$', self.schema_path)
+        validator.register(r'/replay$', self.schema_path, select=lambda event: 'type' in event)
+
+        self.assertEqual(1, validator.validate(request(0, '/a/rum', [view(), view(view={'id': 1})]), '/a/rum'))
+        self.assertEqual(1, validator.validate(request(1, '/a/rum', [view(view={'id': 2})]), '/a/rum'))
+        self.assertEqual(0, validator.validate(request(2, '/b/replay', [view(), {'metadata': 1}]), '/b/replay'))
+        self.assertEqual(0, validator.validate(request(3, '/b/logs', [{}]), '/b/logs'))
+
+        report = validator.report(session_id='a')['sessions']['a']
+        self.assertEqual(3, report['events'])
+        self.assertEqual(2, report['invalid_events'])
+        self.assertListEqual([{'schema': 'events-schema.json', 'path': '/view/id', 'message': 'is not of type string', 'count': 2}], report['violations'])
+        self.assertDictEqual({'request_id': 0, 'event_index': 1, 'schema': 'events-schema.json', 'path': '/view/id', 'message': 'is not of type string'}, report['samples'][0])
+        self.assertEqual(1, validator.report()['sessions']['b']['events'])
+
+        validator.delete_session('a')
+        self.assertRaises(KeyError, lambda: validator.report(session_id='a'))
+
+    def test_it_validates_events_sent_to_custom_intake_by_content_type_and_shape(self):
+        validator = EventsValidator()
+        validator.register(r'/api/v2/rum$', self.schema_path, media_type='text/plain', detect=lambda event: 'session' in event)
+        rum = [view(), view(view={'id': 1}), {'spans': []}] # spans are sent with the same `Content-Type`
+
+        self.assertEqual(1, validator.validate(request(0, '/a', rum, content_type='text/plain;charset=UTF-8'), '/a'))
+        self.assertEqual(0, validator.validate(request(1, '/a', [view(view={'id': 1})], content_type='application/json'), '/a'))
+        self.assertEqual(0, validator.validate(request(2, '/a', [view(view={'id': 1})]), '/a'))
+        self.assertEqual(2, validator.report(session_id='a')['sessions']['a']['events'])
+
+
+if __name__ == '__main__':
+    unittest.main()
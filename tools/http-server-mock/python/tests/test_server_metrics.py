@@ -0,0 +1,46 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import unittest
+from server_metrics import Histogram, ServerMetrics
+
+HISTORY_STATS = {'requests': 3, 'bytes': 120, 'sessions': 2}
+
+
+class ServerMetricsTestCase(unittest.TestCase):
+    def test_it_counts_values_in_fixed_buckets(self):
+        histogram = Histogram(bounds=[1, 10])
+        for value in [0.5, 1, 5, 50]:
+            histogram.observe(value)
+        self.assertListEqual([2, 1, 1], histogram.counts)
+        self.assertEqual(4, histogram.count)
+        self.assertEqual(56.5, histogram.sum)
+
+    def test_it_counts_requests_per_path_and_session(self):
+        metrics = ServerMetrics()
+        metrics.record_request('/api/v2/rum', 'a', raw_size=10, size=100)
+        metrics.record_request('/api/v2/rum', 'b', raw_size=20, size=200)
+        metrics.record_request('/api/v2/logs', 'a', raw_size=5, size=5)
+
+        stats = metrics.as_json(HISTORY_STATS)
+        self.assertDictEqual({'requests': 2, 'raw_bytes': 30, 'bytes': 300}, stats['paths']['/api/v2/rum'])
+        self.assertDictEqual({'requests': 2, 'raw_bytes': 15, 'bytes': 105}, stats['sessions']['a'])
+        self.assertEqual(3, stats['history']['requests'])
+
+    def test_it_exports_prometheus_text_format(self):
+        metrics = ServerMetrics()
+        metrics.record_request('/api/v2/rum', 'a', raw_size=10, size=100)
+        metrics.observe('decompression', 0.002)
+        metrics.observe('decompression', 20)
+
+        lines = metrics.as_prometheus(HISTORY_STATS).splitlines()
+        self.assertIn('mock_server_path_requests_total{path="/api/v2/rum"} 1', lines)
+        self.assertIn('mock_server_session_raw_bytes_total{session="a"} 10', lines)
+        self.assertIn('mock_server_decompression_seconds_bucket{le="0.0025"} 1', lines)
+        self.assertIn('mock_server_decompression_seconds_bucket{le="10"} 1', lines)
+        self.assertIn('mock_server_decompression_seconds_bucket{le="+Inf"} 2', lines)
+        self.assertIn('mock_server_decompression_seconds_count 2', lines)
+        self.assertIn('mock_server_history_bytes 120', lines)
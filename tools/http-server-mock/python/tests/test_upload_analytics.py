@@ -0,0 +1,51 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import unittest
+from generic_request import GenericRequest
+from upload_analytics import UploadAnalytics
+
+
+def upload(request_id, path, body, arrival_time, events_count=None):
+    request = GenericRequest('POST', path, b'', body, arrival_time=arrival_time)
+    request.id = request_id
+    request.events = [{}] * events_count if events_count is not None else None
+    return request
+
+
+class UploadAnalyticsTestCase(unittest.TestCase):
+    def test_it_aggregates_uploads_per_session_and_track(self):
+        analytics = UploadAnalytics()
+        analytics.record(upload(0, '/a/api/v2/rum', b'x' * 100, 10.0, events_count=2), '/api/v2/rum', raw_size=25)
+        analytics.record(upload(1, '/a/api/v2/rum', b'y' * 300, 15.0, events_count=4), '/api/v2/rum', raw_size=75)
+        analytics.record(upload(2, '/a/api/v2/logs', b'z' * 10, 16.0), '/api/v2/logs', raw_size=10)
+        analytics.record(upload(3, '/b/api/v2/rum', b'x' * 200, 20.0, events_count=1), '/api/v2/rum', raw_size=50)
+
+        rum = analytics.report(session_id='a')['sessions']['a']['tracks']['/api/v2/rum']
+        self.assertEqual(2, rum['uploads'])
+        self.assertEqual(4.0, rum['compression_ratio'])
+        self.assertDictEqual({'count': 2, 'min': 100, 'max': 300, 'mean': 200.0}, rum['batch_size'])
+        self.assertEqual(3.0, rum['events_per_batch']['mean'])
+        self.assertDictEqual({'count': 1, 'min': 5.0, 'max': 5.0, 'mean': 5.0}, rum['interval'])
+
+        totals = analytics.report()['tracks']['/api/v2/rum']
+        self.assertEqual(3, totals['uploads'])
+        self.assertEqual(600, totals['bytes'])
+        self.assertEqual(100, totals['batch_size']['min'])
+
+    def test_it_flags_duplicated_batches(self):
+        analytics = UploadAnalytics()
+        analytics.record(upload(0, '/a/rum', b'batch 1', 0.0), '/rum', raw_size=7)
+        analytics.record(upload(1, '/a/rum', b'batch 1', 1.0), '/rum', raw_size=7) # retried
+        analytics.record(upload(2, '/a/rum', b'batch 2', 2.0), '/rum', raw_size=7)
+        analytics.record(upload(3, '/b/rum', b'batch 1', 0.0), '/rum', raw_size=7) # same batch, other session
+        analytics.record(upload(4, '/a/logs', b'batch 1', 3.0), '/logs', raw_size=7) # same body, other track
+
+        report = analytics.report()
+        self.assertEqual(1, report['sessions']['a']['tracks']['/rum']['duplicates'])
+        self.assertListEqual([{'id': 1, 'original_id': 0}], report['sessions']['a']['duplicates'])
+        self.assertListEqual([], report['sessions']['b']['duplicates'])
+        self.assertEqual(0, report['sessions']['a']['tracks']['/logs']['duplicates'])
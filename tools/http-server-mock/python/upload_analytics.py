@@ -0,0 +1,155 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import threading
+
+class RunningStats:
+    """
+    Count, sum, min, max and mean of observed values, updated in O(1).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def as_json(self):
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count > 0 else None,
+        }
+
+class TrackUploads:
+    """
+    Aggregates of uploads to one track (request path without the session), in one session.
+    """
+
+    def __init__(self):
+        self.uploads = 0
+        self.raw_bytes = 0 # as received (compressed)
+        self.bytes = 0 # decompressed
+        self.batch_size = RunningStats() # decompressed bytes per upload
+        self.events_per_batch = RunningStats() # decoded events per upload (if payload is known)
+        self.interval = RunningStats() # seconds between consecutive uploads
+        self.duplicates = 0
+        self.last_arrival_time = None
+
+    def record(self, raw_size, size, events_count, arrival_time, is_duplicate):
+        self.uploads += 1
+        self.raw_bytes += raw_size
+        self.bytes += size
+        self.batch_size.observe(size)
+        if events_count is not None:
+            self.events_per_batch.observe(events_count)
+        if self.last_arrival_time is not None:
+            self.interval.observe(arrival_time - self.last_arrival_time)
+        self.last_arrival_time = arrival_time
+        if is_duplicate:
+            self.duplicates += 1
+
+    def merge(self, other):
+        """
+        Adds aggregates of `other` (except intervals, which are only meaningful within one session).
+        """
+        self.uploads += other.uploads
+        self.raw_bytes += other.raw_bytes
+        self.bytes += other.bytes
+        self.duplicates += other.duplicates
+        for stats, other_stats in [(self.batch_size, other.batch_size), (self.events_per_batch, other.events_per_batch)]:
+            if other_stats.count > 0:
+                stats.count += other_stats.count
+                stats.sum += other_stats.sum
+                stats.min = other_stats.min if stats.min is None else min(stats.min, other_stats.min)
+                stats.max = other_stats.max if stats.max is None else max(stats.max, other_stats.max)
+
+    def as_json(self):
+        return {
+            "uploads": self.uploads,
+            "raw_bytes": self.raw_bytes,
+            "bytes": self.bytes,
+            "compression_ratio": self.bytes / self.raw_bytes if self.raw_bytes > 0 else None,
+            "batch_size": self.batch_size.as_json(),
+            "events_per_batch": self.events_per_batch.as_json(),
+            "interval": self.interval.as_json(),
+            "duplicates": self.duplicates,
+        }
+
+class UploadAnalytics:
+    """
+    Computes how the SDK uploads data: batch sizes, events per batch, compression ratio, cadence of uploads
+    and re-sent batches (detected by hashes of decompressed bodies sent to the same track), per session and track.
+    Aggregates are updated incrementally, when requests are recorded.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__sessions = {} # session identifier -> {track path -> `TrackUploads`}
+        self.__body_hashes = {} # session identifier -> {(track, body hash) -> id of the first request with that body}
+        self.__duplicates = {} # session identifier -> list of `(duplicate request id, original request id)`
+
+    def record(self, generic_request, track, raw_size):
+        """
+        Accounts recorded `GenericRequest` sent to given track, which had `raw_size` bytes before decompression.
+        """
+        body_hash = generic_request.digest('http_body') # shared with the blob store of `MemoryStorage`
+        events_count = len(generic_request.events) if generic_request.events is not None else None
+        with self.__lock:
+            session_id = generic_request.session_id
+            body_hashes = self.__body_hashes.setdefault(session_id, {})
+            original_id = body_hashes.setdefault((track, body_hash), generic_request.id) # same body sent to other track is not a retry
+            is_duplicate = original_id != generic_request.id
+            if is_duplicate:
+                self.__duplicates.setdefault(session_id, []).append((generic_request.id, original_id))
+
+            tracks = self.__sessions.setdefault(session_id, {})
+            uploads = tracks.get(track)
+            if uploads is None:
+                uploads = tracks[track] = TrackUploads()
+            uploads.record(raw_size, len(generic_request.http_body), events_count, generic_request.arrival_time, is_duplicate)
+
+    def report(self, session_id=None):
+        """
+        Returns aggregates per session and track (all sessions or only given one) and totals per track.
+        """
+        with self.__lock:
+            session_ids = list(self.__sessions.keys()) if session_id is None else [session_id]
+            sessions = {}
+            totals = {}
+            for session_id in session_ids:
+                tracks = self.__sessions.get(session_id)
+                if tracks is None:
+                    raise KeyError(session_id)
+                for track, uploads in tracks.items():
+                    totals.setdefault(track, TrackUploads()).merge(uploads)
+                sessions[session_id] = {
+                    "tracks": {track: uploads.as_json() for track, uploads in tracks.items()},
+                    "duplicates": [{"id": duplicate_id, "original_id": original_id} for duplicate_id, original_id in self.__duplicates.get(session_id, [])],
+                }
+            return {
+                "sessions": sessions,
+                "tracks": {track: uploads.as_json() for track, uploads in totals.items()},
+            }
+
+    def delete_session(self, session_id):
+        with self.__lock:
+            self.__sessions.pop(session_id, None)
+            self.__body_hashes.pop(session_id, None)
+            self.__duplicates.pop(session_id, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__sessions.clear()
+            self.__body_hashes.clear()
+            self.__duplicates.clear()
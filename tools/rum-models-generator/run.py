@@ -10,6 +10,10 @@
 import os
 import re
 import sys
+import json
+import shlex
+import shutil
+import hashlib
 import argparse
 import traceback
 import subprocess
@@ -17,6 +21,19 @@ from dataclasses import dataclass
 
 SCHEMAS_REPO = 'https://github.com/DataDog/rum-events-format.git'
 
+# Fingerprint of Swift CLI sources and the path of executable built from them (relative to cwd)
+CLI_BUILD_CACHE_PATH = '.build/rum-models-generator-build.json'
+
+# Inputs of Swift CLI build (relative to cwd)
+CLI_SOURCES_PATH = 'Sources'
+CLI_PACKAGE_FILES = ['Package.swift', 'Package.resolved']
+
+# Persistent cache of `rum-events-format` repo: its bare mirror and a checkout for each resolved SHA (relative to cwd)
+SCHEMAS_CACHE_PATH = '.schemas-cache'
+
+# Directory with `rum-events-format` checkout used for generation (relative to cwd)
+SCHEMAS_CHECKOUT_PATH = 'rum-events-format'
+
 # JSON Schema paths (relative to cwd)
 RUM_SCHEMA_PATH = '/rum-events-format/schemas/rum-events-mobile-schema.json'
 SR_SCHEMA_PATH = '/rum-events-format/schemas/session-replay-mobile-schema.json'
@@ -40,6 +57,9 @@ class Context:
     # Git reference to clone schemas repo at.
     git_ref: str
 
+    # Resolved path to the cache of schemas repo
+    schemas_cache_path: str
+
     # Resolved path to source code file with RUM model definitions (Swift)
     rum_swift_generated_file_path: str
 
@@ -57,6 +77,7 @@ class Context:
         - cli_executable_path = {self.cli_executable_path},
         - rum_schema_path = {self.rum_schema_path}
         - git_ref = {self.git_ref}
+        - schemas_cache_path = {self.schemas_cache_path}
         - sr_schema_path = {self.sr_schema_path}
         - rum_swift_generated_file_path = {self.rum_swift_generated_file_path}
         - rum_objc_generated_file_path = {self.rum_objc_generated_file_path}
@@ -88,31 +109,124 @@ def shell_output(command: str):
         )
 
 
-def build_swift_cli():
+def swift_cli_fingerprint(package_path: str = '.'):
+    """
+    Computes the hash of `rum-models-generator` package sources and resolved dependencies.
+    :return: the fingerprint as hex string
+    """
+    files = [f'{package_path}/{name}' for name in CLI_PACKAGE_FILES]
+    for directory, subdirectories, file_names in os.walk(f'{package_path}/{CLI_SOURCES_PATH}'):
+        subdirectories.sort()
+        files += [f'{directory}/{file_name}' for file_name in sorted(file_names)]
+
+    fingerprint = hashlib.sha256()
+    for path in files:
+        if os.path.isfile(path):
+            fingerprint.update(os.path.relpath(path, package_path).encode('utf-8') + b'\0')
+            with open(path, 'rb') as file:
+                fingerprint.update(hashlib.sha256(file.read()).digest())
+    return fingerprint.hexdigest()
+
+
+def build_swift_cli(package_path: str = '.'):
     """
-    Builds `rum-models-generator` package and returns executable path.
+    Builds `rum-models-generator` package and returns executable path. The build is skipped if the executable
+    was already built from the same sources.
     :return: the CLI's executable path
     """
+    fingerprint = swift_cli_fingerprint(package_path=package_path)
+    cache_path = f'{package_path}/{CLI_BUILD_CACHE_PATH}'
+    try:
+        with open(cache_path) as file:
+            cache = json.load(file)
+        if cache['fingerprint'] == fingerprint and os.access(cache['cli_path'], os.X_OK):
+            print(f'⚙️ Using `rum-models-generator` built from unchanged sources ({fingerprint[:12]})')
+            return cache['cli_path']
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+
     print('⚙️ Building `rum-models-generator` Swift package...')
-    shell_output('swift build --configuration release')
-    cli_dir = shell_output('swift build --configuration release --show-bin-path').rstrip('\n')
-    cli_path = cli_dir + '/rum-models-generator'
+    shell_output(f'swift build --package-path {shlex.quote(package_path)} --configuration release')
+    # SwiftPM links `.build/release` to the bin path of the host triple (`.build/<triple>/release`), so it isn't
+    # asked for it with another `swift build --show-bin-path`, which costs a second package graph resolution
+    cli_path = os.path.realpath(f'{package_path}/.build/release') + '/rum-models-generator'
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path, 'w') as file:
+        json.dump({'fingerprint': fingerprint, 'cli_path': cli_path}, file)
     return cli_path
 
 
-def clone_schemas_repo(git_ref: str):
+def clone_schemas_repo(git_ref: str, cache_path: str = SCHEMAS_CACHE_PATH, checkout_path: str = SCHEMAS_CHECKOUT_PATH,
+                       repo: str = SCHEMAS_REPO):
     """
-    Clones `rum-events-format` repo at given `git_ref` into current location and reads the SHA of last commit.
-    :return: the SHA of last commit
+    Checks out `rum-events-format` repo at given `git_ref` into `checkout_path` and reads the SHA of its commit.
+
+    The repo is mirrored in `cache_path` and each SHA is checked out there only once, so running at a known SHA
+    (e.g. the one read from generated file) does no git work. The mirror is only fetched for branches, tags
+    and commits it doesn't know yet.
+    :return: the SHA of checked out commit
     """
-    print(f'⚙️ Cloning `rum-events-format` repository at "{git_ref}"...')
-    shell_output('rm -rf rum-events-format')
-    shell_output(f'git clone {SCHEMAS_REPO}')
-    shell_output(f'cd rum-events-format && git fetch origin {git_ref} && git checkout FETCH_HEAD')
-    sha = shell_output(f'cd rum-events-format && git rev-parse HEAD')
+    if re.fullmatch(r'[0-9a-f]{40}', git_ref or '') and os.path.isdir(f'{cache_path}/checkouts/{git_ref}'):
+        print(f'⚙️ Using cached `rum-events-format` checkout at "{git_ref}"')
+        sha = git_ref
+    else:
+        sha = fetch_schemas_commit(git_ref=git_ref, cache_path=cache_path, repo=repo)
+        export_schemas_commit(sha=sha, cache_path=cache_path)
+
+    # Point `checkout_path` to cached checkout (replacing the clone made by previous versions of this script)
+    if os.path.isdir(checkout_path) and not os.path.islink(checkout_path):
+        shutil.rmtree(checkout_path)
+    if os.path.lexists(f'{checkout_path}.tmp'):
+        os.remove(f'{checkout_path}.tmp') # left by interrupted run
+    os.symlink(os.path.abspath(f'{cache_path}/checkouts/{sha}'), f'{checkout_path}.tmp')
+    os.replace(f'{checkout_path}.tmp', checkout_path)
     return sha
 
 
+def fetch_schemas_commit(git_ref: str, cache_path: str, repo: str):
+    """
+    Resolves given `git_ref` to the SHA of commit in the mirror of `rum-events-format` repo, mirroring the repo
+    into `cache_path` or fetching the ref if necessary.
+    :return: the SHA of resolved commit
+    """
+    mirror = shlex.quote(f'{cache_path}/mirror.git')
+    if not os.path.isdir(f'{cache_path}/mirror.git'):
+        print(f'⚙️ Mirroring `rum-events-format` repository into "{cache_path}"...')
+        shell_output(f'git clone --mirror --quiet {shlex.quote(repo)} {mirror}')
+
+    if re.fullmatch(r'[0-9a-f]{5,40}', git_ref or ''):
+        # Commits don't move, so it is enough to find it in the mirror - try with refs known so far, then updated ones
+        for fetch_command in [None, f'git -C {mirror} fetch --quiet --prune origin']:
+            if fetch_command is not None:
+                print(f'⚙️ Fetching `rum-events-format` repository to find "{git_ref}"...')
+                shell_output(fetch_command)
+            try:
+                return shell_output(f'git -C {mirror} rev-parse --verify --quiet "{git_ref}^{{commit}}"').strip()
+            except Exception:
+                pass
+
+    # Branches and tags may move, so they are always fetched (empty ref stands for remote's default branch)
+    print(f'⚙️ Fetching `rum-events-format` repository at "{git_ref}"...')
+    shell_output(f'git -C {mirror} fetch --quiet origin {shlex.quote(git_ref or "HEAD")}')
+    return shell_output(f'git -C {mirror} rev-parse "FETCH_HEAD^{{commit}}"').strip()
+
+
+def export_schemas_commit(sha: str, cache_path: str):
+    """
+    Checks out the tree of given commit from the mirror of `rum-events-format` repo into `<cache_path>/checkouts/<sha>`
+    (unless it is already there).
+    """
+    checkout = f'{cache_path}/checkouts/{sha}'
+    if os.path.isdir(checkout):
+        return
+    # Extract into temporary directory and rename it, so incomplete checkout is never observed under final name
+    shutil.rmtree(f'{checkout}.tmp', ignore_errors=True)
+    os.makedirs(f'{checkout}.tmp')
+    shell_output(f'git -C {shlex.quote(cache_path + "/mirror.git")} archive --format=tar {sha} | tar -x -C {shlex.quote(checkout + ".tmp")}')
+    os.rename(f'{checkout}.tmp', checkout)
+
+
 def read_sha_from_generated_file(path):
     """
     Reads SHA from the last line of existing (generated) file.
@@ -144,7 +258,7 @@ def generate_code(ctx: Context, language: str, convention: str, json_schema: str
 
     cli_command = f'{ctx.cli_executable_path} generate-{language} --convention {convention} --path "{json_schema}" {skip}'
     code = shell_output(cli_command)
-    code += f'// Generated from https://github.com/DataDog/rum-events-format/tree/{git_sha}'
+    code += f'// Generated from https://github.com/DataDog/rum-events-format/tree/{git_sha}\n'
     return code
 
 
@@ -170,7 +284,7 @@ def validate_code(ctx: Context, language: str, convention: str, json_schema: str
 
 
 def generate_rum_models(ctx: Context):
-    sha = clone_schemas_repo(git_ref=ctx.git_ref)
+    sha = clone_schemas_repo(git_ref=ctx.git_ref, cache_path=ctx.schemas_cache_path)
 
     with open(ctx.rum_swift_generated_file_path, 'w') as file:
         code = generate_code(ctx, language='swift', convention='rum', json_schema=ctx.rum_schema_path, git_sha=sha)
@@ -182,7 +296,7 @@ def generate_rum_models(ctx: Context):
 
 
 def generate_sr_models(ctx: Context):
-    sha = clone_schemas_repo(git_ref=ctx.git_ref)
+    sha = clone_schemas_repo(git_ref=ctx.git_ref, cache_path=ctx.schemas_cache_path)
 
     with open(ctx.sr_swift_generated_file_path, 'w') as file:
         code = generate_code(ctx, language='swift', convention='sr', json_schema=ctx.sr_schema_path, git_sha=sha)
@@ -196,7 +310,7 @@ def validate_rum_models(ctx: Context):
     if swift_sha != objc_sha:
         raise Exception(f'SHAs in generated RUM swift and objc code do not match ({swift_sha} != {objc_sha}).')
 
-    expected_sha = clone_schemas_repo(git_ref=swift_sha)
+    expected_sha = clone_schemas_repo(git_ref=swift_sha, cache_path=ctx.schemas_cache_path)
 
     validate_code(ctx, language='swift', convention='rum', json_schema=ctx.rum_schema_path,
                   target_file=ctx.rum_swift_generated_file_path, git_sha=expected_sha)
@@ -207,7 +321,7 @@ def validate_rum_models(ctx: Context):
 
 def validate_sr_models(ctx: Context):
     sha = read_sha_from_generated_file(path=ctx.sr_swift_generated_file_path)
-    expected_sha = clone_schemas_repo(git_ref=sha)
+    expected_sha = clone_schemas_repo(git_ref=sha, cache_path=ctx.schemas_cache_path)
 
     validate_code(ctx, language='swift', convention='sr', json_schema=ctx.sr_schema_path,
                   target_file=ctx.sr_swift_generated_file_path, git_sha=expected_sha)
@@ -225,6 +339,7 @@ if __name__ == "__main__":
     parser.add_argument("command", choices=['generate', 'verify'], help="Run mode")
     parser.add_argument("product", choices=['rum', 'sr'], help="Either 'rum' (RUM) or 'sr' (Session Replay)")
     parser.add_argument("--git_ref", help="The git reference to clone `rum-events-format` repo at (only effective for `generate` command).")
+    parser.add_argument("--schemas_cache", help="The directory to cache `rum-events-format` repo in (can be persisted between CI runs).", default=SCHEMAS_CACHE_PATH)
     parser.add_argument("--skip_objc", help="List of type names to skip in Objective-C generation", nargs='*', type=str, default=[])
     args = parser.parse_args()
 
@@ -234,6 +349,7 @@ if __name__ == "__main__":
             rum_schema_path=os.path.abspath(f'{script_dir}/{RUM_SCHEMA_PATH}'),
             sr_schema_path=os.path.abspath(f'{script_dir}/{SR_SCHEMA_PATH}'),
             git_ref=args.git_ref if args.command else None,
+            schemas_cache_path=os.path.abspath(args.schemas_cache),
             rum_swift_generated_file_path=os.path.abspath(f'{repository_root}/{RUM_SWIFT_GENERATED_FILE_PATH}'),
             rum_objc_generated_file_path=os.path.abspath(f'{repository_root}/{RUM_OBJC_GENERATED_FILE_PATH}'),
             sr_swift_generated_file_path=os.path.abspath(f'{repository_root}/{SR_SWIFT_GENERATED_FILE_PATH}'),
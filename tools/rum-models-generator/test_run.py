@@ -0,0 +1,126 @@
+# -----------------------------------------------------------
+# Unless explicitly stated otherwise all files in this repository are licensed under the Apache License Version 2.0.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+# -----------------------------------------------------------
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from run import clone_schemas_repo, shell_output, build_swift_cli, swift_cli_fingerprint, CLI_BUILD_CACHE_PATH
+
+
+class SchemasCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.remote = f'{self.directory}/remote'
+        self.cache = f'{self.directory}/cache'
+        self.checkout = f'{self.directory}/rum-events-format'
+        shell_output(f'git init --quiet --initial-branch=master {self.remote}')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def commit_schema(self, content):
+        os.makedirs(f'{self.remote}/schemas', exist_ok=True)
+        with open(f'{self.remote}/schemas/rum-events-mobile-schema.json', 'w') as file:
+            file.write(content)
+        shell_output(f'cd {self.remote} && git add -A && git -c user.name=test -c user.email=test@example.com commit --quiet -m "{content}"')
+        return shell_output(f'git -C {self.remote} rev-parse HEAD').strip()
+
+    def clone(self, git_ref):
+        sha = clone_schemas_repo(git_ref=git_ref, cache_path=self.cache, checkout_path=self.checkout, repo=self.remote)
+        with open(f'{self.checkout}/schemas/rum-events-mobile-schema.json') as file:
+            return sha, file.read()
+
+    def test_it_checks_out_fetched_refs(self):
+        first_sha = self.commit_schema('v1')
+        self.assertEqual((first_sha, 'v1'), self.clone('master'))
+
+        second_sha = self.commit_schema('v2')
+        self.assertEqual((second_sha, 'v2'), self.clone('master')) # branch is fetched again
+        self.assertEqual((first_sha, 'v1'), self.clone(first_sha[:7]))
+
+        third_sha = self.commit_schema('v3')
+        self.assertEqual((third_sha, 'v3'), self.clone(third_sha)) # commit not known to the mirror is fetched
+
+    def test_it_does_no_git_work_for_known_sha(self):
+        sha = self.commit_schema('v1')
+        self.clone(sha)
+
+        shutil.rmtree(self.remote)
+        shutil.rmtree(f'{self.cache}/mirror.git')
+        self.assertEqual((sha, 'v1'), self.clone(sha))
+
+    def test_it_replaces_clone_made_without_cache(self):
+        sha = self.commit_schema('v1')
+        shell_output(f'git clone --quiet {self.remote} {self.checkout}')
+
+        self.assertEqual((sha, 'v1'), self.clone(sha))
+        self.assertTrue(os.path.islink(self.checkout))
+
+    def test_it_replaces_link_left_by_interrupted_run(self):
+        sha = self.commit_schema('v1')
+        os.symlink(self.directory, f'{self.checkout}.tmp')
+
+        self.assertEqual((sha, 'v1'), self.clone(sha))
+        self.assertFalse(os.path.lexists(f'{self.checkout}.tmp'))
+
+
+class SwiftCLIBuildCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.package = tempfile.mkdtemp()
+        self.write('Package.swift', '// swift-tools-version: 5.7.1')
+        self.write('Package.resolved', '{}')
+        self.write('Sources/rum-models-generator/main.swift', 'print("1")')
+
+    def tearDown(self):
+        shutil.rmtree(self.package)
+
+    def write(self, path, content):
+        os.makedirs(os.path.dirname(f'{self.package}/{path}'), exist_ok=True)
+        with open(f'{self.package}/{path}', 'w') as file:
+            file.write(content)
+
+    def test_it_fingerprints_sources_and_resolved_dependencies(self):
+        fingerprint = swift_cli_fingerprint(package_path=self.package)
+        self.write('.build/release/output.o', 'changed')
+        self.assertEqual(fingerprint, swift_cli_fingerprint(package_path=self.package))
+
+        self.write('Sources/rum-models-generator/main.swift', 'print("2")')
+        self.assertNotEqual(fingerprint, swift_cli_fingerprint(package_path=self.package))
+        fingerprint = swift_cli_fingerprint(package_path=self.package)
+        self.write('Package.resolved', '{"pins": []}')
+        self.assertNotEqual(fingerprint, swift_cli_fingerprint(package_path=self.package))
+
+    def test_it_reuses_executable_built_from_unchanged_sources(self):
+        cli_path = f'{self.package}/.build/release/rum-models-generator'
+        self.write('.build/release/rum-models-generator', '')
+        os.chmod(cli_path, 0o755)
+        self.write(CLI_BUILD_CACHE_PATH, json.dumps({'fingerprint': swift_cli_fingerprint(package_path=self.package), 'cli_path': cli_path}))
+
+        self.assertEqual(cli_path, build_swift_cli(package_path=self.package)) # no `swift build`
+
+    def test_it_builds_executable_with_single_swift_invocation(self):
+        def swift_build(command):
+            commands.append(command)
+            self.write('.build/x86_64-unknown-linux-gnu/release/rum-models-generator', '')
+            os.chmod(f'{self.package}/.build/x86_64-unknown-linux-gnu/release/rum-models-generator', 0o755)
+            os.symlink('x86_64-unknown-linux-gnu/release', f'{self.package}/.build/release')
+            return ''
+
+        commands = []
+        with mock.patch('run.shell_output', side_effect=swift_build):
+            cli_path = build_swift_cli(package_path=self.package)
+            self.assertEqual(cli_path, build_swift_cli(package_path=self.package)) # cached
+
+        self.assertEqual(1, len(commands))
+        self.assertTrue(commands[0].startswith('swift build'))
+        self.assertEqual(os.path.realpath(f'{self.package}/.build/x86_64-unknown-linux-gnu/release/rum-models-generator'), cli_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
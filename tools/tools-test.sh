@@ -18,6 +18,16 @@ test_swift_package tools/http-server-mock
 test_swift_package tools/rum-models-generator
 test_swift_package tools/sr-snapshots
 
+# Test Python mock server:
+echo_subtitle "Run 'python3 -m pytest tests' in ./tools/http-server-mock/python"
+cd tools/http-server-mock/python && python3 -m pytest tests
+cd -
+
+# Test models generator script:
+echo_subtitle "Run 'python3 -m pytest test_run.py' in ./tools/rum-models-generator"
+cd tools/rum-models-generator && python3 -m pytest test_run.py
+cd -
+
 # Test dogfooding automation:
 echo_subtitle "Run 'make clean install test' in ./tools/dogfooding"
 cd tools/dogfooding && make clean install test